@@ -0,0 +1,127 @@
+import time
+import argparse
+from sqlalchemy import text, insert, bindparam
+
+from conexao import session, obter_engine, PartidaArquivada
+from motor import obter_conjunto
+from registro import carregar_registros, codificar, decodificar
+
+# Arquivo das partidas finalizadas: MaoPartida e Movimentacao ficam só com
+# as partidas em andamento. Cada partida finalizada vira uma linha de
+# PartidaArquivada com o registro binário de registro.py (distribuição e
+# movimentos, ~100 bytes) e as suas linhas nas tabelas quentes são apagadas.
+# O arquivamento anda em lotes, cada um na sua transação curta; partidas
+# travadas por outra transação ficam para o próximo lote.
+#
+# RankingUsuarios só lê Partida e PartidaUsuario, que não mudam;
+# PartidasDetalhadas conta as movimentações arquivadas e registro.py
+# reproduz as partidas dos dois lados.
+#
+# Uso: python arquivo.py arquivar [--lote 500] [--pausa 0] [--limite N] [--vacuum]
+#      python arquivo.py estado
+
+# Tempo máximo de espera por uma trava dentro de um lote
+ESPERA_TRAVA = "2s"
+
+
+# Arquiva um lote de partidas finalizadas; retorna quantas
+def arquivar_lote(lote, conjunto):
+    try:
+        session.execute(text(f"SET LOCAL lock_timeout = '{ESPERA_TRAVA}'"))
+        ids = session.execute(text("""
+            SELECT P.idpartida FROM partida P
+            WHERE P.datahorafim IS NOT NULL
+              AND EXISTS (SELECT 1 FROM maopartida MP WHERE MP.idpartida = P.idpartida)
+              AND NOT EXISTS (SELECT 1 FROM partidaarquivada A WHERE A.idpartida = P.idpartida)
+            ORDER BY P.idpartida
+            LIMIT :lote
+            FOR UPDATE OF P SKIP LOCKED
+        """), {"lote": lote}).scalars().all()
+        if not ids:
+            session.rollback()
+            return 0
+
+        linhas = []
+        for idpartida, registro in carregar_registros(session, ids, conjunto).items():
+            dados = codificar(registro)
+            if decodificar(dados) != registro:
+                raise ValueError(f"Partida {idpartida}: registro não confere após a codificação")
+            linhas.append({"idpartida": idpartida, "registro": dados,
+                           "totalmovimentacoes": len(registro.movimentos)})
+        if len(linhas) != len(ids):
+            raise ValueError("Partidas do lote sem registro; nada foi arquivado")
+        session.execute(insert(PartidaArquivada.__table__).values(linhas))
+
+        for tabela in ("movimentacao", "maopartida"):
+            session.execute(text(
+                f"DELETE FROM {tabela} WHERE idpartida IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)), {"ids": ids})
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(ids)
+
+
+# Arquiva lotes até acabarem as partidas finalizadas (ou até `limite`);
+# `pausa` espaça os lotes para não disputar o banco com as partidas em jogo
+def arquivar(lote=500, pausa=0.0, limite=None):
+    conjunto = obter_conjunto(session)
+    total = 0
+    while limite is None or total < limite:
+        feitas = arquivar_lote(lote if limite is None else min(lote, limite - total), conjunto)
+        total += feitas
+        if not feitas:
+            break
+        if pausa:
+            time.sleep(pausa)
+    return total
+
+
+# VACUUM das tabelas quentes: o espaço das linhas apagadas volta a ser
+# usado pelas partidas novas (sem a trava exclusiva do VACUUM FULL)
+def vacuum():
+    with obter_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for tabela in ("movimentacao", "maopartida"):
+            conn.execute(text(f"VACUUM (ANALYZE) {tabela}"))
+
+
+def estado():
+    contagens = session.execute(text("""
+        SELECT
+            (SELECT COUNT(*) FROM partida WHERE datahorafim IS NULL),
+            (SELECT COUNT(*) FROM partida P WHERE datahorafim IS NOT NULL
+               AND NOT EXISTS (SELECT 1 FROM partidaarquivada A WHERE A.idpartida = P.idpartida)),
+            (SELECT COUNT(*) FROM partidaarquivada)
+    """)).one()
+    tamanhos = session.execute(text("""
+        SELECT relname, pg_total_relation_size(oid) FROM pg_class
+        WHERE relname IN ('maopartida', 'movimentacao', 'partidaarquivada')
+        ORDER BY relname
+    """)).fetchall()
+    return contagens, tamanhos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquivo das partidas finalizadas")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p = comandos.add_parser("arquivar", help="move as partidas finalizadas para PartidaArquivada")
+    p.add_argument("--lote", type=int, default=500, help="partidas por transação")
+    p.add_argument("--pausa", type=float, default=0.0, help="segundos entre lotes")
+    p.add_argument("--limite", type=int, help="máximo de partidas nesta execução")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM nas tabelas quentes ao final")
+    comandos.add_parser("estado", help="partidas e tamanho das tabelas de cada lado")
+    args = parser.parse_args()
+
+    if args.comando == "arquivar":
+        inicio = time.perf_counter()
+        total = arquivar(args.lote, args.pausa, args.limite)
+        print(f"{total} partida(s) arquivada(s) em {time.perf_counter() - inicio:.1f} s.")
+        if args.vacuum and total:
+            vacuum()
+    else:
+        (andamento, finalizadas, arquivadas), tamanhos = estado()
+        print(f"Em andamento: {andamento} | finalizadas não arquivadas: {finalizadas} | arquivadas: {arquivadas}")
+        for tabela, tamanho in tamanhos:
+            print(f"{tabela:<18} {tamanho / 1024:>10.0f} KB")
+    session.close()
@@ -0,0 +1,184 @@
+import os
+import time
+import random
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import conexao
+from conexao import unidade_de_trabalho, configurar_pool
+from bot import Bot
+from instrumentacao import percentil
+import main
+
+# Autojogo: partidas inteiras sem interação, com bots de política
+# configurável, jogadas por main.jogar_partida_automatica (os mesmos
+# caminhos do jogo interativo: criar_partida, distribuir_partidas,
+# jogar_peca / comprar_peca / passar_vez, encerrar_partida). Roda N
+# partidas em paralelo em processos, cada um com a sua conexão.
+#
+# Uso: python autojogo.py [--partidas 1000] [--processos 4] [--jogadores 4]
+#          [--politicas gulosa,aleatoria] [--semente 42]
+
+
+# ---------- políticas ----------
+# Uma política recebe o estado, o jogador e as peças que ele pode jogar
+# (nunca vazia) e devolve (peça, extremidade). Sem peça jogável o bot
+# compra do monte e, com o monte vazio, passa a vez.
+POLITICAS = {}
+
+
+def politica(nome):
+    def registrar(funcao):
+        POLITICAS[nome] = funcao
+        return funcao
+    return registrar
+
+
+@politica("primeira")
+def jogar_primeira(estado, idusuario, validas, rng):
+    peca = validas[0]
+    return peca, estado.encaixes(peca)[0]
+
+
+@politica("aleatoria")
+def jogar_aleatoria(estado, idusuario, validas, rng):
+    peca = rng.choice(validas)
+    return peca, rng.choice(estado.encaixes(peca))
+
+
+# Livra-se primeiro da peça que vale mais pontos (pontosPeca); no empate,
+# prefere as buchas, que encaixam em menos lugares
+@politica("gulosa")
+def jogar_gulosa(estado, idusuario, validas, rng):
+    peca = max(validas, key=lambda p: (p.pontospeca, p.ladoa == p.ladob, -p.idpeca))
+    return peca, estado.encaixes(peca)[0]
+
+
+# Busca com tempo limite (bot.py); um bot por processo
+_bot = None
+
+
+@politica("ia")
+def jogar_ia(estado, idusuario, validas, rng):
+    global _bot
+    if _bot is None:
+        _bot = Bot(estado.conjunto)
+    return _bot.escolher(estado, idusuario)
+
+
+# Cria, distribui e joga uma partida (main.jogar_partida_automatica);
+# `politicas` tem uma política por jogador, na ordem da mesa. Retorna
+# (motivo, índices dos assentos vencedores, movimentos); com duplas, os
+# vencedores são os dois jogadores da dupla.
+def partida_completa(jogadores, politicas, rng):
+    estado, (motivo, idvencedor, iddupla), movimentos = main.jogar_partida_automatica(
+        jogadores, rng, dict(zip(jogadores, (POLITICAS[p] for p in politicas))))
+    iddupla = iddupla or estado.duplas.get(idvencedor)
+    if iddupla is None:
+        vencedores = [idvencedor]
+    else:
+        vencedores = [j for j in estado.jogadores if estado.duplas[j] == iddupla]
+    return motivo, [jogadores.index(j) for j in vencedores], movimentos
+
+
+# ---------- processos ----------
+def iniciar_processo():
+    # Cada processo abre a sua própria conexão
+    configurar_pool(pool_size=1, max_overflow=0)
+
+
+# Executa um lote de partidas no processo atual
+def jogar_lote(tarefas, usuarios, jogadores_por_partida, politicas):
+    resultado = {"latencias": [], "movimentos": 0, "erros": 0,
+                 "vitorias": Counter(), "assentos": Counter(), "motivos": Counter()}
+    rng = random.Random()
+    for semente in tarefas:
+        rng.seed(semente)
+        jogadores = rng.sample(usuarios, jogadores_por_partida)
+        # Gira as políticas pela mesa para não favorecer nenhuma posição; com
+        # 4 jogadores a política é da dupla (assentos 1-2 e 3-4)
+        giro = rng.randrange(len(politicas))
+        por_dupla = 2 if jogadores_por_partida == 4 else 1
+        assentos = [politicas[(giro + i // por_dupla) % len(politicas)] for i in range(jogadores_por_partida)]
+        inicio = time.perf_counter()
+        try:
+            with unidade_de_trabalho():
+                motivo, vencedores, movimentos = partida_completa(jogadores, assentos, rng)
+        except Exception as e:
+            resultado["erros"] += 1
+            print(f"Erro (pid {os.getpid()}): {e}")
+            continue
+        resultado["latencias"].append(time.perf_counter() - inicio)
+        resultado["movimentos"] += movimentos
+        resultado["motivos"][motivo] += 1
+        resultado["assentos"].update(assentos)
+        resultado["vitorias"].update(assentos[i] for i in vencedores)
+    return resultado
+
+
+def criar_usuarios(quantidade):
+    with unidade_de_trabalho() as s:
+        usuarios = [conexao.Usuario(nome=f"bot_{i}") for i in range(quantidade)]
+        s.add_all(usuarios)
+        s.flush()
+        return [u.idusuario for u in usuarios]
+
+
+def executar(partidas, processos, jogadores_por_partida, politicas, semente, lote=25):
+    usuarios = criar_usuarios(jogadores_por_partida * 8)
+    # As conexões do processo principal não são herdadas pelos filhos
+    conexao.obter_engine().dispose()
+
+    rng = random.Random(semente)
+    sementes = [rng.random() for _ in range(partidas)]
+    lotes = [sementes[i:i + lote] for i in range(0, partidas, lote)]
+
+    total = {"latencias": [], "movimentos": 0, "erros": 0,
+             "vitorias": Counter(), "assentos": Counter(), "motivos": Counter()}
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos, initializer=iniciar_processo) as pool:
+        futuros = [pool.submit(jogar_lote, l, usuarios, jogadores_por_partida, politicas) for l in lotes]
+        for f in futuros:
+            r = f.result()
+            total["latencias"] += r["latencias"]
+            total["movimentos"] += r["movimentos"]
+            total["erros"] += r["erros"]
+            total["vitorias"].update(r["vitorias"])
+            total["assentos"].update(r["assentos"])
+            total["motivos"].update(r["motivos"])
+    decorrido = time.perf_counter() - inicio
+
+    jogadas = len(total["latencias"])
+    print(f"\n=== Autojogo: {partidas} partidas, {processos} processos, "
+          f"{jogadores_por_partida} jogadores, políticas {','.join(politicas)} ===")
+    print(f"Tempo total: {decorrido:.2f} s | Erros: {total['erros']}")
+    print(f"Partidas/s: {jogadas / decorrido:.1f} | Movimentos/s: {total['movimentos'] / decorrido:.1f}")
+    if jogadas:
+        print(f"Latência por partida (ms): p50={percentil(total['latencias'], 50) * 1000:.1f} "
+              f"p95={percentil(total['latencias'], 95) * 1000:.1f} "
+              f"p99={percentil(total['latencias'], 99) * 1000:.1f}")
+        print("Término: " + ", ".join(f"{m} {n / jogadas:.1%}" for m, n in total["motivos"].most_common()))
+        # Fração dos assentos ocupados pela política que terminaram vencedores
+        for p in sorted(total["assentos"]):
+            print(f"Vitórias por assento, {p}: {total['vitorias'][p] / total['assentos'][p]:.1%}")
+    return total["erros"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partidas automáticas com bots, em vários processos")
+    parser.add_argument("--partidas", type=int, default=1000)
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--jogadores", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--politicas", default="gulosa,aleatoria",
+                        help=f"políticas separadas por vírgula, em rodízio pela mesa ({', '.join(POLITICAS)})")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=25, help="partidas por tarefa enviada a um processo")
+    args = parser.parse_args()
+
+    politicas = args.politicas.split(",")
+    desconhecidas = [p for p in politicas if p not in POLITICAS]
+    if desconhecidas:
+        parser.error(f"política desconhecida: {', '.join(desconhecidas)}")
+    erros = executar(args.partidas, args.processos, args.jogadores, politicas, args.semente, args.lote)
+    raise SystemExit(1 if erros else 0)
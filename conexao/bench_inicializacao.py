@@ -0,0 +1,53 @@
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+# Mede o tempo de inicialização do processo até o menu estar pronto:
+#   modelos   -> `import main` com os modelos declarados (não conecta)
+#   reflexao  -> o que o conexao.py fazia antes: automap com reflexão do
+#                esquema inteiro no banco (precisa do Postgres rodando)
+#
+# Uso: python bench_inicializacao.py [-n 20] [--reflexao]
+
+CODIGO_MODELOS = "import main"
+
+CODIGO_REFLEXAO = """
+from sqlalchemy import create_engine
+from sqlalchemy.ext.automap import automap_base
+from sqlalchemy.orm import Session
+from conexao import DATABASE_URL
+engine = create_engine(DATABASE_URL)
+Base = automap_base()
+Base.prepare(autoload_with=engine)
+session = Session(engine)
+"""
+
+
+def medir(codigo, n):
+    tempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", codigo], check=True)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def resumo(nome, tempos):
+    print(f"{nome:<10} n={len(tempos):<3} mediana={statistics.median(tempos):8.1f} ms"
+          f"  mín={min(tempos):8.1f} ms  máx={max(tempos):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização")
+    parser.add_argument("-n", type=int, default=20, help="repetições por cenário")
+    parser.add_argument("--reflexao", action="store_true",
+                        help="compara com a reflexão via automap (requer o banco)")
+    args = parser.parse_args()
+
+    base = medir("pass", args.n)
+    resumo("python", base)
+    resumo("modelos", medir(CODIGO_MODELOS, args.n))
+    if args.reflexao:
+        resumo("reflexao", medir(CODIGO_REFLEXAO, args.n))
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from sqlalchemy import text
+
+from conexao import session, obter_engine
+from instrumentacao import Instrumentacao, percentil
+from resumos import preencher
+from verificar_indices import popular
+import main
+
+# Benchmark reproduzível do jogo contra um Postgres local: popula o banco
+# com usuários, partidas finalizadas e movimentações, mede distribuir_pecas,
+# uma partida inteira de jogar_partida_interativa (com input() respondido por
+# um jogador determinístico), ranking() e historico(), e grava p50/p95/p99
+# e comandos SQL por execução/turno em JSON.
+#
+# Uso: python benchmark.py [--usuarios 2000] [--partidas 20000] [--movimentos 26]
+#          [--repeticoes 50] [--semente 42] [--sem-popular]
+#          [--saida resultado.json] [--comparar base.json] [--tolerancia 0.2]
+#
+# Atenção: a população é gravada (commit) no banco configurado em conexao.py;
+# use um banco descartável.
+
+
+# ---------- população ----------
+# Partidas finalizadas por 'bater', com inícios espaçados de um minuto;
+# os gatilhos calculam pontos e estatísticas e os resumos são preenchidos
+def popular_banco(usuarios, partidas, movimentos):
+    with obter_engine().connect() as conn:
+        base_partida, _, _ = popular(conn, partidas, movimentos, usuarios)
+        conn.execute(text("""
+            UPDATE Partida P
+            SET dataHoraInicio = CURRENT_TIMESTAMP - (:n - (P.idPartida - :bp)) * INTERVAL '1 minute',
+                dataHoraFim = CURRENT_TIMESTAMP - (:n - (P.idPartida - :bp)) * INTERVAL '1 minute'
+                              + INTERVAL '10 minutes',
+                modoTermino = 'bater',
+                idJogadorVencedor = PU.idUsuario
+            FROM PartidaUsuario PU
+            WHERE P.idPartida > :bp
+              AND PU.idPartida = P.idPartida
+              AND PU.posicaoMesa = 1 + P.idPartida % 4
+        """), {"n": partidas, "bp": base_partida})
+        conn.commit()
+    preencher()
+
+
+# ---------- jogador determinístico ----------
+# Responde aos input() do jogo pelo texto da pergunta: sempre joga a
+# primeira peça válida (na esquerda, se couber nos dois lados), senão
+# compra; nas listagens, fica na primeira página
+def jogador_deterministico(pergunta=""):
+    if "(1-3)" in pergunta or "(1-2)" in pergunta or "Número da peça" in pergunta:
+        return "1"
+    if "extremidade" in pergunta:
+        return "E"
+    if "0 para voltar" in pergunta:
+        return "0"
+    return ""
+
+
+@contextmanager
+def sem_interacao():
+    main.input = jogador_deterministico
+    try:
+        with open(os.devnull, "w") as nulo, redirect_stdout(nulo):
+            yield
+    finally:
+        del main.input
+
+
+# ---------- medições ----------
+def usuarios_para_partida(rng, quantidade=4):
+    ids = session.execute(text("SELECT idUsuario FROM Usuario ORDER BY idUsuario")).scalars().all()
+    return rng.sample(ids, quantidade)
+
+
+# Executa `funcao` `repeticoes` vezes; `preparar` devolve os argumentos de
+# cada execução e roda antes, fora da medição. Retorna tempos, comandos por
+# execução e o SQL por função.
+def medir(instrumentacao, repeticoes, funcao, preparar=lambda i: ()):
+    tempos, comandos = [], []
+    execucoes = [preparar(i) for i in range(repeticoes)]
+    instrumentacao.zerar()
+    for args in execucoes:
+        antes = sum(m["comandos"] for m in instrumentacao.instantaneo().values())
+        inicio = time.perf_counter()
+        with sem_interacao():
+            funcao(*args)
+        tempos.append(time.perf_counter() - inicio)
+        comandos.append(sum(m["comandos"] for m in instrumentacao.instantaneo().values()) - antes)
+    return tempos, comandos, instrumentacao.instantaneo()
+
+
+def resumo(tempos, comandos, por_funcao, turnos=None):
+    resultado = {
+        "execucoes": len(tempos),
+        "media_ms": round(sum(tempos) / len(tempos) * 1000, 3),
+        "p50_ms": round(percentil(tempos, 50) * 1000, 3),
+        "p95_ms": round(percentil(tempos, 95) * 1000, 3),
+        "p99_ms": round(percentil(tempos, 99) * 1000, 3),
+        "comandos_por_execucao": round(sum(comandos) / len(comandos), 2),
+        "sql_por_funcao": {nome: m["comandos"] for nome, m in sorted(por_funcao.items())},
+    }
+    if turnos:
+        resultado["turnos"] = sum(turnos)
+        resultado["comandos_por_turno"] = round(sum(comandos) / sum(turnos), 2)
+    return resultado
+
+
+def executar(repeticoes, semente):
+    rng = random.Random(semente)
+    instrumentacao = Instrumentacao()
+    instrumentacao.instrumentar(obter_engine())
+    resultados = {}
+
+    # distribuir_pecas: cada execução distribui uma partida nova
+    def nova_partida(i):
+        idpartida = main.criar_partida(usuarios_para_partida(rng))
+        session.commit()
+        return idpartida, rng.random()
+    resultados["distribuir_pecas"] = resumo(*medir(instrumentacao, repeticoes, main.distribuir_pecas, nova_partida))
+
+    # Partida inteira, do início à finalização
+    partidas = []
+    def partida_jogavel(i):
+        idpartida = main.criar_partida(usuarios_para_partida(rng))
+        session.commit()
+        partidas.append(idpartida)
+        return idpartida, rng.random()
+    tempos, comandos, por_funcao = medir(instrumentacao, repeticoes, main.jogar_partida_interativa, partida_jogavel)
+    turnos = session.execute(text(
+        "SELECT proximaOrdemAcao - 1 FROM Partida WHERE idPartida = ANY(:ids) ORDER BY idPartida"
+    ), {"ids": partidas}).scalars().all()
+    resultados["jogar_partida_interativa"] = resumo(tempos, comandos, por_funcao, turnos)
+
+    resultados["ranking"] = resumo(*medir(instrumentacao, repeticoes, main.ranking))
+    resultados["historico"] = resumo(*medir(instrumentacao, repeticoes, main.historico))
+    session.close()
+    return resultados
+
+
+def contagens():
+    with obter_engine().connect() as conn:
+        return {tabela: conn.execute(text(f"SELECT COUNT(*) FROM {tabela}")).scalar()
+                for tabela in ("Usuario", "Partida", "Movimentacao", "ResumoPartida")}
+
+
+def versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ---------- comparação ----------
+# Compara com uma execução anterior; regressão é p50 acima da tolerância ou
+# mais comandos SQL por execução
+def comparar(atual, base, tolerancia):
+    regressoes = []
+    for nome, r in atual["resultados"].items():
+        anterior = base["resultados"].get(nome)
+        if anterior is None:
+            continue
+        variacao = r["p50_ms"] / anterior["p50_ms"] - 1 if anterior["p50_ms"] else 0.0
+        print(f"{nome:<26} p50 {anterior['p50_ms']:>9.2f} -> {r['p50_ms']:>9.2f} ms ({variacao:+.0%}) | "
+              f"comandos {anterior['comandos_por_execucao']} -> {r['comandos_por_execucao']}")
+        if variacao > tolerancia:
+            regressoes.append(f"{nome}: p50 {variacao:+.0%}")
+        if r["comandos_por_execucao"] > anterior["comandos_por_execucao"]:
+            regressoes.append(f"{nome}: comandos por execução "
+                              f"{anterior['comandos_por_execucao']} -> {r['comandos_por_execucao']}")
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de distribuição, partida, ranking e histórico")
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--partidas", type=int, default=20000, help="partidas finalizadas na população")
+    parser.add_argument("--movimentos", type=int, default=26, help="movimentações por partida populada")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sem-popular", action="store_true", help="usa o banco como está")
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="aumento de p50 tolerado (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not args.sem_popular:
+        inicio = time.perf_counter()
+        popular_banco(args.usuarios, args.partidas, args.movimentos)
+        print(f"Banco populado em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+    atual = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "git": versao_git(),
+            "python": platform.python_version(),
+            "parametros": vars(args),
+            "banco": contagens(),
+        },
+        "resultados": executar(args.repeticoes, args.semente),
+    }
+
+    for nome, r in atual["resultados"].items():
+        turno = f" | {r['comandos_por_turno']} por turno" if "comandos_por_turno" in r else ""
+        print(f"{nome:<26} p50={r['p50_ms']:.2f} p95={r['p95_ms']:.2f} p99={r['p99_ms']:.2f} ms | "
+              f"{r['comandos_por_execucao']} comandos por execução{turno}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf8") as f:
+            json.dump(atual, f, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf8") as f:
+            regressoes = comparar(atual, json.load(f), args.tolerancia)
+        for r in regressoes:
+            print(f"REGRESSÃO: {r}")
+        sys.exit(1 if regressoes else 0)
@@ -0,0 +1,495 @@
+import gc
+import os
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from motor import ConjuntoPecas, EstadoPartida, PecaDomino, bits, verificar_fim_partida
+
+# Jogador do computador com tempo limite por jogada. As mãos escondidas são
+# sorteadas várias vezes (determinização) de acordo com o que o jogador vê:
+# a própria mão, a mesa e quantas peças cada um tem. Em cada sorteio roda
+# uma busca minimax com poda alfa-beta (o time do jogador contra os demais),
+# com aprofundamento iterativo até o prazo e tabela de transposição
+# compartilhada entre sorteios, profundidades e jogadas da mesma partida.
+# Os sorteios podem ser divididos entre processos.
+#
+# Uso: python bot.py [--partidas 200] [--jogadores 4] [--ms 50] [--amostras 8] [--processos 1]
+#      (benchmark sem banco: decisões por segundo e taxa de vitória contra a gulosa)
+
+# Tempo limite padrão por jogada, em milissegundos
+LIMITE_MS = int(os.environ.get("CAPIVARA_BOT_MS", "50"))
+
+VITORIA = 1000
+TAMANHO_TABELA = 500_000
+MARGEM_PROCESSOS = 0.01
+# Folga sobre o tempo limite para desfazer a busca e escolher a jogada
+MARGEM_PRAZO = 0.002
+
+EXATO, INFERIOR, SUPERIOR = 0, 1, 2
+
+
+class Esgotado(Exception):
+    pass
+
+
+# A busca não cria ciclos de referências: o coletor de ciclos fica parado
+# enquanto o relógio da jogada corre, senão uma coleta completa (~10 ms num
+# processo com o SQLAlchemy carregado) estoura o prazo. A coleta adiada
+# roda depois que a jogada foi devolvida.
+def sem_coletor(funcao, *args):
+    ativo = gc.isenabled()
+    gc.disable()
+    try:
+        return funcao(*args)
+    finally:
+        if ativo:
+            gc.enable()
+
+
+# Tabelas do conjunto para a busca: lados e pontos por bit e a soma de
+# pontos de uma máscara em 4 consultas de 7 bits
+class Tabelas:
+    def __init__(self, conjunto):
+        self.conjunto = conjunto
+        self.lados = [(p.ladoa, p.ladob) for p in conjunto.pecas]
+        self.pontos_bit = [p.pontospeca for p in conjunto.pecas]
+        self.por_valor = conjunto.por_valor
+        self.todas = conjunto.todas
+        self.blocos = []
+        for k in range(0, len(conjunto.pecas), 7):
+            self.blocos.append([
+                sum(self.pontos_bit[k + i] for i in range(7) if m >> i & 1 and k + i < len(self.pontos_bit))
+                for m in range(128)
+            ])
+
+    def pontos(self, mascara):
+        total = 0
+        for bloco in self.blocos:
+            total += bloco[mascara & 127]
+            mascara >>= 7
+        return total
+
+    def aberta(self, esq, dir_):
+        if esq < 0:
+            return self.todas
+        return self.por_valor[esq] | self.por_valor[dir_]
+
+
+# Contexto de uma busca: prazo, time de cada assento e a ordem das compras
+class Busca:
+    def __init__(self, tabelas, n, raiz, prazo, ordem_compra, tabela):
+        self.t = tabelas
+        self.n = n
+        self.time = [i // 2 for i in range(n)] if n == 4 else list(range(n))
+        self.time_raiz = self.time[raiz]
+        self.prazo = prazo
+        self.ordem_compra = ordem_compra
+        self.tabela = tabela
+        self.nos = 0
+        self.cortou = False
+
+    # Valor de uma partida encerrada para o time da raiz
+    def final(self, maos, vencedor_time):
+        if self.n == 4:
+            pontos = sum(self.t.pontos(m) for i, m in enumerate(maos) if self.time[i] != vencedor_time)
+        else:
+            pontos = sum(self.t.pontos(m) for i, m in enumerate(maos) if i != vencedor_time)
+        return VITORIA + pontos if vencedor_time == self.time_raiz else -(VITORIA + pontos)
+
+    def trancamento(self, maos):
+        if self.n == 4:
+            d0 = self.t.pontos(maos[0]) + self.t.pontos(maos[1])
+            d1 = self.t.pontos(maos[2]) + self.t.pontos(maos[3])
+            vencedor, outro = (0, d1) if d0 <= d1 else (1, d0)
+        else:
+            pts = [self.t.pontos(m) for m in maos]
+            vencedor = pts.index(min(pts))
+            outro = min(p for i, p in enumerate(pts) if i != vencedor)
+        return VITORIA + outro if vencedor == self.time_raiz else -(VITORIA + outro)
+
+    # Estimativa sem buscar mais: pontos e peças nas mãos, meus contra os deles
+    def heuristica(self, maos):
+        valor = 0
+        for i, m in enumerate(maos):
+            v = self.t.pontos(m) + 8 * m.bit_count()
+            valor += v if self.time[i] != self.time_raiz else -v
+        return valor
+
+    # Jogadas possíveis: (bit, extremidade, filho) com o filho em
+    # (maos, monte, esq, dir, vez, valor_final ou None)
+    def filhos(self, maos, monte, esq, dir_, vez):
+        t = self.t
+        mao = maos[vez]
+        jogaveis = mao & t.aberta(esq, dir_)
+        proximo = (vez + 1) % self.n
+        resultado = []
+        if jogaveis:
+            for i in bits(jogaveis):
+                a, b = t.lados[i]
+                nova_mao = mao & ~(1 << i)
+                novas = maos[:vez] + (nova_mao,) + maos[vez + 1:]
+                if esq < 0:
+                    opcoes = [("centro", a, b)]
+                else:
+                    opcoes = []
+                    if esq in (a, b):
+                        opcoes.append(("esquerda", b if a == esq else a, dir_))
+                    if dir_ in (a, b) and not (esq == dir_ and opcoes):
+                        opcoes.append(("direita", esq, b if a == dir_ else a))
+                for extremidade, ne, nd in opcoes:
+                    if not nova_mao:
+                        fim = self.final(novas, self.time[vez])
+                    elif not monte and not any(m & t.aberta(ne, nd) for m in novas):
+                        fim = self.trancamento(novas)
+                    else:
+                        fim = None
+                    resultado.append((i, extremidade, (novas, monte, ne, nd, proximo, fim)))
+        elif monte:
+            i = min(bits(monte), key=self.ordem_compra.__getitem__)
+            novas = maos[:vez] + (mao | 1 << i,) + maos[vez + 1:]
+            resto = monte & ~(1 << i)
+            aberta = t.aberta(esq, dir_)
+            fim = self.trancamento(novas) if not resto and not any(m & aberta for m in novas) else None
+            resultado.append((None, "comprar", (novas, resto, esq, dir_, proximo, fim)))
+        else:
+            resultado.append((None, "passar", (maos, monte, esq, dir_, proximo, None)))
+        return resultado
+
+    def buscar(self, maos, monte, esq, dir_, vez, profundidade, alfa, beta):
+        self.nos += 1
+        if time.perf_counter() > self.prazo:
+            raise Esgotado()
+        if profundidade == 0:
+            self.cortou = True
+            return self.heuristica(maos)
+
+        chave = (maos, monte, esq, dir_, vez, self.time_raiz)
+        registro = self.tabela.get(chave)
+        melhor_bit = None
+        if registro is not None:
+            prof, valor, tipo, melhor_bit = registro
+            if prof >= profundidade:
+                if tipo == EXATO:
+                    return valor
+                if tipo == INFERIOR and valor >= beta:
+                    return valor
+                if tipo == SUPERIOR and valor <= alfa:
+                    return valor
+
+        filhos = self.filhos(maos, monte, esq, dir_, vez)
+        # Ordem: a melhor jogada da tabela primeiro, depois as peças maiores
+        filhos.sort(key=lambda f: (f[0] != melhor_bit, -(self.t.pontos_bit[f[0]] if f[0] is not None else 0)))
+        maximiza = self.time[vez] == self.time_raiz
+        alfa_original, beta_original = alfa, beta
+        melhor = -float("inf") if maximiza else float("inf")
+        escolhido = None
+        for bit, _, (m, mo, e, d, v, fim) in filhos:
+            valor = fim if fim is not None else self.buscar(m, mo, e, d, v, profundidade - 1, alfa, beta)
+            if maximiza:
+                if valor > melhor:
+                    melhor, escolhido = valor, bit
+                alfa = max(alfa, valor)
+            else:
+                if valor < melhor:
+                    melhor, escolhido = valor, bit
+                beta = min(beta, valor)
+            if alfa >= beta:
+                break
+
+        if melhor <= alfa_original:
+            tipo = SUPERIOR
+        elif melhor >= beta_original:
+            tipo = INFERIOR
+        else:
+            tipo = EXATO
+        if len(self.tabela) >= TAMANHO_TABELA:
+            self.tabela.clear()
+        self.tabela[chave] = (profundidade, melhor, tipo, escolhido)
+        return melhor
+
+
+# Sorteia as mãos escondidas: as peças que o jogador não vê vão para os
+# adversários conforme a quantidade de cada um, e o resto para o monte
+def determinizar(rng, visao):
+    maos, raiz, escondidas = list(visao["maos"]), visao["raiz"], list(visao["escondidas"])
+    rng.shuffle(escondidas)
+    k = 0
+    for i, quantidade in enumerate(visao["quantidades"]):
+        if i == raiz:
+            continue
+        m = 0
+        for bit in escondidas[k:k + quantidade]:
+            m |= 1 << bit
+        maos[i] = m
+        k += quantidade
+    monte = 0
+    for bit in escondidas[k:]:
+        monte |= 1 << bit
+    return tuple(maos), monte
+
+
+# Aprofundamento iterativo sobre `amostras` sorteios até o prazo; retorna
+# (profundidade completa, {(bit, extremidade): soma dos valores}, amostras, nós).
+# A tabela só vale para a mesma `ordem` das compras: o Bot mantém as duas
+# durante a partida. Sem `ordem`, sorteia uma.
+def pensar(tabelas, visao, amostras, semente, prazo, tabela=None, ordem=None):
+    rng = random.Random(semente)
+    sorteios = [determinizar(rng, visao) for _ in range(amostras)]
+    if ordem is None:
+        ordem = list(range(len(tabelas.lados)))
+        rng.shuffle(ordem)
+    busca = Busca(tabelas, len(visao["quantidades"]), visao["raiz"], prazo, ordem,
+                  {} if tabela is None else tabela)
+    completa, valores = 0, {}
+    profundidade = 1
+    try:
+        while True:
+            busca.cortou = False
+            soma = {}
+            for maos, monte in sorteios:
+                if time.perf_counter() > prazo:
+                    raise Esgotado()
+                for bit, extremidade, (m, mo, e, d, v, fim) in busca.filhos(
+                        maos, monte, visao["esq"], visao["dir"], visao["raiz"]):
+                    valor = fim if fim is not None else busca.buscar(
+                        m, mo, e, d, v, profundidade - 1, -float("inf"), float("inf"))
+                    soma[(bit, extremidade)] = soma.get((bit, extremidade), 0) + valor
+            completa, valores = profundidade, soma
+            # Todas as folhas foram fins de partida: mais fundo não muda nada
+            if not busca.cortou:
+                break
+            profundidade += 1
+    except Esgotado:
+        pass
+    return completa, valores, amostras, busca.nos
+
+
+# ---------- processos ----------
+_tabelas_processo = None
+_tabela_processo = {}
+_partida_processo = None
+
+
+def iniciar_processo(pecas):
+    global _tabelas_processo
+    _tabelas_processo = Tabelas(ConjuntoPecas(PecaDomino(*p) for p in pecas))
+
+
+def pensar_no_processo(visao, amostras, semente, prazo_restante, partida, ordem):
+    global _partida_processo
+    prazo = time.perf_counter() + prazo_restante
+    if partida != _partida_processo:
+        _tabela_processo.clear()
+        _partida_processo = partida
+    return sem_coletor(pensar, _tabelas_processo, visao, amostras, semente, prazo, _tabela_processo, ordem)
+
+
+class Bot:
+    def __init__(self, conjunto, limite_ms=LIMITE_MS, amostras=8, processos=1, semente=None):
+        self.tabelas = Tabelas(conjunto)
+        self.limite = limite_ms / 1000
+        self.amostras = amostras
+        self.rng = random.Random(semente)
+        # Tabela de transposição e ordem das compras da partida em curso
+        self.tabela = {}
+        self.ordem = None
+        self.estado = None
+        self.partidas = 0
+        self.pool = None
+        if processos > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=processos, initializer=iniciar_processo,
+                initargs=([tuple(p) for p in conjunto.pecas],),
+            )
+            self.processos = processos
+        # Estatísticas
+        self.decisoes = 0
+        self.buscas = 0
+        self.segundos = 0.0
+        self.profundidades = 0
+        self.nos = 0
+
+    def fechar(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Nova partida: esvazia a tabela e sorteia a ordem das compras, que
+    # fica a mesma até o fim dela para a tabela continuar válida
+    def nova_partida(self, estado):
+        self.estado = estado
+        self.partidas += 1
+        self.tabela.clear()
+        self.ordem = list(range(len(self.tabelas.lados)))
+        self.rng.shuffle(self.ordem)
+
+    # O que o jogador `idusuario` sabe da partida
+    def visao(self, estado, idusuario):
+        raiz = estado.jogadores.index(idusuario)
+        mesa = estado.conjunto.mascara(i for i, _ in estado.mesa)
+        minha = estado.maos[idusuario]
+        return {
+            "raiz": raiz,
+            "maos": tuple(minha if j == idusuario else 0 for j in estado.jogadores),
+            "quantidades": [estado.maos[j].bit_count() for j in estado.jogadores],
+            "escondidas": list(bits(estado.conjunto.todas & ~minha & ~mesa)),
+            "esq": -1 if estado.mesa_vazia() else estado.ext_esq,
+            "dir": -1 if estado.mesa_vazia() else estado.ext_dir,
+        }
+
+    # Escolhe a jogada: (peça, extremidade), ou None quando não há peça que
+    # encaixe (o jogo então compra ou passa)
+    def escolher(self, estado, idusuario):
+        return sem_coletor(self._escolher, estado, idusuario)
+
+    def _escolher(self, estado, idusuario):
+        inicio = time.perf_counter()
+        self.decisoes += 1
+        validas = estado.jogadas_validas(idusuario)
+        opcoes = [(p, e) for p in validas for e in estado.encaixes(p)]
+        if len(opcoes) <= 1:
+            self.segundos += time.perf_counter() - inicio
+            return opcoes[0] if opcoes else None
+
+        if estado is not self.estado:
+            self.nova_partida(estado)
+        visao = self.visao(estado, idusuario)
+        prazo = inicio + self.limite - MARGEM_PRAZO
+        if self.pool is None:
+            resultados = [pensar(self.tabelas, visao, self.amostras, self.rng.random(), prazo,
+                                 self.tabela, self.ordem)]
+        else:
+            por_processo = max(1, self.amostras // self.processos)
+            # Desconta o envio e a volta dos resultados entre processos
+            futuros = [self.pool.submit(pensar_no_processo, visao, por_processo, self.rng.random(),
+                                        prazo - time.perf_counter() - MARGEM_PROCESSOS,
+                                        self.partidas, self.ordem)
+                       for _ in range(self.processos)]
+            resultados = [f.result() for f in futuros]
+
+        # Junta as estimativas da maior profundidade que cada busca completou
+        soma, amostras, profundidade = {}, {}, 0
+        for completa, valores, n, nos in resultados:
+            self.nos += nos
+            if not completa:
+                continue
+            profundidade = max(profundidade, completa)
+            for jogada, valor in valores.items():
+                soma[jogada] = soma.get(jogada, 0) + valor
+                amostras[jogada] = amostras.get(jogada, 0) + n
+
+        self.buscas += 1
+        self.profundidades += profundidade
+        self.segundos += time.perf_counter() - inicio
+        if not soma:
+            # Sem tempo nem para a profundidade 1: a peça de mais pontos
+            return max(opcoes, key=lambda o: o[0].pontospeca)
+        bit, extremidade = max(soma, key=lambda j: soma[j] / amostras[j])
+        return estado.conjunto.pecas[bit], extremidade
+
+
+# ---------- benchmark (sem banco) ----------
+def conjunto_padrao():
+    pecas = [(a, b) for a in range(7) for b in range(a, 7)]
+    return ConjuntoPecas(PecaDomino(i + 1, a, b, a + b) for i, (a, b) in enumerate(pecas))
+
+
+# Joga uma partida em memória; `jogadores` mapeia assento -> função
+# (estado, idusuario) que devolve (peça, extremidade) ou None. Retorna os
+# assentos vencedores.
+def partida_em_memoria(conjunto, escolhas, rng):
+    n = len(escolhas)
+    jogadores = list(range(1, n + 1))
+    duplas = {j: (1 if j <= 2 else 2) for j in jogadores} if n == 4 else {}
+    estado = EstadoPartida(0, conjunto, jogadores, duplas=duplas)
+    estado.rng = rng
+    ids = [p.idpeca for p in conjunto.pecas]
+    rng.shuffle(ids)
+    for k, j in enumerate(jogadores):
+        estado.maos[j] = conjunto.mascara(ids[7 * k:7 * k + 7])
+    estado.monte = conjunto.mascara(ids[7 * n:])
+
+    peca_66 = conjunto.buscar(6, 6)
+    atual = estado.dono(peca_66.idpeca)
+    anterior = None
+    if atual is not None:
+        estado.jogar(atual, peca_66.idpeca, "centro")
+        anterior, atual = atual, estado.proximo_jogador(atual)
+    else:
+        atual = rng.choice(jogadores)
+
+    while True:
+        fim = verificar_fim_partida(estado, anterior)
+        if fim:
+            _, idvencedor, iddupla = fim
+            iddupla = iddupla or duplas.get(idvencedor)
+            if iddupla is None:
+                return [idvencedor - 1]
+            return [j - 1 for j in jogadores if duplas[j] == iddupla]
+        jogada = escolhas[atual - 1](estado, atual)
+        if jogada:
+            estado.jogar(atual, jogada[0].idpeca, jogada[1])
+        else:
+            estado.comprar(atual)
+        anterior, atual = atual, estado.proximo_jogador(atual)
+
+
+def benchmark(partidas, jogadores, limite_ms, amostras, processos, semente):
+    from autojogo import jogar_gulosa
+    conjunto = conjunto_padrao()
+    bot = Bot(conjunto, limite_ms, amostras, processos, semente)
+    rng = random.Random(semente)
+
+    def gulosa(estado, idusuario):
+        validas = estado.jogadas_validas(idusuario)
+        return jogar_gulosa(estado, idusuario, validas, rng) if validas else None
+
+    vitorias = assentos = 0
+    latencias = []
+
+    def com_bot(estado, idusuario):
+        inicio = time.perf_counter()
+        jogada = bot.escolher(estado, idusuario)
+        latencias.append(time.perf_counter() - inicio)
+        return jogada
+
+    inicio = time.perf_counter()
+    for i in range(partidas):
+        # O bot fica com a primeira dupla (ou o primeiro assento) e depois
+        # com a outra, alternando, para não favorecer posição
+        if jogadores == 4:
+            bot_assentos = {0, 1} if i % 2 == 0 else {2, 3}
+        else:
+            bot_assentos = {i % jogadores}
+        escolhas = [com_bot if s in bot_assentos else gulosa for s in range(jogadores)]
+        vencedores = partida_em_memoria(conjunto, escolhas, random.Random(rng.random()))
+        vitorias += bool(bot_assentos & set(vencedores))
+        assentos += 1
+    decorrido = time.perf_counter() - inicio
+    bot.fechar()
+
+    latencias.sort()
+    p = lambda q: latencias[min(len(latencias) - 1, int(len(latencias) * q))] * 1000
+    esperado = 0.5 if jogadores in (2, 4) else 1 / jogadores
+    print(f"\n=== Bot: {partidas} partidas, {jogadores} jogadores, {limite_ms} ms, "
+          f"{amostras} sorteios, {processos} processo(s) ===")
+    print(f"Tempo total: {decorrido:.1f} s")
+    print(f"Decisões: {bot.decisoes} ({bot.decisoes / bot.segundos:.0f}/s de tempo do bot) | "
+          f"com busca: {bot.buscas} ({bot.buscas / max(bot.segundos, 1e-9):.0f}/s)")
+    print(f"Latência por decisão (ms): p50={p(0.5):.1f} p95={p(0.95):.1f} p99={p(0.99):.1f} máx={latencias[-1] * 1000:.1f}")
+    print(f"Profundidade média: {bot.profundidades / max(bot.buscas, 1):.1f} | nós: {bot.nos}")
+    print(f"Vitórias do bot contra a gulosa: {vitorias / assentos:.1%} (sem vantagem: {esperado:.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do bot contra a política gulosa")
+    parser.add_argument("--partidas", type=int, default=200)
+    parser.add_argument("--jogadores", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--ms", type=int, default=50, help="tempo limite por jogada")
+    parser.add_argument("--amostras", type=int, default=8, help="sorteios das mãos escondidas por jogada")
+    parser.add_argument("--processos", type=int, default=1)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    benchmark(args.partidas, args.jogadores, args.ms, args.amostras, args.processos, args.semente)
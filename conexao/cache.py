@@ -0,0 +1,190 @@
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import text, bindparam, event
+from sqlalchemy.orm import Session
+
+# Cache por processo dos dados que quase não mudam: nome dos usuários e
+# assentos de cada partida (ordem da mesa, duplas e nomes das duplas). Cada
+# cache é um LRU com validade (TTL); cadastrar_usuario e criar_partida
+# gravam as entradas novas com definir_apos_commit, que só as põe no cache
+# quando a transação é confirmada. As peças não passam por aqui: o
+# conjunto é imutável e é carregado uma vez por processo (motor.obter_conjunto).
+#
+# Tamanhos e validade: CAPIVARA_CACHE_USUARIOS, CAPIVARA_CACHE_PARTIDAS,
+# CAPIVARA_CACHE_TTL (segundos).
+
+TTL_PADRAO = float(os.environ.get("CAPIVARA_CACHE_TTL", "300"))
+
+# jogadores: [(idusuario, iddupla), ...] na ordem da mesa;
+# duplas: {iddupla: nomedupla}
+Assentos = namedtuple("Assentos", ["jogadores", "duplas"])
+
+_AUSENTE = object()
+
+
+# LRU com validade por entrada, seguro entre threads
+class CacheLRU:
+    def __init__(self, nome, tamanho, ttl=TTL_PADRAO):
+        self.nome = nome
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.entradas = OrderedDict()       # chave -> (valor, expira_em)
+        self.trava = threading.Lock()
+        self.acertos = self.falhas = self.expiradas = self.removidas = 0
+
+    def _buscar(self, chave, agora):
+        item = self.entradas.get(chave)
+        if item is None:
+            return _AUSENTE
+        if item[1] <= agora:
+            del self.entradas[chave]
+            self.expiradas += 1
+            return _AUSENTE
+        self.entradas.move_to_end(chave)
+        return item[0]
+
+    def definir(self, chave, valor):
+        with self.trava:
+            self.entradas[chave] = (valor, time.monotonic() + self.ttl)
+            self.entradas.move_to_end(chave)
+            while len(self.entradas) > self.tamanho:
+                self.entradas.popitem(last=False)
+                self.removidas += 1
+
+    # Valor da chave; numa falha chama `carregar(chave)` e guarda o resultado
+    def obter(self, chave, carregar):
+        return self.obter_varios([chave], lambda faltam: {chave: carregar(chave)})[chave]
+
+    # Valores de várias chaves; as que faltam vêm de uma única chamada a
+    # `carregar(chaves)`, que devolve um dicionário
+    def obter_varios(self, chaves, carregar):
+        agora = time.monotonic()
+        encontrados, faltam = {}, []
+        with self.trava:
+            for chave in chaves:
+                valor = self._buscar(chave, agora)
+                if valor is _AUSENTE:
+                    faltam.append(chave)
+                else:
+                    encontrados[chave] = valor
+            self.acertos += len(encontrados)
+            self.falhas += len(faltam)
+        if faltam:
+            carregados = carregar(faltam)
+            for chave, valor in carregados.items():
+                self.definir(chave, valor)
+            encontrados.update(carregados)
+        return encontrados
+
+    def invalidar(self, chave=_AUSENTE):
+        with self.trava:
+            if chave is _AUSENTE:
+                self.entradas.clear()
+            else:
+                self.entradas.pop(chave, None)
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            "entradas": len(self.entradas),
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "expiradas": self.expiradas,
+            "removidas": self.removidas,
+            "taxa_acerto": round(self.acertos / consultas, 4) if consultas else None,
+        }
+
+    def zerar(self):
+        with self.trava:
+            self.acertos = self.falhas = self.expiradas = self.removidas = 0
+
+
+# ---------- escrita na confirmação ----------
+_PENDENTES = "cache_pendentes"
+
+
+# Grava a entrada no cache quando a transação da sessão for confirmada; se
+# ela for desfeita, a entrada é descartada e o cache não vê o que o banco
+# não tem
+def definir_apos_commit(session, cache, chave, valor):
+    session.info.setdefault(_PENDENTES, []).append((cache, chave, valor))
+
+
+@event.listens_for(Session, "after_commit")
+def _gravar_pendentes(session):
+    for cache, chave, valor in session.info.pop(_PENDENTES, ()):
+        cache.definir(chave, valor)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendentes(session):
+    session.info.pop(_PENDENTES, None)
+
+
+usuarios = CacheLRU("usuarios", int(os.environ.get("CAPIVARA_CACHE_USUARIOS", "10000")))
+assentos = CacheLRU("assentos", int(os.environ.get("CAPIVARA_CACHE_PARTIDAS", "1000")))
+CACHES = (usuarios, assentos)
+
+
+# ---------- carga ----------
+def _consulta(session, sql, ids):
+    return session.execute(text(sql).bindparams(bindparam("ids", expanding=True)), {"ids": list(ids)})
+
+
+# Nomes de vários usuários: {idusuario: nome}. As falhas vêm do banco; um
+# id que também não está lá é erro (ValueError), não uma chave a menos
+def nomes(session, ids):
+    ids = list(ids)
+    encontrados = usuarios.obter_varios(ids, lambda faltam: dict(_consulta(session, """
+        SELECT idusuario, nome FROM usuario WHERE idusuario IN :ids
+    """, faltam).fetchall()))
+    ausentes = sorted(set(ids) - encontrados.keys())
+    if ausentes:
+        raise ValueError(f"Usuário(s) inexistente(s): {ausentes}")
+    return encontrados
+
+
+def nome(session, idusuario):
+    return nomes(session, [idusuario])[idusuario]
+
+
+# Só as partidas com assentos gravados; as demais ficam fora do cache
+def _carregar_assentos(session, idspartidas):
+    resultado = {}
+    for idpartida, idusuario, iddupla, nomedupla in _consulta(session, """
+        SELECT PU.idpartida, PU.idusuario, PU.iddupla, D.nomedupla
+        FROM partidausuario PU
+        LEFT JOIN dupla D ON D.iddupla = PU.iddupla
+        WHERE PU.idpartida IN :ids
+        ORDER BY PU.idpartida, PU.posicaomesa
+    """, idspartidas):
+        partida = resultado.setdefault(idpartida, Assentos([], {}))
+        partida.jogadores.append((idusuario, iddupla))
+        if iddupla is not None:
+            partida.duplas[iddupla] = nomedupla
+    return resultado
+
+
+# Assentos de uma partida (Assentos); ValueError se ela não tem assentos
+def assentos_partida(session, idpartida):
+    encontrados = assentos.obter_varios([idpartida], lambda faltam: _carregar_assentos(session, faltam))
+    if idpartida not in encontrados:
+        raise ValueError(f"Partida {idpartida} inexistente ou sem jogadores")
+    return encontrados[idpartida]
+
+
+# Contadores de todos os caches, por nome
+def estatisticas():
+    return {c.nome: c.estatisticas() for c in CACHES}
+
+
+def relatorio():
+    linhas = []
+    for nome_cache, e in estatisticas().items():
+        taxa = "-" if e["taxa_acerto"] is None else f"{e['taxa_acerto']:.1%}"
+        linhas.append(f"{nome_cache:<10} acertos {e['acertos']:>8} | falhas {e['falhas']:>7} | "
+                      f"taxa {taxa:>6} | expiradas {e['expiradas']} | removidas {e['removidas']} | "
+                      f"entradas {e['entradas']}")
+    return "\n".join(linhas)
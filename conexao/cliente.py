@@ -0,0 +1,131 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+# Cliente do servidor asyncio e script de carga.
+#
+#   python cliente.py '{"op": "ranking"}'            envia um comando
+#   python cliente.py --carga --partidas 500          joga 500 partidas simultâneas
+#   (--unix /tmp/capivara.sock para usar socket Unix)
+
+
+class Cliente:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def conectar(cls, host="127.0.0.1", porta=7000, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, porta)
+        return cls(reader, writer)
+
+    async def enviar(self, op, **campos):
+        self.writer.write(json.dumps({"op": op, **campos}).encode() + b"\n")
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def fechar(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+# Joga uma partida do início ao fim pelo protocolo, com uma conexão por
+# partida: joga a primeira peça possível, senão compra, senão passa
+async def jogar_partida(cliente, jogadores, rng):
+    r = await cliente.enviar("criar_partida", jogadores=jogadores)
+    idpartida = r["idpartida"]
+    visao = await cliente.enviar("iniciar", idpartida=idpartida, semente=rng.random())
+    movimentos = 0
+
+    while visao["ok"] and not visao["fim"]:
+        vez = visao["vez"]
+        visao = await cliente.enviar("estado", idpartida=idpartida, idusuario=vez)
+        if visao["jogaveis"]:
+            idpeca, encaixes = visao["jogaveis"][0]
+            visao = await cliente.enviar("jogar", idpartida=idpartida, idusuario=vez,
+                                         idpeca=idpeca, extremidade=encaixes[0])
+        elif visao["monte"]:
+            visao = await cliente.enviar("comprar", idpartida=idpartida, idusuario=vez)
+        else:
+            visao = await cliente.enviar("passar", idpartida=idpartida, idusuario=vez)
+        movimentos += 1
+
+    if not visao["ok"]:
+        raise RuntimeError(visao["erro"])
+    return movimentos
+
+
+async def carga(partidas, jogadores_por_partida, concorrencia, conexao_args):
+    rng = random.Random(42)
+    cliente = await Cliente.conectar(**conexao_args)
+    usuarios = []
+    for i in range(jogadores_por_partida * 8):
+        usuarios.append((await cliente.enviar("criar_jogador", nome=f"carga_{i}"))["idusuario"])
+    await cliente.fechar()
+
+    limite = asyncio.Semaphore(concorrencia)
+    latencias, erros = [], 0
+
+    async def uma():
+        nonlocal erros
+        async with limite:
+            c = await Cliente.conectar(**conexao_args)
+            inicio = time.perf_counter()
+            try:
+                mov = await jogar_partida(c, rng.sample(usuarios, jogadores_por_partida), rng)
+                latencias.append(time.perf_counter() - inicio)
+                return mov
+            except Exception as e:
+                erros += 1
+                print(f"Erro: {e}")
+                return 0
+            finally:
+                await c.fechar()
+
+    inicio = time.perf_counter()
+    movimentos = sum(await asyncio.gather(*(uma() for _ in range(partidas))))
+    decorrido = time.perf_counter() - inicio
+
+    latencias.sort()
+    print(f"\n=== Carga: {partidas} partidas, {concorrencia} simultâneas ===")
+    print(f"Tempo total: {decorrido:.2f} s | Erros: {erros}")
+    print(f"Partidas/s: {len(latencias) / decorrido:.1f} | Movimentos/s: {movimentos / decorrido:.1f}")
+    if latencias:
+        p = lambda q: latencias[min(len(latencias) - 1, int(len(latencias) * q))] * 1000
+        print(f"Latência por partida (ms): p50={p(0.5):.1f} p95={p(0.95):.1f} p99={p(0.99):.1f}")
+    return erros
+
+
+async def comando(texto, conexao_args):
+    msg = json.loads(texto)
+    cliente = await Cliente.conectar(**conexao_args)
+    print(json.dumps(await cliente.enviar(msg.pop("op"), **msg), ensure_ascii=False, indent=2))
+    await cliente.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cliente do servidor Capivara Game")
+    parser.add_argument("mensagem", nargs="?", help="comando JSON a enviar")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=7000)
+    parser.add_argument("--unix")
+    parser.add_argument("--carga", action="store_true", help="executa o script de carga")
+    parser.add_argument("--partidas", type=int, default=200)
+    parser.add_argument("--jogadores", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--concorrencia", type=int, default=100)
+    args = parser.parse_args()
+
+    conexao_args = {"host": args.host, "porta": args.porta, "unix": args.unix}
+    if args.carga:
+        erros = asyncio.run(carga(args.partidas, args.jogadores, args.concorrencia, conexao_args))
+        sys.exit(1 if erros else 0)
+    elif args.mensagem:
+        asyncio.run(comando(args.mensagem, conexao_args))
+    else:
+        parser.print_help()
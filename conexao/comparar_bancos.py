@@ -0,0 +1,126 @@
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import text, bindparam
+
+import conexao
+from conexao import session, unidade_de_trabalho, configurar_banco
+from motor import obter_conjunto
+from registro import registros_do_banco, verificar
+import autojogo
+
+# Confere o banco embutido (embutido.py) com o Postgres: joga as mesmas
+# partidas (mesmas sementes e políticas) no SQLite em memória e no outro
+# banco, cada um num processo, e compara o que as funções e gatilhos de
+# cada lado gravaram: movimentos, resultado e pontos de cada partida,
+# EstatisticaUsuario, a view RankingUsuarios e ResumoPartida. Os ids são
+# trocados pela ordem de criação, para o outro banco não precisar estar
+# vazio. Mostra também o tempo de cada banco.
+#
+# Uso: python comparar_bancos.py [--partidas 100] [--jogadores 2,3,4] [--semente 42]
+#          [--outro URL]
+
+EMBUTIDO = "sqlite://"
+
+
+def _consulta(sql, **params):
+    consulta = text(sql)
+    for nome in params:
+        if isinstance(params[nome], list):
+            consulta = consulta.bindparams(bindparam(nome, expanding=True))
+    return session.execute(consulta, params).fetchall()
+
+
+# O que foi gravado, com usuários e partidas pela ordem de criação
+def retrato(usuarios, partidas):
+    u = {idusuario: i for i, idusuario in enumerate(usuarios)}
+    p = {idpartida: i for i, idpartida in enumerate(partidas)}
+    duplas = dict(_consulta("SELECT iddupla, nomedupla FROM dupla WHERE idpartida IN :ids", ids=partidas))
+    return {
+        "movimentos": [(p[r[0]], r[1], u[r[2]], r[3], r[4], r[5]) for r in _consulta("""
+            SELECT idpartida, ordemacao, idusuario, tipoacao, idpecajogada, extremidademesa
+            FROM movimentacao WHERE idpartida IN :ids ORDER BY idpartida, ordemacao
+        """, ids=partidas)],
+        "partidas": [(p[r[0]], r[1], u.get(r[2]), duplas.get(r[3]), r[4], r[5], r[6]) for r in _consulta("""
+            SELECT idpartida, modotermino, idjogadorvencedor, idduplavencedora, pontosdapartida,
+                   valorextesquerda, valorextdireita
+            FROM partida WHERE idpartida IN :ids ORDER BY idpartida
+        """, ids=partidas)],
+        "estatisticas": sorted((u[r[0]], *r[1:]) for r in _consulta("""
+            SELECT idusuario, partidasjogadas, partidasvencidas, totalpontos
+            FROM estatisticausuario WHERE idusuario IN :ids
+        """, ids=usuarios)),
+        "ranking": sorted((u[r[0]], r[1], r[2], float(r[3]), r[4], float(r[5])) for r in _consulta("""
+            SELECT idusuario, totalpartidasjogadas, partidasvencidas, percentualvitorias,
+                   totalpontosganhos, mediapontosporpartida
+            FROM rankingusuarios WHERE idusuario IN :ids
+        """, ids=usuarios)),
+        "resumos": [(p[r[0]], *r[1:]) for r in _consulta("""
+            SELECT idpartida, modotermino, pontosdapartida, tipovitoria, nomevencedorindividual,
+                   nomeduplavencedora, nomeduplatrancou, jogadoresparticipantes,
+                   duplasparticipantes, totalmovimentacoes
+            FROM resumopartida WHERE idpartida IN :ids ORDER BY idpartida
+        """, ids=partidas)],
+    }
+
+
+# Joga as partidas no banco do processo; retorna (nome do banco, segundos,
+# situações da reprodução, retrato)
+def jogar(url, partidas, tamanhos, semente):
+    configurar_banco(url)
+    usuarios = autojogo.criar_usuarios(max(tamanhos) * 2)
+    base = session.execute(text("SELECT COALESCE(MAX(idpartida), 0) FROM partida")).scalar()
+    session.commit()
+
+    rng = random.Random()
+    inicio = time.perf_counter()
+    for i in range(partidas):
+        rng.seed(semente * 100003 + i)
+        jogadores = rng.sample(usuarios, tamanhos[i % len(tamanhos)])
+        politicas = [rng.choice(("gulosa", "aleatoria")) for _ in jogadores]
+        with unidade_de_trabalho():
+            autojogo.partida_completa(jogadores, politicas, rng)
+    decorrido = time.perf_counter() - inicio
+
+    ids = session.execute(text(
+        "SELECT idpartida FROM partida WHERE idpartida > :base ORDER BY idpartida"
+    ), {"base": base}).scalars().all()
+    situacoes, _ = verificar(session, list(registros_do_banco(session, ids)), obter_conjunto(session))
+    dados = retrato(usuarios, ids)
+    session.close()
+    return conexao.obter_engine().dialect.name, decorrido, dict(situacoes), dados
+
+
+def executar(url, *args):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(jogar, url, *args).result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara o banco embutido com o Postgres")
+    parser.add_argument("--partidas", type=int, default=100)
+    parser.add_argument("--jogadores", default="2,3,4", help="tamanhos de mesa, em rodízio")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--outro", default=conexao.DATABASE_URL, help="URL do banco de comparação")
+    args = parser.parse_args()
+    tamanhos = [int(t) for t in args.jogadores.split(",")]
+
+    resultados = [executar(url, args.partidas, tamanhos, args.semente) for url in (EMBUTIDO, args.outro)]
+    for nome, decorrido, situacoes, _ in resultados:
+        print(f"{nome:<10} {args.partidas} partida(s) em {decorrido:.2f} s "
+              f"({decorrido / args.partidas * 1000:.1f} ms por partida) | reprodução: "
+              + ", ".join(f"{s} {n}" for s, n in sorted(situacoes.items())))
+
+    (_, _, _, embutido), (_, _, _, outro) = resultados
+    divergencias = 0
+    for parte in embutido:
+        diferentes = [(a, b) for a, b in zip(embutido[parte], outro[parte]) if a != b]
+        if len(embutido[parte]) != len(outro[parte]):
+            diferentes.append((len(embutido[parte]), len(outro[parte])))
+        divergencias += len(diferentes)
+        print(f"{parte:<13} {len(embutido[parte]):>6} linha(s) | divergentes {len(diferentes)}")
+        for a, b in diferentes[:5]:
+            print(f"  embutido {a}\n  outro    {b}")
+    sys.exit(1 if divergencias else 0)
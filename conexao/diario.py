@@ -0,0 +1,149 @@
+import os
+from sqlalchemy import text, insert
+from conexao import Movimentacao
+
+# Modos de durabilidade do diário:
+#   por_jogada  -> grava a cada movimento (mesmo comportamento de antes)
+#   por_lote    -> grava a cada N movimentos
+#   fim_partida -> grava apenas quando a partida é finalizada
+MODOS_DURABILIDADE = ('por_jogada', 'por_lote', 'fim_partida')
+
+DURABILIDADE_PADRAO = os.environ.get("CAPIVARA_DURABILIDADE", "por_lote")
+TAMANHO_LOTE_PADRAO = int(os.environ.get("CAPIVARA_TAMANHO_LOTE", "10"))
+
+
+# Diário de movimentos com escrita adiada: numera o ordemAcao localmente e
+# acumula as alterações de Movimentacao, MaoPartida e extremidades da
+# Partida, gravando tudo de uma vez em poucos comandos por descarga.
+class DiarioMovimentos:
+    def __init__(self, session, idpartida, modo=None, tamanho_lote=None, ultima_ordem=None):
+        modo = modo or DURABILIDADE_PADRAO
+        if modo not in MODOS_DURABILIDADE:
+            raise ValueError(f"Modo de durabilidade inválido: {modo}")
+
+        self.session = session
+        self.idpartida = idpartida
+        self.modo = modo
+        self.tamanho_lote = tamanho_lote or TAMANHO_LOTE_PADRAO
+
+        # Única leitura do contador da partida: feita uma vez, na abertura
+        if ultima_ordem is None:
+            ultima_ordem = session.execute(text(
+                "SELECT proximaordemacao - 1 FROM partida WHERE idpartida = :p"
+            ), {"p": idpartida}).scalar()
+        self.ordem = ultima_ordem
+
+        self.movimentos = []
+        self.maos = {}              # idpeca -> (idusuario, statuspeca)
+        self.extremidades = None    # (esquerda, direita)
+        self.descargas = 0
+
+    def pendentes(self):
+        return len(self.movimentos)
+
+    # Indica se o modo de durabilidade pede uma descarga agora
+    def precisa_descarregar(self):
+        if not self.movimentos:
+            return False
+        if self.modo == 'por_jogada':
+            return True
+        return self.modo == 'por_lote' and len(self.movimentos) >= self.tamanho_lote
+
+    # ---------- registro ----------
+    def _registrar(self, idusuario, tipo, idpeca=None, extremidade=None):
+        self.ordem += 1
+        self.movimentos.append({
+            "idpartida": self.idpartida,
+            "idusuario": idusuario,
+            "ordemacao": self.ordem,
+            "tipoacao": tipo,
+            "idpecajogada": idpeca,
+            "extremidademesa": extremidade,
+        })
+        if self.session is not None and self.precisa_descarregar():
+            self.descarregar()
+        return self.ordem
+
+    def registrar_jogada(self, idusuario, idpeca, extremidade, ext_esq, ext_dir):
+        self.maos[idpeca] = (None, 'jogada')
+        self.extremidades = (ext_esq, ext_dir)
+        return self._registrar(idusuario, 'jogada', idpeca, extremidade)
+
+    def registrar_compra(self, idusuario, idpeca):
+        self.maos[idpeca] = (idusuario, 'em_mao')
+        return self._registrar(idusuario, 'comprou', idpeca)
+
+    def registrar_passe(self, idusuario):
+        return self._registrar(idusuario, 'passou')
+
+    # ---------- gravação ----------
+    # Grava tudo o que está pendente; com commit=False a transação fica
+    # aberta para quem chamou (ex.: finalizar_partida). Se a gravação falhar
+    # os pendentes são mantidos para a próxima descarga.
+    def descarregar(self, commit=True):
+        comandos = self.comandos()
+        if not comandos:
+            return 0
+        try:
+            for comando, params in comandos:
+                self.session.execute(comando, params)
+            if commit:
+                self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        return self.confirmar()
+
+    # Comandos (no máximo três) que gravam o que está pendente. Quem não usa
+    # a sessão síncrona (ex.: o servidor asyncio) executa estes comandos na
+    # sua conexão e depois chama confirmar().
+    def comandos(self):
+        comandos = []
+        if self.movimentos:
+            comandos.append((insert(Movimentacao.__table__).values(self.movimentos), {}))
+
+        if self.maos:
+            linhas, params = [], {"partida": self.idpartida}
+            for i, (idpeca, (idusuario, status)) in enumerate(self.maos.items()):
+                linhas.append(f"(CAST(:p{i} AS INT), CAST(:u{i} AS INT), CAST(:s{i} AS VARCHAR(20)))")
+                params.update({f"p{i}": idpeca, f"u{i}": idusuario, f"s{i}": status})
+            # WITH ... UPDATE ... FROM vale no Postgres e no SQLite (embutido.py)
+            comandos.append((text(f"""
+                WITH v(idpeca, idusuario, statuspeca) AS (VALUES {', '.join(linhas)})
+                UPDATE maopartida
+                SET idusuario = v.idusuario, statuspeca = v.statuspeca
+                FROM v
+                WHERE maopartida.idpartida = :partida AND maopartida.idpeca = v.idpeca
+            """), params))
+
+        # Extremidades e o contador de ordemacao da partida, num só UPDATE
+        campos, params = [], {"p": self.idpartida}
+        if self.extremidades:
+            campos += ["valorextesquerda = :esq", "valorextdireita = :dir"]
+            params.update({"esq": self.extremidades[0], "dir": self.extremidades[1]})
+        if self.movimentos:
+            campos.append("proximaordemacao = CASE WHEN proximaordemacao > :prox "
+                          "THEN proximaordemacao ELSE :prox END")
+            params["prox"] = self.movimentos[-1]["ordemacao"] + 1
+        if campos:
+            comandos.append((text(
+                f"UPDATE partida SET {', '.join(campos)} WHERE idpartida = :p"
+            ), params))
+        return comandos
+
+    # Marca os pendentes como gravados; retorna quantos movimentos eram
+    def confirmar(self):
+        gravados = len(self.movimentos)
+        self.movimentos = []
+        self.maos = {}
+        self.extremidades = None
+        self.descargas += 1
+        return gravados
+
+    # Descarta o que não foi gravado (ex.: após rollback)
+    def descartar(self):
+        self.ordem -= len(self.movimentos)
+        self.movimentos = []
+        self.maos = {}
+        self.extremidades = None
+
@@ -0,0 +1,73 @@
+import random
+from sqlalchemy import text, insert, bindparam
+from conexao import MaoPartida
+from motor import obter_conjunto
+
+TAMANHO_MAO = 7
+
+
+# Sorteia a distribuição de uma partida: 7 peças por jogador, na ordem da
+# mesa, e o restante no monte. Retorna as linhas de MaoPartida.
+def sortear_distribuicao(idpartida, conjunto, jogadores, rng, mao=TAMANHO_MAO):
+    idspecas = [p.idpeca for p in conjunto.pecas]
+    rng.shuffle(idspecas)
+
+    linhas = []
+    idx = 0
+    for idusuario in jogadores:
+        for idpeca in idspecas[idx:idx + mao]:
+            linhas.append({"idpartida": idpartida, "idpeca": idpeca,
+                           "idusuario": idusuario, "statuspeca": 'em_mao'})
+        idx += mao
+
+    # Restante das peças no monte
+    for idpeca in idspecas[idx:]:
+        linhas.append({"idpartida": idpartida, "idpeca": idpeca,
+                       "idusuario": None, "statuspeca": 'no_monte'})
+    return linhas
+
+
+# Jogadores de várias partidas, na ordem da mesa, em uma única consulta
+def carregar_jogadores(session, idspartidas):
+    jogadores = {p: [] for p in idspartidas}
+    rows = session.execute(text("""
+        SELECT idpartida, idusuario FROM partidausuario
+        WHERE idpartida IN :ids
+        ORDER BY idpartida, posicaomesa
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": list(idspartidas)})
+    for idpartida, idusuario in rows:
+        jogadores[idpartida].append(idusuario)
+    return jogadores
+
+
+# Distribui as peças de várias partidas de uma vez: apaga as mãos antigas e
+# grava todas as novas em um único INSERT de várias linhas, tudo na mesma
+# transação. `partidas` pode ser uma lista de ids (a ordem da mesa é lida do
+# banco) ou um dicionário idpartida -> [idusuario, ...].
+def distribuir_partidas(session, partidas, semente=None, rng=None):
+    if not isinstance(partidas, dict):
+        partidas = carregar_jogadores(session, list(partidas))
+    if not partidas:
+        return {}
+
+    rng = rng or random.Random(semente)
+    conjunto = obter_conjunto(session)
+
+    distribuicoes = {}
+    linhas = []
+    for idpartida, jogadores in partidas.items():
+        if len(jogadores) * TAMANHO_MAO > len(conjunto.pecas):
+            raise ValueError(f"Partida {idpartida}: jogadores demais para distribuir")
+        distribuicoes[idpartida] = sortear_distribuicao(idpartida, conjunto, jogadores, rng)
+        linhas.extend(distribuicoes[idpartida])
+
+    try:
+        session.execute(text(
+            "DELETE FROM maopartida WHERE idpartida IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), {"ids": list(partidas)})
+        session.execute(insert(MaoPartida.__table__).values(linhas))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return distribuicoes
@@ -0,0 +1,385 @@
+import os
+from collections import namedtuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool, QueuePool
+
+# Banco embutido (SQLite), para instalações pequenas e testes: as partidas
+# rodam no próprio processo, sem servidor. Escolhido por CAPIVARA_BANCO:
+#   sqlite:///domino.db   arquivo em modo WAL (instalado por init.py)
+#   sqlite://             em memória, instalado na hora; uma única conexão
+#                         para o processo, própria para testes
+# O esquema está em database/script_sqlite.sql. As funções, procedimentos
+# e gatilhos em PL/pgSQL de database/script.sql estão implementados aqui,
+# com as mesmas regras, e são registrados em cada conexão com os mesmos
+# nomes, de modo que o SQL do jogo (SELECT GravarResumoPartida(...), etc.)
+# é o mesmo nos dois bancos. ExecutarTurno e PontuacaoPartida, que no
+# Postgres devolvem tabelas, são chamadas em Python por executar_turno() e
+# pontuacao_partida(). Ficam só no Postgres: os eventos para espectadores
+# (LISTEN/NOTIFY), o servidor asyncio e o arquivo de partidas.
+
+ESQUEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database", "script_sqlite.sql")
+
+# Espera por uma trava de escrita de outro processo (segundos)
+ESPERA = float(os.environ.get("CAPIVARA_SQLITE_ESPERA", "30"))
+
+
+def em_memoria(url):
+    return url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:") or ":memory:" in url
+
+
+# Engine do banco embutido; `pool` (conexao.POOL) vale para o arquivo
+def criar_engine(url, **pool):
+    if em_memoria(url):
+        engine = create_engine(url, poolclass=StaticPool,
+                               connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(url, poolclass=QueuePool, **pool,
+                               connect_args={"timeout": ESPERA, "check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def ao_conectar(conexao, registro):
+        conexao.execute("PRAGMA foreign_keys = ON")
+        if em_memoria(url):
+            instalar(conexao)
+        else:
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.execute("PRAGMA synchronous = NORMAL")
+        registrar_funcoes(conexao)
+
+    return engine
+
+
+def instalado(conexao):
+    return conexao.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND lower(name) = 'partida'"
+    ).fetchone() is not None
+
+
+# Cria o esquema num banco vazio; retorna se instalou
+def instalar(conexao):
+    if instalado(conexao):
+        return False
+    with open(ESQUEMA, "r", encoding="utf8") as f:
+        conexao.executescript(f.read())
+    return True
+
+
+# Conexão sqlite3 por trás de uma sessão (ou Connection) do SQLAlchemy
+def bruta(session):
+    return session.connection().connection.driver_connection
+
+
+def _valor(conexao, sql, params=()):
+    linhas = conexao.execute(sql, params).fetchall()
+    return linhas[0][0] if linhas else None
+
+
+# ---------- funções ----------
+def reservar_ordem_acao(conexao, idpartida):
+    return _valor(conexao, """
+        UPDATE partida SET proximaordemacao = proximaordemacao + 1
+        WHERE idpartida = ? RETURNING proximaordemacao - 1
+    """, (idpartida,))
+
+
+def _jogaveis(conexao, idpartida, esquerda, direita, idusuario=None):
+    filtro = "" if idusuario is None else "AND mp.idusuario = ?"
+    params = (idpartida,) + (() if idusuario is None else (idusuario,))
+    return conexao.execute(f"""
+        SELECT 1 FROM maopartida mp JOIN peca p ON p.idpeca = mp.idpeca
+        WHERE mp.idpartida = ? {filtro} AND mp.statuspeca = 'em_mao'
+          AND (p.ladoa = ? OR p.ladob = ? OR p.ladoa = ? OR p.ladob = ?)
+        LIMIT 1
+    """, params + (esquerda, esquerda, direita, direita)).fetchone() is not None
+
+
+def verificar_jogadas_possiveis(conexao, idpartida, idusuario, esquerda, direita):
+    return _jogaveis(conexao, idpartida, esquerda, direita, idusuario)
+
+
+def detectar_jogo_trancado(conexao, idpartida, esquerda, direita):
+    return not _jogaveis(conexao, idpartida, esquerda, direita)
+
+
+# Procedimento ComprarPecaDoMonte; retorna a peça comprada ou NULL
+def comprar_peca_do_monte(conexao, idpartida, idusuario):
+    idpeca = _valor(conexao, """
+        SELECT idpeca FROM maopartida WHERE idpartida = ? AND statuspeca = 'no_monte' LIMIT 1
+    """, (idpartida,))
+    if idpeca is None:
+        return None
+    conexao.execute("""
+        UPDATE maopartida SET idusuario = ?, statuspeca = 'em_mao'
+        WHERE idpartida = ? AND idpeca = ?
+    """, (idusuario, idpartida, idpeca))
+    conexao.execute("""
+        INSERT INTO movimentacao (idpartida, idusuario, ordemacao, tipoacao, idpecajogada)
+        VALUES (?, ?, ?, 'comprou', ?)
+    """, (idpartida, idusuario, reservar_ordem_acao(conexao, idpartida), idpeca))
+    return idpeca
+
+
+# Procedimento ValidarJogada; retorna se a jogada foi aceita
+def validar_jogada(conexao, idpartida, idusuario, idpeca, extremidade, valor):
+    lados = conexao.execute("SELECT ladoa, ladob FROM peca WHERE idpeca = ?", (idpeca,)).fetchone()
+    if lados is None or valor not in lados:
+        return False
+    conexao.execute("""
+        UPDATE maopartida SET statuspeca = 'jogada', idusuario = NULL
+        WHERE idpartida = ? AND idpeca = ? AND idusuario = ?
+    """, (idpartida, idpeca, idusuario))
+    conexao.execute("""
+        INSERT INTO movimentacao (idpartida, idusuario, ordemacao, tipoacao, idpecajogada, extremidademesa)
+        VALUES (?, ?, ?, 'jogada', ?, ?)
+    """, (idpartida, idusuario, reservar_ordem_acao(conexao, idpartida), idpeca, extremidade))
+    return True
+
+
+# Mesmas colunas de ExecutarTurno
+Turno = namedtuple("Turno", ["valorextesquerda", "valorextdireita", "extremidadeusada",
+                             "ordemacao", "bateu", "trancado"])
+
+
+# Função ExecutarTurno. A primeira escrita na partida reserva a trava de
+# escrita do banco, no papel do FOR UPDATE; os erros são ValueError.
+def executar_turno(conexao, idpartida, idusuario, idpeca, extremidade):
+    linha = conexao.execute("""
+        UPDATE partida SET proximaordemacao = proximaordemacao
+        WHERE idpartida = ? AND datahorafim IS NULL
+        RETURNING valorextesquerda, valorextdireita
+    """, (idpartida,)).fetchall()
+    if not linha:
+        raise ValueError(f"Partida {idpartida} inexistente ou finalizada")
+    esq, dir = linha[0]
+
+    # A vez é do assento seguinte ao do último movimento
+    vez = _valor(conexao, """
+        SELECT PU.idusuario
+        FROM partidausuario PU
+        JOIN partidausuario A ON A.idpartida = PU.idpartida
+        WHERE PU.idpartida = ? AND A.idusuario = (
+            SELECT idusuario FROM movimentacao WHERE idpartida = ?
+            ORDER BY ordemacao DESC LIMIT 1
+        )
+        ORDER BY PU.posicaomesa <= A.posicaomesa, PU.posicaomesa
+        LIMIT 1
+    """, (idpartida, idpartida))
+    if vez is not None and vez != idusuario:
+        raise ValueError(f"Não é a vez do jogador {idusuario} (vez do jogador {vez})")
+
+    ladoa, ladob = conexao.execute("SELECT ladoa, ladob FROM peca WHERE idpeca = ?", (idpeca,)).fetchone()
+    if esq is None and dir is None:
+        extremidade, esq, dir = 'centro', ladoa, ladob
+    elif extremidade == 'esquerda' and esq in (ladoa, ladob):
+        esq = ladob if ladoa == esq else ladoa
+    elif extremidade == 'direita' and dir in (ladoa, ladob):
+        dir = ladob if ladoa == dir else ladoa
+    else:
+        raise ValueError(f"Peça {idpeca} não encaixa na extremidade {extremidade}")
+
+    if conexao.execute("""
+        UPDATE maopartida SET statuspeca = 'jogada', idusuario = NULL
+        WHERE idpartida = ? AND idpeca = ? AND idusuario = ? AND statuspeca = 'em_mao'
+    """, (idpartida, idpeca, idusuario)).rowcount == 0:
+        raise ValueError(f"Peça {idpeca} não está na mão do jogador {idusuario}")
+
+    ordem = _valor(conexao, """
+        UPDATE partida SET valorextesquerda = ?, valorextdireita = ?,
+            proximaordemacao = proximaordemacao + 1
+        WHERE idpartida = ? RETURNING proximaordemacao - 1
+    """, (esq, dir, idpartida))
+    conexao.execute("""
+        INSERT INTO movimentacao (idpartida, idusuario, ordemacao, tipoacao, idpecajogada, extremidademesa)
+        VALUES (?, ?, ?, 'jogada', ?, ?)
+    """, (idpartida, idusuario, ordem, idpeca, extremidade))
+
+    bateu = _valor(conexao, """
+        SELECT 1 FROM maopartida
+        WHERE idpartida = ? AND idusuario = ? AND statuspeca = 'em_mao' LIMIT 1
+    """, (idpartida, idusuario)) is None
+    trancado = not _monte(conexao, idpartida) and detectar_jogo_trancado(conexao, idpartida, esq, dir)
+    return Turno(esq, dir, extremidade, ordem, bateu, trancado)
+
+
+def _monte(conexao, idpartida):
+    return _valor(conexao, """
+        SELECT 1 FROM maopartida WHERE idpartida = ? AND statuspeca = 'no_monte' LIMIT 1
+    """, (idpartida,)) is not None
+
+
+# Mesmas colunas de PontuacaoPartida
+LinhaPontuacao = namedtuple("LinhaPontuacao", ["idusuario", "iddupla", "pontosmao", "pontosdupla", "trancado"])
+
+
+# Função PontuacaoPartida: pontos na mão de cada jogador, total do seu time
+# (jogador sem dupla é um time sozinho) e se a mesa está trancada
+def pontuacao_partida(conexao, idpartida):
+    extremidades = conexao.execute(
+        "SELECT valorextesquerda, valorextdireita FROM partida WHERE idpartida = ?", (idpartida,)
+    ).fetchone()
+    if extremidades is None:
+        return []
+    esq, dir = extremidades
+    maos, jogaveis = {}, 0
+    for idusuario, iddupla, ladoa, ladob, pontos in conexao.execute("""
+        SELECT PU.idusuario, PU.iddupla, PC.ladoa, PC.ladob, PC.pontospeca
+        FROM partidausuario PU
+        LEFT JOIN maopartida MP
+               ON MP.idpartida = PU.idpartida AND MP.idusuario = PU.idusuario
+              AND MP.statuspeca = 'em_mao'
+        LEFT JOIN peca PC ON PC.idpeca = MP.idpeca
+        WHERE PU.idpartida = ?
+        ORDER BY PU.posicaomesa
+    """, (idpartida,)):
+        mao = maos.setdefault(idusuario, [iddupla, 0])
+        if ladoa is None:
+            continue
+        mao[1] += pontos
+        if (esq is None and dir is None) or ladoa in (esq, dir) or ladob in (esq, dir):
+            jogaveis += 1
+
+    times = {}
+    for idusuario, (iddupla, pontos) in maos.items():
+        chave = -idusuario if iddupla is None else iddupla
+        times[chave] = times.get(chave, 0) + pontos
+    trancado = jogaveis == 0 and not _monte(conexao, idpartida)
+    return [LinhaPontuacao(idusuario, iddupla, pontos,
+                           times[-idusuario if iddupla is None else iddupla], trancado)
+            for idusuario, (iddupla, pontos) in maos.items()]
+
+
+# Função PontosFimPartida: pontos de uma partida encerrada; None quando o
+# fim não identifica vencedor
+def pontos_fim_partida(conexao, idpartida, modo, idvencedor, iddupla, iddupla_trancou):
+    linhas = pontuacao_partida(conexao, idpartida)
+    if modo == 'bater' and iddupla is not None:
+        return sum(l.pontosmao for l in linhas if l.iddupla != iddupla)
+    if modo == 'bater' and idvencedor is not None:
+        return sum(l.pontosmao for l in linhas if l.idusuario != idvencedor)
+    alvo = iddupla if iddupla is not None else iddupla_trancou
+    if modo == 'trancado' and alvo is not None:
+        return min((l.pontosdupla for l in linhas if l.iddupla != alvo), default=0)
+    if modo == 'trancado' and idvencedor is not None:
+        return min((l.pontosmao for l in linhas if l.idusuario != idvencedor), default=0)
+    return None
+
+
+# ---------- gatilhos ----------
+def criar_estatistica_usuario(conexao, idusuario):
+    conexao.execute("INSERT INTO estatisticausuario (idusuario) VALUES (?) ON CONFLICT (idusuario) DO NOTHING",
+                    (idusuario,))
+
+
+def contar_partida_usuario(conexao, idusuario, delta):
+    if delta > 0:
+        conexao.execute("""
+            INSERT INTO estatisticausuario (idusuario, partidasjogadas) VALUES (?, 1)
+            ON CONFLICT (idusuario) DO UPDATE SET partidasjogadas = partidasjogadas + 1
+        """, (idusuario,))
+    else:
+        conexao.execute("UPDATE estatisticausuario SET partidasjogadas = partidasjogadas - 1 WHERE idusuario = ?",
+                        (idusuario,))
+
+
+def calcular_pontos_partida(conexao, idpartida):
+    modo, idvencedor, iddupla, iddupla_trancou = conexao.execute("""
+        SELECT modotermino, idjogadorvencedor, idduplavencedora, idduplatrancou
+        FROM partida WHERE idpartida = ?
+    """, (idpartida,)).fetchone()
+    pontos = pontos_fim_partida(conexao, idpartida, modo, idvencedor, iddupla, iddupla_trancou)
+    if pontos is not None:
+        conexao.execute("UPDATE partida SET pontosdapartida = ? WHERE idpartida = ?", (pontos, idpartida))
+
+
+def acumular_estatisticas_partida(conexao, idpartida):
+    idvencedor, iddupla, pontos = conexao.execute("""
+        SELECT idjogadorvencedor, idduplavencedora, pontosdapartida FROM partida WHERE idpartida = ?
+    """, (idpartida,)).fetchone()
+    vencedores = [idvencedor] if idvencedor is not None else []
+    if iddupla is not None:
+        vencedores += [r[0] for r in conexao.execute(
+            "SELECT idusuario FROM partidausuario WHERE idpartida = ? AND iddupla = ?", (idpartida, iddupla))]
+    conexao.executemany("""
+        INSERT INTO estatisticausuario (idusuario, partidasvencidas, totalpontos) VALUES (?, 1, ?)
+        ON CONFLICT (idusuario) DO UPDATE SET
+            partidasvencidas = partidasvencidas + 1,
+            totalpontos = totalpontos + excluded.totalpontos
+    """, [(v, pontos) for v in vencedores])
+
+
+# ---------- estatísticas e resumos ----------
+def reconstruir_estatisticas(conexao):
+    conexao.execute("DELETE FROM estatisticausuario")
+    conexao.execute("""
+        INSERT INTO estatisticausuario (idusuario, partidasjogadas, partidasvencidas, totalpontos)
+        SELECT idusuario, totalpartidasjogadas, partidasvencidas, totalpontosganhos
+        FROM rankingusuarios
+    """)
+
+
+def gravar_resumo_partida(conexao, idpartida, total_movimentacoes=None):
+    conexao.execute("""
+        INSERT INTO resumopartida (
+            idpartida, datahorainicio, datahorafim, modotermino, pontosdapartida, tipovitoria,
+            nomevencedorindividual, nomeduplavencedora, nomeduplatrancou,
+            jogadoresparticipantes, duplasparticipantes, totalmovimentacoes, duracaominutos
+        )
+        SELECT
+            PD.idpartida, COALESCE(PD.datahorainicio, PD.datahorafim), PD.datahorafim, PD.modotermino,
+            PD.pontosdapartida, PD.tipovitoria,
+            PD.nomevencedorindividual, PD.nomeduplavencedora, PD.nomeduplatrancou,
+            PD.jogadoresparticipantes, PD.duplasparticipantes,
+            COALESCE(?, PD.totalmovimentacoes), PD.duracaominutos
+        FROM partidasdetalhadas PD
+        WHERE PD.idpartida = ?
+        ON CONFLICT (idpartida) DO UPDATE SET
+            datahorainicio = excluded.datahorainicio,
+            datahorafim = excluded.datahorafim,
+            modotermino = excluded.modotermino,
+            pontosdapartida = excluded.pontosdapartida,
+            tipovitoria = excluded.tipovitoria,
+            nomevencedorindividual = excluded.nomevencedorindividual,
+            nomeduplavencedora = excluded.nomeduplavencedora,
+            nomeduplatrancou = excluded.nomeduplatrancou,
+            jogadoresparticipantes = excluded.jogadoresparticipantes,
+            duplasparticipantes = excluded.duplasparticipantes,
+            totalmovimentacoes = excluded.totalmovimentacoes,
+            duracaominutos = excluded.duracaominutos
+    """, (total_movimentacoes, idpartida))
+
+
+def preencher_resumos(conexao, lote=1000):
+    ids = [r[0] for r in conexao.execute("""
+        SELECT P.idpartida FROM partida P
+        WHERE P.datahorafim IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM resumopartida R WHERE R.idpartida = P.idpartida)
+        ORDER BY P.idpartida
+        LIMIT ?
+    """, (lote,))]
+    for idpartida in ids:
+        gravar_resumo_partida(conexao, idpartida)
+    return len(ids)
+
+
+# Nome no SQL -> (função, número de argumentos; -1 para os opcionais).
+# Os procedimentos (CALL no Postgres) são chamados com SELECT.
+FUNCOES = {
+    "ReservarOrdemAcao": (reservar_ordem_acao, 1),
+    "VerificarJogadasPossiveis": (verificar_jogadas_possiveis, 4),
+    "DetectarJogoTrancado": (detectar_jogo_trancado, 3),
+    "ComprarPecaDoMonte": (comprar_peca_do_monte, 2),
+    "ValidarJogada": (validar_jogada, 5),
+    "PontosFimPartida": (pontos_fim_partida, 5),
+    "ReconstruirEstatisticas": (reconstruir_estatisticas, 0),
+    "GravarResumoPartida": (gravar_resumo_partida, -1),
+    "PreencherResumos": (preencher_resumos, -1),
+    "criarEstatisticaUsuario": (criar_estatistica_usuario, 1),
+    "contarPartidaUsuario": (contar_partida_usuario, 2),
+    "calcularPontosPartida": (calcular_pontos_partida, 1),
+    "acumularEstatisticasPartida": (acumular_estatisticas_partida, 1),
+}
+
+
+def registrar_funcoes(conexao):
+    for nome, (funcao, argumentos) in FUNCOES.items():
+        conexao.create_function(nome, argumentos, lambda *a, f=funcao: f(conexao, *a))
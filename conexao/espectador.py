@@ -0,0 +1,167 @@
+import json
+import select
+import argparse
+from sqlalchemy import text
+
+from conexao import session, obter_engine
+from motor import obter_conjunto
+from registro import carregar_registro, reproduzir
+import cache
+
+# Espectadores: em vez de reler a mesa do banco a cada atualização, o
+# espectador carrega a partida uma vez (registro.py) e depois só aplica os
+# eventos que os gatilhos publicam com NOTIFY no canal partida_<id>:
+#   {"movimentos": [[ordemAcao, idUsuario, tipoAcao, idPeca, extremidade], ...]}
+#   {"fim": {"modoTermino": ..., "idJogadorVencedor": ..., ...}}
+#   {"ressincronizar": true}   (peças distribuídas ou evento grande demais)
+# Uma Plateia usa uma única conexão LISTEN para todas as partidas que o
+# processo assiste. Um salto na ordemAcao (evento perdido) recarrega a
+# partida.
+#
+# Uso: python espectador.py idpartida [idpartida ...]
+
+
+def canal(idpartida):
+    return f"partida_{int(idpartida)}"
+
+
+# Cópia local de uma partida assistida
+class MesaAssistida:
+    def __init__(self, idpartida, ao_mudar=None):
+        self.idpartida = idpartida
+        self.ao_mudar = ao_mudar
+        self.estado = None          # EstadoPartida; None antes da distribuição
+        self.ordem = 0              # último ordemAcao aplicado
+        self.fim = None
+        self.eventos = 0
+        self.recargas = 0
+
+
+class Plateia:
+    def __init__(self):
+        self.bruta = obter_engine().raw_connection()
+        self.conexao = self.bruta.dbapi_connection
+        self.conexao.autocommit = True
+        self.conjunto = obter_conjunto(session)
+        self.mesas = {}
+
+    # Passa a assistir a partida; `ao_mudar(mesa)` é chamado a cada evento.
+    # O LISTEN vem antes da carga para nenhum movimento se perder no meio.
+    def assistir(self, idpartida, ao_mudar=None):
+        with self.conexao.cursor() as cur:
+            cur.execute(f"LISTEN {canal(idpartida)}")
+        mesa = MesaAssistida(idpartida, ao_mudar)
+        self.mesas[idpartida] = mesa
+        self.sincronizar(mesa)
+        return mesa
+
+    def deixar(self, idpartida):
+        with self.conexao.cursor() as cur:
+            cur.execute(f"UNLISTEN {canal(idpartida)}")
+        self.mesas.pop(idpartida, None)
+
+    # Carrega a partida inteira do banco (única leitura completa)
+    def sincronizar(self, mesa):
+        try:
+            registro = carregar_registro(session, mesa.idpartida, self.conjunto)
+            if registro is not None:
+                nomes = cache.nomes(session, [j for j, _ in registro.jogadores])
+                mesa.estado, _ = reproduzir(registro, self.conjunto, nomes=nomes)
+                mesa.ordem = len(registro.movimentos)
+            fim = session.execute(text("""
+                SELECT modotermino, idjogadorvencedor, idduplavencedora, pontosdapartida
+                FROM partida WHERE idpartida = :p AND datahorafim IS NOT NULL
+            """), {"p": mesa.idpartida}).first()
+            if fim:
+                mesa.fim = dict(zip(("modoTermino", "idJogadorVencedor", "idDuplaVencedora", "pontosDaPartida"), fim))
+        finally:
+            session.commit()
+        mesa.recargas += 1
+
+    # Aplica um evento à cópia local; retorna False se precisou recarregar
+    def aplicar(self, mesa, evento):
+        mesa.eventos += 1
+        if evento.get("ressincronizar") or mesa.estado is None:
+            self.sincronizar(mesa)
+            return False
+        estado = mesa.estado
+        for ordem, idusuario, tipo, idpeca, extremidade in evento.get("movimentos", ()):
+            if ordem <= mesa.ordem:
+                continue            # já estava na carga inicial
+            if ordem != mesa.ordem + 1:
+                self.sincronizar(mesa)
+                return False
+            if tipo == 'jogada':
+                estado.jogar(idusuario, idpeca, extremidade)
+            elif tipo == 'comprou':
+                estado.comprar(idusuario, idpeca)
+            estado.definir_vez(estado.proximo_jogador(idusuario))
+            mesa.ordem = ordem
+        if "fim" in evento:
+            mesa.fim = evento["fim"]
+        return True
+
+    # Espera eventos por até `tempo` segundos (None = sem limite) e os
+    # aplica; retorna as mesas que mudaram
+    def aguardar(self, tempo=None):
+        if not self.conexao.notifies:
+            prontos, _, _ = select.select([self.conexao], [], [], tempo)
+            if not prontos:
+                return []
+            self.conexao.poll()
+        mudaram = []
+        while self.conexao.notifies:
+            aviso = self.conexao.notifies.pop(0)
+            mesa = self.mesas.get(int(aviso.channel.split("_", 1)[1]))
+            if mesa is None:
+                continue
+            self.aplicar(mesa, json.loads(aviso.payload))
+            if mesa.ao_mudar:
+                mesa.ao_mudar(mesa)
+            if mesa not in mudaram:
+                mudaram.append(mesa)
+        return mudaram
+
+    def fechar(self):
+        with self.conexao.cursor() as cur:
+            cur.execute("UNLISTEN *")
+        self.conexao.autocommit = False
+        self.bruta.close()
+        self.mesas = {}
+
+
+def mostrar(mesa):
+    from main import mostrar_mesa
+
+    estado = mesa.estado
+    if estado is None:
+        print(f"\nPartida {mesa.idpartida}: aguardando a distribuição das peças...")
+        return
+    mostrar_mesa(estado)
+    print("Mãos: " + " | ".join(f"{estado.nomes.get(j, j)} {estado.maos[j].bit_count()}"
+                                for j in estado.jogadores)
+          + f" | Monte: {estado.pecas_no_monte()}")
+    if mesa.fim:
+        print(f"Partida finalizada: {mesa.fim['modoTermino']} "
+              f"({mesa.fim['pontosDaPartida']} pontos)")
+    else:
+        print(f"Vez de: {estado.nomes.get(estado.jogador_atual)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assiste partidas pelos eventos do banco")
+    parser.add_argument("ids", nargs="+", type=int)
+    args = parser.parse_args()
+
+    plateia = Plateia()
+    try:
+        for idpartida in args.ids:
+            mostrar(plateia.assistir(idpartida, mostrar))
+        while any(m.fim is None for m in plateia.mesas.values()):
+            plateia.aguardar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for m in plateia.mesas.values():
+            print(f"Partida {m.idpartida}: {m.eventos} evento(s), {m.recargas} carga(s) completa(s)")
+        plateia.fechar()
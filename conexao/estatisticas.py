@@ -0,0 +1,51 @@
+import sys
+from sqlalchemy import text
+from conexao import session, banco_embutido
+
+# Ranking a partir da tabela EstatisticaUsuario, mantida pelos gatilhos de
+# Usuario, PartidaUsuario e Partida (ver database/script.sql); as páginas
+# do ranking são as de listagens.paginas_ranking.
+#
+# Uso: python estatisticas.py verificar | reconstruir
+
+
+# Compara a tabela com a view RankingUsuarios; retorna as linhas que
+# divergem como (idusuario, esperado, atual)
+def verificar():
+    rows = session.execute(text("""
+        SELECT COALESCE(R.idUsuario, E.idUsuario),
+               R.totalPartidasJogadas, R.partidasVencidas, R.totalPontosGanhos,
+               E.partidasJogadas, E.partidasVencidas, E.totalPontos
+        FROM RankingUsuarios R
+        FULL JOIN EstatisticaUsuario E ON E.idUsuario = R.idUsuario
+        WHERE R.idUsuario IS NULL OR E.idUsuario IS NULL
+           OR R.totalPartidasJogadas <> E.partidasJogadas
+           OR R.partidasVencidas <> E.partidasVencidas
+           OR R.totalPontosGanhos <> E.totalPontos
+        ORDER BY 1
+    """)).fetchall()
+    return [(r[0], tuple(r[1:4]), tuple(r[4:7])) for r in rows]
+
+
+# Recalcula a tabela inteira a partir da view (no banco embutido o
+# procedimento é uma função)
+def reconstruir():
+    session.execute(text("SELECT ReconstruirEstatisticas()" if banco_embutido()
+                         else "CALL ReconstruirEstatisticas()"))
+    session.commit()
+
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "verificar"
+    if comando == "reconstruir":
+        reconstruir()
+        print("Estatísticas reconstruídas.")
+    elif comando == "verificar":
+        divergencias = verificar()
+        for idusuario, esperado, atual in divergencias:
+            print(f"Usuário {idusuario}: view (jogadas, vitórias, pontos)={esperado} | tabela={atual}")
+        print(f"{len(divergencias)} divergência(s).")
+        sys.exit(1 if divergencias else 0)
+    else:
+        print("Uso: python estatisticas.py verificar | reconstruir")
+        sys.exit(2)
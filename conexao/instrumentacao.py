@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Instrumentação opcional do SQL: cada comando executado pelo engine é
+# atribuído à função do jogo que o chamou, com contagem, linhas e um
+# histograma de latência por função.
+#
+# Ativação: CAPIVARA_INSTRUMENTAR=1 (só coleta) ou =relatorio (também
+# imprime o relatório em stderr quando uma sessão é fechada), ou
+# ativar(engine) no código. Exportação periódica: CAPIVARA_METRICAS_ARQUIVO
+# (.json para JSON, qualquer outra extensão para texto do Prometheus) e
+# CAPIVARA_METRICAS_INTERVALO em segundos (padrão 15).
+
+# Limites superiores dos baldes do histograma, em segundos
+BALDES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Arquivos cujas funções não contam como "quem chamou": o próprio SQLAlchemy
+# (inclusive o código que ele gera, "<sqlalchemy ...>"), a infraestrutura de
+# conexão e a biblioteca padrão
+_IGNORADOS = (
+    "<",
+    os.path.dirname(sys.modules["sqlalchemy"].__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "conexao.py"),
+    os.path.abspath(__file__),
+    os.path.dirname(contextmanager.__code__.co_filename),
+)
+
+# Rótulo explícito (ex.: a operação do servidor asyncio, onde a pilha de
+# chamadas não chega ao código do jogo)
+_rotulo = contextvars.ContextVar("capivara_rotulo", default=None)
+
+
+class Metrica:
+    __slots__ = ("comandos", "linhas", "segundos", "baldes")
+
+    def __init__(self):
+        self.comandos = 0
+        self.linhas = 0
+        self.segundos = 0.0
+        self.baldes = [0] * (len(BALDES) + 1)
+
+    def registrar(self, duracao, linhas):
+        self.comandos += 1
+        self.segundos += duracao
+        if linhas > 0:
+            self.linhas += linhas
+        self.baldes[bisect.bisect_left(BALDES, duracao)] += 1
+
+    def como_dict(self):
+        return {"comandos": self.comandos, "linhas": self.linhas,
+                "segundos": round(self.segundos, 6), "baldes": list(self.baldes)}
+
+
+class Instrumentacao:
+    def __init__(self):
+        self.metricas = {}
+        self.trava = threading.Lock()
+        self.engines = []
+        self._arquivos = {}
+
+    # ---------- atribuição ----------
+    def _ignorado(self, arquivo):
+        ignorado = self._arquivos.get(arquivo)
+        if ignorado is None:
+            ignorado = self._arquivos[arquivo] = arquivo.startswith(_IGNORADOS)
+        return ignorado
+
+    # Primeira função fora do SQLAlchemy e da infraestrutura, como
+    # "modulo.funcao"
+    def chamador(self):
+        rotulo = _rotulo.get()
+        if rotulo is not None:
+            return rotulo
+        frame = sys._getframe(2)
+        while frame is not None:
+            codigo = frame.f_code
+            if not self._ignorado(codigo.co_filename):
+                modulo = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+                return f"{modulo}.{codigo.co_name}"
+            frame = frame.f_back
+        return "?"
+
+    # ---------- eventos do engine ----------
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        context._capivara = (self.chamador(), time.perf_counter())
+
+    def _depois(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, "_capivara", None)
+        if inicio is None:
+            return
+        duracao = time.perf_counter() - inicio[1]
+        with self.trava:
+            metrica = self.metricas.get(inicio[0])
+            if metrica is None:
+                metrica = self.metricas[inicio[0]] = Metrica()
+            metrica.registrar(duracao, cursor.rowcount)
+
+    def instrumentar(self, engine):
+        # Engine assíncrono: os eventos ficam no engine síncrono interno
+        engine = getattr(engine, "sync_engine", engine)
+        if engine in self.engines:
+            return engine
+        event.listen(engine, "before_cursor_execute", self._antes)
+        event.listen(engine, "after_cursor_execute", self._depois)
+        self.engines.append(engine)
+        return engine
+
+    def zerar(self):
+        with self.trava:
+            self.metricas = {}
+
+    def instantaneo(self):
+        with self.trava:
+            return {nome: m.como_dict() for nome, m in self.metricas.items()}
+
+    # ---------- saídas ----------
+    def json(self):
+        return json.dumps({"baldes": list(BALDES), "funcoes": self.instantaneo()}, ensure_ascii=False)
+
+    def prometheus(self):
+        linhas = [
+            "# HELP capivara_sql_comandos_total Comandos SQL por função do jogo",
+            "# TYPE capivara_sql_comandos_total counter",
+        ]
+        dados = sorted(self.instantaneo().items())
+        for nome, m in dados:
+            linhas.append(f'capivara_sql_comandos_total{{funcao="{nome}"}} {m["comandos"]}')
+        linhas += [
+            "# HELP capivara_sql_linhas_total Linhas afetadas ou retornadas por função do jogo",
+            "# TYPE capivara_sql_linhas_total counter",
+        ]
+        for nome, m in dados:
+            linhas.append(f'capivara_sql_linhas_total{{funcao="{nome}"}} {m["linhas"]}')
+        linhas += [
+            "# HELP capivara_sql_segundos Latência dos comandos SQL por função do jogo",
+            "# TYPE capivara_sql_segundos histogram",
+        ]
+        for nome, m in dados:
+            acumulado = 0
+            for limite, quantidade in zip(BALDES + ("+Inf",), m["baldes"]):
+                acumulado += quantidade
+                linhas.append(f'capivara_sql_segundos_bucket{{funcao="{nome}",le="{limite}"}} {acumulado}')
+            linhas.append(f'capivara_sql_segundos_sum{{funcao="{nome}"}} {m["segundos"]}')
+            linhas.append(f'capivara_sql_segundos_count{{funcao="{nome}"}} {m["comandos"]}')
+        return "\n".join(linhas) + "\n"
+
+    # Tabela legível, da função que mais gasta tempo para a que menos gasta
+    def relatorio(self):
+        dados = sorted(self.instantaneo().items(), key=lambda item: -item[1]["segundos"])
+        if not dados:
+            return "Nenhum comando SQL registrado."
+        largura = max(len("função"), *(len(nome) for nome, _ in dados))
+        linhas = [f"{'função':<{largura}} {'comandos':>9} {'linhas':>9} {'total ms':>10} "
+                  f"{'média ms':>9} {'p50 ms':>8} {'p99 ms':>8}"]
+        for nome, m in dados:
+            linhas.append(
+                f"{nome:<{largura}} {m['comandos']:>9} {m['linhas']:>9} {m['segundos'] * 1000:>10.1f} "
+                f"{m['segundos'] * 1000 / m['comandos']:>9.2f} "
+                f"{quantil(m['baldes'], 0.5) * 1000:>8.1f} {quantil(m['baldes'], 0.99) * 1000:>8.1f}"
+            )
+        return "\n".join(linhas)
+
+    # Grava no arquivo (troca atômica) a cada `intervalo` segundos, numa
+    # thread em segundo plano
+    def exportar_periodicamente(self, caminho, intervalo=15.0):
+        formatar = self.json if caminho.endswith(".json") else self.prometheus
+
+        def gravar():
+            temporario = f"{caminho}.tmp"
+            with open(temporario, "w", encoding="utf8") as f:
+                f.write(formatar())
+            os.replace(temporario, caminho)
+
+        def laco():
+            while True:
+                time.sleep(intervalo)
+                gravar()
+
+        threading.Thread(target=laco, name="capivara-metricas", daemon=True).start()
+        atexit.register(gravar)
+
+
+# Estimativa do quantil pelo histograma: limite superior do balde onde ele cai
+def quantil(baldes, q):
+    total = sum(baldes)
+    if not total:
+        return 0.0
+    alvo, acumulado = q * total, 0
+    for limite, quantidade in zip(BALDES + (float("inf"),), baldes):
+        acumulado += quantidade
+        if acumulado >= alvo:
+            return limite if limite != float("inf") else BALDES[-1]
+    return BALDES[-1]
+
+
+# Percentil p (0 a 100) de uma lista de medidas exatas (stress, autojogo,
+# benchmark)
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+instrumentacao = Instrumentacao()
+MODO = os.environ.get("CAPIVARA_INSTRUMENTAR", "")
+
+
+def ativada():
+    return bool(instrumentacao.engines)
+
+
+def ativar(engine):
+    return instrumentacao.instrumentar(engine)
+
+
+# Atribui os comandos executados dentro do bloco a `nome`
+@contextmanager
+def rotulo(nome):
+    token = _rotulo.set(nome)
+    try:
+        yield
+    finally:
+        _rotulo.reset(token)
+
+
+# Chamado por conexao.obter_engine()/obter_engine_async() ao criar o engine
+def configurar(engine):
+    ativar(engine)
+    arquivo = os.environ.get("CAPIVARA_METRICAS_ARQUIVO")
+    if arquivo and len(instrumentacao.engines) == 1:
+        instrumentacao.exportar_periodicamente(arquivo, float(os.environ.get("CAPIVARA_METRICAS_INTERVALO", "15")))
+
+
+# Chamado quando uma sessão de conexao.session é fechada
+def ao_fechar_sessao():
+    if MODO == "relatorio" and ativada():
+        print(instrumentacao.relatorio(), file=sys.stderr)
@@ -0,0 +1,201 @@
+import csv
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from sqlalchemy import text, select, exists, and_
+from conexao import session, obter_engine, Usuario, Partida, PartidaUsuario
+
+# Listagens paginadas (paginação por chave, com memória constante) e
+# exportação em CSV/JSONL com cursor no servidor.
+#
+# Uso: python listagens.py usuarios|partidas|ranking|historico
+#          [--formato csv|jsonl] [--saida arquivo] [--de AAAA-MM-DD] [--ate AAAA-MM-DD]
+#          [--finalizadas | --abertas] [--jogador ID]
+
+TAMANHO_PAGINA = 500
+
+
+# ---------- consultas ----------
+def consulta_usuarios(apos_id=None):
+    consulta = select(Usuario.idusuario, Usuario.nome, Usuario.datacadastro)
+    if apos_id is not None:
+        consulta = consulta.where(Usuario.idusuario > apos_id)
+    return consulta.order_by(Usuario.idusuario)
+
+
+# Filtros: inicio/fim (datahorainicio), finalizadas=True/False, idusuario
+def consulta_partidas(apos_id=None, inicio=None, fim=None, finalizadas=None, idusuario=None):
+    consulta = select(
+        Partida.idpartida, Partida.datahorainicio, Partida.datahorafim,
+        Partida.modotermino, Partida.idjogadorvencedor, Partida.idduplavencedora,
+        Partida.pontosdapartida,
+    )
+    if apos_id is not None:
+        consulta = consulta.where(Partida.idpartida > apos_id)
+    if inicio is not None:
+        consulta = consulta.where(Partida.datahorainicio >= inicio)
+    if fim is not None:
+        consulta = consulta.where(Partida.datahorainicio < fim)
+    if finalizadas is True:
+        consulta = consulta.where(Partida.datahorafim.is_not(None))
+    elif finalizadas is False:
+        consulta = consulta.where(Partida.datahorafim.is_(None))
+    if idusuario is not None:
+        consulta = consulta.where(exists().where(and_(
+            PartidaUsuario.idpartida == Partida.idpartida,
+            PartidaUsuario.idusuario == idusuario,
+        )))
+    return consulta.order_by(Partida.idpartida)
+
+
+def consulta_ranking(apos=None, limite=None):
+    filtro, params = "", {}
+    if apos is not None:
+        filtro = "WHERE (partidasVencidas, totalPontosGanhos, idUsuario) < (:v, :pts, :id)"
+        params = {"v": apos[0], "pts": apos[1], "id": apos[2]}
+    if limite is not None:
+        params["limite"] = limite
+    return text(f"""
+        SELECT * FROM RankingEstatisticas {filtro}
+        ORDER BY partidasVencidas DESC, totalPontosGanhos DESC, idUsuario DESC
+        {"LIMIT :limite" if limite is not None else ""}
+    """), params
+
+
+def consulta_historico(apos=None, inicio=None, fim=None, idusuario=None, limite=None):
+    filtros, params = [], {}
+    if apos is not None:
+        filtros.append("(R.dataHoraInicio, R.idPartida) < (:apos_inicio, :apos_id)")
+        params.update({"apos_inicio": apos[0], "apos_id": apos[1]})
+    if inicio is not None:
+        filtros.append("R.dataHoraInicio >= :inicio")
+        params["inicio"] = inicio
+    if fim is not None:
+        filtros.append("R.dataHoraInicio < :fim")
+        params["fim"] = fim
+    if idusuario is not None:
+        filtros.append("EXISTS (SELECT 1 FROM PartidaUsuario PU "
+                       "WHERE PU.idPartida = R.idPartida AND PU.idUsuario = :idusuario)")
+        params["idusuario"] = idusuario
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    if limite is not None:
+        params["limite"] = limite
+    return text(f"""
+        SELECT R.* FROM ResumoPartida R {where}
+        ORDER BY R.dataHoraInicio DESC, R.idPartida DESC
+        {"LIMIT :limite" if limite is not None else ""}
+    """), params
+
+
+# ---------- páginas ----------
+# Cada função gera listas de até `tamanho` linhas; cada página é uma
+# consulta curta que continua a partir da última chave vista.
+def paginas_usuarios(tamanho=TAMANHO_PAGINA, apos_id=None):
+    while True:
+        pagina = session.execute(consulta_usuarios(apos_id).limit(tamanho)).fetchall()
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho:
+            return
+        apos_id = pagina[-1].idusuario
+
+
+def paginas_partidas(tamanho=TAMANHO_PAGINA, apos_id=None, **filtros):
+    while True:
+        pagina = session.execute(consulta_partidas(apos_id, **filtros).limit(tamanho)).fetchall()
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho:
+            return
+        apos_id = pagina[-1].idpartida
+
+
+def paginas_ranking(tamanho=TAMANHO_PAGINA, apos=None):
+    while True:
+        pagina = session.execute(*consulta_ranking(apos, tamanho)).fetchall()
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho:
+            return
+        ultima = pagina[-1]
+        apos = (ultima.partidasvencidas, ultima.totalpontosganhos, ultima.idusuario)
+
+
+def paginas_historico(tamanho=TAMANHO_PAGINA, apos=None, **filtros):
+    while True:
+        pagina = session.execute(*consulta_historico(apos, limite=tamanho, **filtros)).fetchall()
+        if pagina:
+            yield pagina
+        if len(pagina) < tamanho:
+            return
+        apos = (pagina[-1].datahorainicio, pagina[-1].idpartida)
+
+
+# Percorre as linhas de um gerador de páginas
+def linhas(paginas):
+    for pagina in paginas:
+        yield from pagina
+
+
+# ---------- exportação ----------
+CONSULTAS = {
+    "usuarios": lambda f: (consulta_usuarios(), {}),
+    "partidas": lambda f: (consulta_partidas(**f), {}),
+    "ranking": lambda f: consulta_ranking(),
+    "historico": lambda f: consulta_historico(**{k: v for k, v in f.items() if k != "finalizadas"}),
+}
+
+
+# Exporta uma listagem inteira em CSV ou JSONL. Usa um cursor no servidor
+# (stream_results) e lê em blocos, então a memória não cresce com a tabela.
+def exportar(tipo, formato, saida, bloco=TAMANHO_PAGINA, **filtros):
+    consulta, params = CONSULTAS[tipo](filtros)
+    total = 0
+    with obter_engine().connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=bloco).execute(consulta, params)
+        colunas = list(resultado.keys())
+        if formato == "csv":
+            escritor = csv.writer(saida)
+            escritor.writerow(colunas)
+            for row in resultado:
+                escritor.writerow(row)
+                total += 1
+        else:
+            for row in resultado:
+                saida.write(json.dumps(dict(zip(colunas, row)), default=str, ensure_ascii=False) + "\n")
+                total += 1
+    return total
+
+
+def data(texto):
+    return datetime.strptime(texto, "%Y-%m-%d")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta listagens em CSV ou JSONL")
+    parser.add_argument("tipo", choices=sorted(CONSULTAS))
+    parser.add_argument("--formato", choices=["csv", "jsonl"], default="jsonl")
+    parser.add_argument("--saida", help="arquivo de saída (padrão: saída padrão)")
+    parser.add_argument("--de", type=data, dest="inicio")
+    parser.add_argument("--ate", type=data, dest="fim")
+    situacao = parser.add_mutually_exclusive_group()
+    situacao.add_argument("--finalizadas", action="store_true")
+    situacao.add_argument("--abertas", action="store_true")
+    parser.add_argument("--jogador", type=int, dest="idusuario")
+    args = parser.parse_args()
+
+    filtros = {}
+    if args.tipo in ("partidas", "historico"):
+        filtros = {"inicio": args.inicio, "fim": args.fim, "idusuario": args.idusuario}
+        if args.tipo == "partidas":
+            filtros["finalizadas"] = True if args.finalizadas else (False if args.abertas else None)
+
+    inicio = time.perf_counter()
+    if args.saida:
+        with open(args.saida, "w", encoding="utf8", newline="") as f:
+            total = exportar(args.tipo, args.formato, f, **filtros)
+    else:
+        total = exportar(args.tipo, args.formato, sys.stdout, **filtros)
+    print(f"{total} linha(s) exportada(s) em {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
@@ -1,308 +1,308 @@
 import sys
 import random
 from sqlalchemy import text
-from conexao import session, Usuario, Dupla, Partida, Peca, MaoPartida, Movimentacao, PartidaUsuario
+from sqlalchemy.exc import InternalError
+from conexao import session, banco_embutido, Usuario, Dupla, Partida, PartidaUsuario
+from motor import EstadoPartida, obter_conjunto, verificar_fim_partida
+from registro import carregar_registro, reproduzir
+import cache
+from diario import DiarioMovimentos
+from distribuicao import distribuir_partidas
+from bot import Bot
+from resumos import gravar_resumo
+from listagens import (
+    paginas_usuarios, paginas_partidas, paginas_ranking, paginas_historico, exportar, CONSULTAS,
+)
 
 # Funções uteis
+TAMANHO_PAGINA_MENU = 20
+
+# Imprime as linhas página por página, perguntando antes de buscar a próxima
+def mostrar_paginas(paginas, formatar, tamanho=TAMANHO_PAGINA_MENU):
+    for pagina in paginas:
+        for r in pagina:
+            print(formatar(r))
+        if len(pagina) < tamanho or input("Enter para mais, 0 para voltar: ").strip() == "0":
+            break
+    print()
+
 # Lista todos os jogadores cadastrados
 def listar_usuarios():
-    usuarios = session.query(Usuario).all()
     print("\n=== Usuários ===")
-    for u in usuarios:
-        print(f"ID: {u.idusuario} | Nome: {u.nome}")
-    print()
+    mostrar_paginas(paginas_usuarios(TAMANHO_PAGINA_MENU),
+                    lambda u: f"ID: {u.idusuario} | Nome: {u.nome}")
 
-# Lista todas as partidas e seus respectivos horários de início e fim
+# Lista as partidas e seus respectivos horários de início e fim
 def listar_partidas():
-    partidas = session.query(Partida).all()
+    filtro = input("Partidas (Enter = todas, F = finalizadas, A = abertas): ").strip().upper()
+    finalizadas = {"F": True, "A": False}.get(filtro)
     print("\n=== Partidas ===")
-    for p in partidas:
-        vencedor = p.idjogadorvencedor or p.idduplavencedora
-        print(f"Partida {p.idpartida} | Início: {p.datahorainicio} | Fim: {p.datahorafim} | Vencedor: {vencedor}")
-    print()
+    mostrar_paginas(
+        paginas_partidas(TAMANHO_PAGINA_MENU, finalizadas=finalizadas),
+        lambda p: f"Partida {p.idpartida} | Início: {p.datahorainicio} | Fim: {p.datahorafim} | "
+                  f"Vencedor: {p.idjogadorvencedor or p.idduplavencedora}"
+    )
 
-# Função para criar um novo usuário
-def criar_jogador():
-    nome = input("Nome: ")
+# Exporta uma listagem para arquivo CSV ou JSONL
+def exportar_dados():
+    tipo = input("Exportar (usuarios, partidas, ranking, historico): ").strip().lower()
+    if tipo not in CONSULTAS:
+        print("Tipo inválido.\n")
+        return
+    formato = "csv" if input("Formato (csv/jsonl) [jsonl]: ").strip().lower() == "csv" else "jsonl"
+    arquivo = input(f"Arquivo [{tipo}.{formato}]: ").strip() or f"{tipo}.{formato}"
+    with open(arquivo, "w", encoding="utf8", newline="") as f:
+        total = exportar(tipo, formato, f)
+    print(f"{total} linha(s) exportada(s) para {arquivo}\n")
+
+# Cadastra um usuário e retorna o seu ID
+def cadastrar_usuario(nome):
     novo = Usuario(nome=nome)
     session.add(novo)
+    session.flush()
+    idusuario = novo.idusuario
+    cache.definir_apos_commit(session, cache.usuarios, idusuario, nome)
     session.commit()
+    return idusuario
+
+# Função para criar um novo usuário
+def criar_jogador():
+    nome = input("Nome: ")
+    cadastrar_usuario(nome)
     print("Usuário criado!\n")
 
 # ========================= PARTIDA =========================
-# Cria uma partida e adiciona os jogadores a ela
-def iniciar_partida():
-    print("\n=== Nova partida ===")
-    partida = Partida()
+# Cria a partida com os jogadores na ordem da mesa; com 4 jogadores,
+# os dois primeiros formam a primeira dupla e os dois últimos a segunda.
+# `idserie` faz dela a primeira mão de uma série (serie.py).
+def criar_partida(ids, nomes_duplas=None, idserie=None):
+    partida = Partida(idserie=idserie)
     session.add(partida)
     session.flush()  # Para obter o ID antes do commit
-    print(f"Partida criada: {partida.idpartida}\n")
 
-    # Adicionar jogadores
-    print("IDs dos jogadores (ex: 1,2,3,4):")
-    ids = [int(x.strip()) for x in input().split(',')]
-    pos = 1
-    
-    for uid in ids:
-        pu = PartidaUsuario(
-            idpartida=partida.idpartida,
-            idusuario=uid,
-            iddupla=None,
-            posicaomesa=pos
-        )
-        session.add(pu)
-        pos += 1
-    
-    # Criar duplas se houver 4 jogadores
+    duplas_ids = []
     if len(ids) == 4:
-        duplas_ids = []
-        for i in range(2):
-            nomedupla = input(f"Nome da dupla {i+1}: ")
+        for nomedupla in (nomes_duplas or ["Dupla 1", "Dupla 2"]):
             dupla = Dupla(idpartida=partida.idpartida, nomedupla=nomedupla, pontuacaototal=0)
             session.add(dupla)
             session.flush()
             duplas_ids.append(dupla.iddupla)
-        
-        # Associar jogadores às duplas
-        for idx, uid in enumerate(ids):
-            pj = session.query(PartidaUsuario).filter_by(
-                idpartida=partida.idpartida,
-                idusuario=uid
-            ).first()
-            pj.iddupla = duplas_ids[0] if idx < 2 else duplas_ids[1]
-    
-    session.commit()
-    return partida.idpartida
 
-# ========================= PEÇAS =========================
-# Distribui as peças
-def distribuir_pecas(idpartida):
-    print("Distribuindo peças...")
+    # Em ordem de idusuario: o gatilho contarPartidaUsuario trava a linha de
+    # EstatisticaUsuario de cada jogador incluído, e duas partidas com
+    # jogadores em comum não podem travá-las em ordens opostas (deadlock)
+    for pos, uid in sorted(enumerate(ids, 1), key=lambda a: a[1]):
+        session.add(PartidaUsuario(
+            idpartida=partida.idpartida,
+            idusuario=uid,
+            iddupla=duplas_ids[(pos - 1) // 2] if duplas_ids else None,
+            posicaomesa=pos
+        ))
 
-    # Limpa peças antigas
-    session.query(MaoPartida).filter_by(idpartida=idpartida).delete()
+    idpartida = partida.idpartida
+    cache.definir_apos_commit(session, cache.assentos, idpartida, cache.Assentos(
+        [(uid, duplas_ids[i // 2] if duplas_ids else None) for i, uid in enumerate(ids)],
+        dict(zip(duplas_ids, nomes_duplas or ["Dupla 1", "Dupla 2"])),
+    ))
     session.commit()
+    return idpartida
 
-    pecas = session.query(Peca).all()
-    idspecas = [p.idpeca for p in pecas]
-    random.shuffle(idspecas)
-
-    jogadores = session.query(PartidaUsuario).filter_by(idpartida=idpartida).all()
-    mao = 7
-    idx = 0
-
-    for j in jogadores:
-        for _ in range(mao):
-            mp = MaoPartida(
-                idpartida=idpartida,
-                idpeca=idspecas[idx],
-                idusuario=j.idusuario,
-                statuspeca='em_mao'
-            )
-            session.add(mp)
-            idx += 1
-
-    # Restante das peças no monte
-    for i in range(idx, len(idspecas)):
-        mp = MaoPartida(
-            idpartida=idpartida, 
-            idpeca=idspecas[i], 
-            idusuario=None,
-            statuspeca='no_monte'
-        )
-        session.add(mp)
+# Cria uma partida e adiciona os jogadores a ela
+def iniciar_partida():
+    print("\n=== Nova partida ===")
 
-    session.commit()
+    # Adicionar jogadores
+    print("IDs dos jogadores (ex: 1,2,3,4):")
+    ids = [int(x.strip()) for x in input().split(',')]
+
+    # Criar duplas se houver 4 jogadores
+    nomes_duplas = None
+    if len(ids) == 4:
+        nomes_duplas = [input(f"Nome da dupla {i+1}: ") for i in range(2)]
+
+    idpartida = criar_partida(ids, nomes_duplas)
+    print(f"Partida criada: {idpartida}\n")
+    return idpartida
+
+# ========================= PEÇAS =========================
+# Distribui as peças
+def distribuir_pecas(idpartida, semente=None):
+    print("Distribuindo peças...")
+    distribuir_partidas(session, [idpartida], semente=semente)
     print("Peças distribuídas!\n")
 
 # ========================= RANKING / HISTÓRICO =========================
-# Mostra o ranking de vencedores
+# Mostra o ranking de vencedores, uma página por vez
 def ranking():
     try:
-        rows = session.execute(text("SELECT * FROM RankingUsuarios")).fetchall()
         print("\n=== Ranking ===")
-        for r in rows:
-            print(f"ID: {r[0]} | Nome: {r[1]} | Partidas: {r[2]} | Vitórias: {r[3]} | %: {r[4]} | Pontos: {r[5]}")
-        print()
+        mostrar_paginas(
+            paginas_ranking(TAMANHO_PAGINA_MENU),
+            lambda r: f"ID: {r[0]} | Nome: {r[1]} | Partidas: {r[2]} | Vitórias: {r[3]} | %: {r[4]} | Pontos: {r[5]}"
+        )
     except Exception as e:
         print(f"Erro ao carregar ranking: {e}")
 
-# Mostra todas as partidas e vencedores
+# Mostra as partidas finalizadas, da mais recente para a mais antiga
 def historico():
     try:
-        rows = session.execute(text("SELECT * FROM PartidasDetalhadas")).fetchall()
         print("\n=== Histórico ===")
-        for r in rows:
-            print(f"Partida {r[0]} | Início: {r[1]} | Término: {r[2]} | Modo: {r[3]}")
-        print()
+        mostrar_paginas(
+            paginas_historico(TAMANHO_PAGINA_MENU),
+            lambda r: f"Partida {r.idpartida} | Início: {r.datahorainicio} | Término: {r.datahorafim} | Modo: {r.modotermino}"
+        )
     except Exception as e:
         print(f"Erro ao carregar histórico: {e}")
 
 # ========================= LÓGICA DO JOGO INTERATIVO =========================
+# O estado da partida (mãos, mesa e vez) fica em memória no EstadoPartida;
+# o banco só recebe as jogadas efetivadas.
 
 # Obtém os valores atuais da extremidade da mesa
-def obter_extremidades_partida(idpartida):
-    partida = session.query(Partida).filter_by(idpartida=idpartida).first()
-    return partida.valorextesquerda, partida.valorextdireita
+def obter_extremidades_partida(estado):
+    return estado.ext_esq, estado.ext_dir
 
 # Mostra o estado da mesa
-def mostrar_mesa(idpartida):
-    partida = session.query(Partida).filter_by(idpartida=idpartida).first()
-    ext_esq, ext_dir = partida.valorextesquerda, partida.valorextdireita
-    
-    print(f"\n=== MESA (Partida {idpartida}) ===")
+def mostrar_mesa(estado):
+    ext_esq, ext_dir = obter_extremidades_partida(estado)
+
+    print(f"\n=== MESA (Partida {estado.idpartida}) ===")
     print(f"Extremidade ESQUERDA: {ext_esq}")
     print(f"Extremidade DIREITA: {ext_dir}")
-    
+
     # Mostrar peças já jogadas
-    pecas_jogadas = session.query(Movimentacao, Peca).join(
-        Peca, Movimentacao.idpecajogada == Peca.idpeca
-    ).filter(
-        Movimentacao.idpartida == idpartida,
-        Movimentacao.tipoacao == 'jogada'
-    ).order_by(Movimentacao.ordemacao).all()
-    
-    if pecas_jogadas:
+    if estado.mesa:
         print("Peças jogadas:", end=" ")
-        for mov, peca in pecas_jogadas:
+        for idpeca, _ in estado.mesa:
+            peca = estado.conjunto.peca(idpeca)
             print(f"[{peca.ladoa}-{peca.ladob}]", end=" ")
         print()
 
 # Mostra a mão do jogador
-def mostrar_mao_jogador(idpartida, idusuario):
-    usuario = session.query(Usuario).filter_by(idusuario=idusuario).first()
-    print(f"\n--- Vez de: {usuario.nome} (ID: {idusuario}) ---")
-    
+def mostrar_mao_jogador(estado, idusuario):
+    print(f"\n--- Vez de: {estado.nomes.get(idusuario)} (ID: {idusuario}) ---")
+
     # Mostrar mão do jogador
-    pecas_mao = session.query(MaoPartida, Peca).join(
-        Peca, MaoPartida.idpeca == Peca.idpeca
-    ).filter(
-        MaoPartida.idpartida == idpartida,
-        MaoPartida.idusuario == idusuario,
-        MaoPartida.statuspeca == 'em_mao'
-    ).all()
-    
     print("Sua mão:")
-    for i, (mao, peca) in enumerate(pecas_mao, 1):
+    for i, peca in enumerate(estado.mao(idusuario), 1):
         print(f"  {i}. Peça [{peca.ladoa}-{peca.ladob}] (ID: {peca.idpeca}, Pontos: {peca.pontospeca})")
-    
+
     # Mostrar jogadas possíveis
-    jogadas_validas = obter_jogadas_validas(idpartida, idusuario)
+    jogadas_validas = obter_jogadas_validas(estado, idusuario)
     if jogadas_validas:
         print("\nJogadas possíveis:")
         for i, peca in enumerate(jogadas_validas, 1):
-            ext_esq, ext_dir = obter_extremidades_partida(idpartida)
-            opcoes = []
-            if peca.ladoa == ext_esq or peca.ladob == ext_esq:
-                opcoes.append("ESQUERDA")
-            if peca.ladoa == ext_dir or peca.ladob == ext_dir:
-                opcoes.append("DIREITA")
+            opcoes = [e.upper() for e in estado.encaixes(peca)]
             print(f"  {i}. Peça [{peca.ladoa}-{peca.ladob}] (ID: {peca.idpeca}) -> Encaxa em: {', '.join(opcoes)}")
     else:
         print("\nNenhuma jogada possível nas extremidades atuais")
 
 # Analisa as possíveis jogadas que o jogador pode fazer
-def obter_jogadas_validas(idpartida, idusuario):
-    ext_esq, ext_dir = obter_extremidades_partida(idpartida)
-    jogadas_validas = []
-    
-    pecas_mao = session.query(MaoPartida, Peca).join(
-        Peca, MaoPartida.idpeca == Peca.idpeca
-    ).filter(
-        MaoPartida.idpartida == idpartida,
-        MaoPartida.idusuario == idusuario,
-        MaoPartida.statuspeca == 'em_mao'
-    ).all()
-    
-    for mao, peca in pecas_mao:
-        if (peca.ladoa == ext_esq or peca.ladob == ext_esq or 
-            peca.ladoa == ext_dir or peca.ladob == ext_dir):
-            jogadas_validas.append(peca)
-    
-    return jogadas_validas
+def obter_jogadas_validas(estado, idusuario):
+    return estado.jogadas_validas(idusuario)
 
 # Define o próximo jogador
-def obter_proximo_jogador(idpartida, jogador_atual):
-    participantes = session.query(PartidaUsuario).filter_by(
-        idpartida=idpartida
-    ).order_by(PartidaUsuario.posicaomesa).all()
-    
-    pos_atual = None
-    for i, p in enumerate(participantes):
-        if p.idusuario == jogador_atual:
-            pos_atual = i
-            break
-    
-    if pos_atual is None:
+def obter_proximo_jogador(estado, jogador_atual):
+    if jogador_atual not in estado.jogadores:
         return None
-    
-    proxima_pos = (pos_atual + 1) % len(participantes)
-    return participantes[proxima_pos].idusuario
+    return estado.proximo_jogador(jogador_atual)
+
+# Coloca a peça na mesa e registra a jogada no diário. A validação é
+# feita no EstadoPartida; o banco recebe a jogada já efetivada. Quando o
+# diário grava a cada movimento (por_jogada) e não há nada pendente, a
+# jogada vai direto por executar_turno: um comando só, que também confere
+# no banco a vez e a peça, e a memória só muda se o banco aceitou.
+def jogar_peca(estado, diario, idusuario, peca, extremidade):
+    if diario.modo == 'por_jogada' and not diario.pendentes():
+        turno = executar_turno(estado.idpartida, idusuario, peca.idpeca, extremidade)
+        estado.jogar(idusuario, peca.idpeca, turno.extremidadeusada)
+        diario.ordem = turno.ordemacao
+        return
+    estado.jogar(idusuario, peca.idpeca, extremidade)
+    extremidade = estado.mesa[-1][1]
+    diario.registrar_jogada(idusuario, peca.idpeca, extremidade, estado.ext_esq, estado.ext_dir)
+
+# Joga uma peça em um único comando no banco (função ExecutarTurno), sem
+# depender do estado em memória: valida, atualiza as extremidades com a
+# partida travada e já informa se o jogador bateu ou se o jogo trancou.
+# Retorna a linha com valorextesquerda, valorextdireita, extremidadeusada,
+# ordemacao, bateu e trancado. No banco embutido a função é a de embutido.py.
+# Uma jogada recusada (fora da vez, peça que não encaixa ou não está na
+# mão) levanta ValueError, como EstadoPartida.jogar.
+def executar_turno(idpartida, idusuario, idpeca, extremidade):
+    try:
+        if banco_embutido():
+            import embutido
+            resultado = embutido.executar_turno(embutido.bruta(session), idpartida, idusuario, idpeca, extremidade)
+        else:
+            resultado = session.execute(text(
+                "SELECT * FROM ExecutarTurno(:p, :u, :peca, :ext)"
+            ), {"p": idpartida, "u": idusuario, "peca": idpeca, "ext": extremidade}).one()
+        session.commit()
+    except InternalError as e:
+        # RAISE EXCEPTION do PL/pgSQL
+        session.rollback()
+        raise ValueError(str(e.orig).splitlines()[0]) from e
+    except Exception:
+        session.rollback()
+        raise
+    return resultado
+
+# Compra uma peça do monte; retorna a peça comprada ou None se o monte está vazio
+def comprar_peca(estado, diario, idusuario):
+    idpeca = estado.comprar(idusuario)
+    if idpeca is not None:
+        diario.registrar_compra(idusuario, idpeca)
+    return idpeca
+
+# Registra que o jogador passou a vez
+def passar_vez(estado, diario, idusuario):
+    diario.registrar_passe(idusuario)
+
+# Compra interativa, com as mensagens para o jogador
+def comprar_do_monte(estado, diario, idusuario):
+    if comprar_peca(estado, diario, idusuario) is None:
+        print("Monte vazio.")
+    else:
+        print("Peça comprada do monte!")
+    return True
+
+# Passe interativo
+def passar_a_vez(estado, diario, idusuario):
+    print("Você passou a vez.")
+    passar_vez(estado, diario, idusuario)
+    return True
 
 # Jogada do usuário
-def realizar_jogada_usuario(idpartida, idusuario):
-    jogadas_validas = obter_jogadas_validas(idpartida, idusuario)
-    
+def realizar_jogada_usuario(estado, diario, idusuario):
+    jogadas_validas = obter_jogadas_validas(estado, idusuario)
+
     if jogadas_validas:
         print("\nOpções:")
         print("1. Jogar peça")
         print("2. Comprar do monte")
         print("3. Passar a vez")
-        
+
         opcao = input("Escolha uma opção (1-3): ").strip()
-        
+
         if opcao == "1":
             # Jogar peça
             try:
                 num_peca = int(input("Número da peça para jogar (ver lista acima): "))
                 if 1 <= num_peca <= len(jogadas_validas):
                     peca_escolhida = jogadas_validas[num_peca - 1]
-                    ext_esq, ext_dir = obter_extremidades_partida(idpartida)
-                    
-                    # Verificar em quais extremidades encaixa
-                    encaixe_esq = peca_escolhida.ladoa == ext_esq or peca_escolhida.ladob == ext_esq
-                    encaixe_dir = peca_escolhida.ladoa == ext_dir or peca_escolhida.ladob == ext_dir
-                    
-                    if encaixe_esq and encaixe_dir:
+                    encaixes = estado.encaixes(peca_escolhida)
+
+                    if len(encaixes) > 1:
                         # Peça encaixa em ambos os lados, usuário escolhe
                         print(f"Peça [{peca_escolhida.ladoa}-{peca_escolhida.ladob}] encaixa em ambos os lados!")
-                        extremidade = input("Escolha extremidade (E - Esquerda, D - Direita): ").strip().upper()
-                        if extremidade == 'E':
-                            extremidade = 'esquerda'
-                            valor_extremidade = ext_esq
-                        else:
-                            extremidade = 'direita'
-                            valor_extremidade = ext_dir
-                    elif encaixe_esq:
-                        extremidade = 'esquerda'
-                        valor_extremidade = ext_esq
+                        escolha = input("Escolha extremidade (E - Esquerda, D - Direita): ").strip().upper()
+                        extremidade = 'esquerda' if escolha == 'E' else 'direita'
                     else:
-                        extremidade = 'direita'
-                        valor_extremidade = ext_dir
-                    
+                        extremidade = encaixes[0]
+
                     # Realizar jogada
-                    session.execute(text(
-                        f"CALL ValidarJogada({idpartida}, {idusuario}, {peca_escolhida.idpeca}, '{extremidade}', {valor_extremidade})"
-                    ))
-                    
-                    # Atualizar extremidades na partida
-                    partida = session.query(Partida).filter_by(idpartida=idpartida).first()
-                    if extremidade == 'esquerda':
-                        # Determinar novo valor da extremidade esquerda
-                        if peca_escolhida.ladoa == ext_esq:
-                            novo_valor = peca_escolhida.ladob
-                        else:
-                            novo_valor = peca_escolhida.ladoa
-                        partida.valorextesquerda = novo_valor
-                    else:
-                        # Determinar novo valor da extremidade direita
-                        if peca_escolhida.ladoa == ext_dir:
-                            novo_valor = peca_escolhida.ladob
-                        else:
-                            novo_valor = peca_escolhida.ladoa
-                        partida.valorextdireita = novo_valor
-                    
-                    session.commit()
+                    jogar_peca(estado, diario, idusuario, peca_escolhida, extremidade)
                     print(f"Peça [{peca_escolhida.ladoa}-{peca_escolhida.ladob}] jogada na extremidade {extremidade.upper()}!")
                     return True
                 else:
@@ -311,35 +311,12 @@ def realizar_jogada_usuario(idpartida, idusuario):
             except ValueError:
                 print("Entrada inválida!")
                 return False
-                
+
         elif opcao == "2":
-            # Comprar do monte
-            try:
-                session.execute(text(f"CALL ComprarPecaDoMonte({idpartida}, {idusuario})"))
-                session.commit()
-                print("Peça comprada do monte!")
-                return True
-            except Exception as e:
-                print(f"Erro ao comprar peça: {e}")
-                session.rollback()
-                return False
-                
+            return comprar_do_monte(estado, diario, idusuario)
+
         elif opcao == "3":
-            # Passar a vez
-            print("Você passou a vez.")
-            # Registrar passada no histórico
-            ordem = session.query(Movimentacao).filter_by(idpartida=idpartida).count() + 1
-            nova_mov = Movimentacao(
-                idpartida=idpartida,
-                idusuario=idusuario,
-                ordemacao=ordem,
-                tipoacao='passou',
-                idpecajogada=None,
-                extremidademesa=None
-            )
-            session.add(nova_mov)
-            session.commit()
-            return True
+            return passar_a_vez(estado, diario, idusuario)
         else:
             print("Opção inválida!")
             return False
@@ -349,214 +326,239 @@ def realizar_jogada_usuario(idpartida, idusuario):
         print("Opções:")
         print("1. Comprar do monte")
         print("2. Passar a vez")
-        
+
         opcao = input("Escolha uma opção (1-2): ").strip()
-        
+
         if opcao == "1":
-            try:
-                session.execute(text(f"CALL ComprarPecaDoMonte({idpartida}, {idusuario})"))
-                session.commit()
-                print("Peça comprada do monte!")
-                return True
-            except Exception as e:
-                print(f"Erro ao comprar peça: {e}")
-                session.rollback()
-                return False
+            return comprar_do_monte(estado, diario, idusuario)
         elif opcao == "2":
-            print("Você passou a vez.")
-            ordem = session.query(Movimentacao).filter_by(idpartida=idpartida).count() + 1
-            nova_mov = Movimentacao(
-                idpartida=idpartida,
-                idusuario=idusuario,
-                ordemacao=ordem,
-                tipoacao='passou',
-                idpecajogada=None,
-                extremidademesa=None
-            )
-            session.add(nova_mov)
-            session.commit()
-            return True
+            return passar_a_vez(estado, diario, idusuario)
         else:
             print("Opção inválida!")
             return False
 
-# Verifica se alguém bateu
-def verificar_jogador_bateu(idpartida, idusuario):
-    pecas_mao = session.query(MaoPartida).filter_by(
-        idpartida=idpartida,
-        idusuario=idusuario,
-        statuspeca='em_mao'
-    ).count()
-    
-    return pecas_mao == 0
-
-# Verifica se alguém trancou a mesa
-def verificar_jogo_trancado(idpartida):
-    ext_esq, ext_dir = obter_extremidades_partida(idpartida)
-    
-    participantes = session.query(PartidaUsuario).filter_by(idpartida=idpartida).all()
-    
-    for participante in participantes:
-        # Verificar se jogador tem peças válidas
-        jogadas_validas = obter_jogadas_validas(idpartida, participante.idusuario)
-        if jogadas_validas:
-            return False
-    
-    # Verificar se ainda há peças no monte
-    pecas_monte = session.query(MaoPartida).filter_by(
-        idpartida=idpartida,
-        statuspeca='no_monte'
-    ).count()
-    
-    return pecas_monte == 0  # Jogo trancado apenas se monte também estiver vazio
-
-# Calcula a pontuação do trancamento
-def calcular_pontuacao_trancamento(idpartida):
-    participantes = session.query(PartidaUsuario).filter_by(idpartida=idpartida).all()
-    
-    # Para jogo individual (2-3 jogadores)
-    if all(p.iddupla is None for p in participantes):
-        pontuacoes = []
-        for p in participantes:
-            pontos = session.query(text('SUM(peca.pontospeca)')).select_from(MaoPartida).join(
-                Peca, MaoPartida.idpeca == Peca.idpeca
-            ).filter(
-                MaoPartida.idpartida == idpartida,
-                MaoPartida.idusuario == p.idusuario,
-                MaoPartida.statuspeca == 'em_mao'
-            ).scalar() or 0
-            pontuacoes.append((p.idusuario, pontos))
-        
-        # Vencedor é quem tem menos pontos
-        pontuacoes.sort(key=lambda x: x[1])
-        return pontuacoes[0][0], pontuacoes[0][1]  # id_vencedor, pontos
-    
-    # Para jogo em duplas (implementação básica)
-    else:
-        # Lógica simplificada para duplas
-        duplas = {}
-        for p in participantes:
-            if p.iddupla not in duplas:
-                duplas[p.iddupla] = 0
-            
-            pontos = session.query(text('SUM(peca.pontospeca)')).select_from(MaoPartida).join(
-                Peca, MaoPartida.idpeca == Peca.idpeca
-            ).filter(
-                MaoPartida.idpartida == idpartida,
-                MaoPartida.idusuario == p.idusuario,
-                MaoPartida.statuspeca == 'em_mao'
-            ).scalar() or 0
-            duplas[p.iddupla] += pontos
-        
-        # Dupla vencedora é a com menos pontos
-        id_dupla_vencedora = min(duplas, key=duplas.get)
-        return None, id_dupla_vencedora, duplas[id_dupla_vencedora]
+# Jogada de um assento controlado pelo computador
+def realizar_jogada_bot(estado, diario, idusuario, bot):
+    jogada = bot.escolher(estado, idusuario)
+    if jogada is None:
+        if estado.pecas_no_monte():
+            return comprar_do_monte(estado, diario, idusuario)
+        return passar_a_vez(estado, diario, idusuario)
+    peca, extremidade = jogada
+    jogar_peca(estado, diario, idusuario, peca, extremidade)
+    print(f"Computador jogou [{peca.ladoa}-{peca.ladob}] na extremidade {extremidade.upper()}!")
+    return True
+
+# Grava o fim da partida e retorna os pontos calculados pelo gatilho
+def encerrar_partida(idpartida, motivo, idvencedor=None, idduplavencedora=None, diario=None):
+    # Grava os movimentos pendentes na mesma transação do fim da partida,
+    # antes do gatilho que calcula os pontos a partir de MaoPartida
+    if diario is not None:
+        diario.descarregar(commit=False)
 
-# Finaliza a partida
-def finalizar_partida(idpartida, motivo, idvencedor=None, idduplavencedora=None):
     partida = session.query(Partida).filter_by(idpartida=idpartida).first()
-    
+
     partida.datahorafim = text("CURRENT_TIMESTAMP")
     partida.modotermino = motivo
-    
+
     if idvencedor:
         partida.idjogadorvencedor = idvencedor
     elif idduplavencedora:
         partida.idduplavencedora = idduplavencedora
-    
+
+    session.flush()
+    gravar_resumo(idpartida, diario.ordem if diario is not None else None)
     session.commit()
+    return partida.pontosdapartida
+
+# Finaliza a partida
+def finalizar_partida(idpartida, motivo, idvencedor=None, idduplavencedora=None, diario=None):
+    pontos = encerrar_partida(idpartida, motivo, idvencedor, idduplavencedora, diario)
     print(f"\n=== PARTIDA FINALIZADA ===")
     print(f"Motivo: {motivo}")
     if idvencedor:
-        usuario = session.query(Usuario).filter_by(idusuario=idvencedor).first()
-        print(f"Vencedor: {usuario.nome}")
+        print(f"Vencedor: {cache.nome(session, idvencedor)}")
     elif idduplavencedora:
-        dupla = session.query(Dupla).filter_by(iddupla=idduplavencedora).first()
-        print(f"Dupla vencedora: {dupla.nomedupla}")
-    print(f"Pontos da partida: {partida.pontosdapartida}")
-
-# Função principal do jogo
-def jogar_partida_interativa(idpartida):
-    print(f"\n=== INICIANDO PARTIDA {idpartida} ===")
-    
-    # Distribuir peças
-    distribuir_pecas(idpartida)
-    
-    # Encontrar jogador com peça 6-6 para começar
-    peca_66 = session.query(Peca).filter_by(ladoa=6, ladob=6).first()
-    mao_66 = session.query(MaoPartida).filter_by(
-        idpartida=idpartida, 
-        idpeca=peca_66.idpeca if peca_66 else None,
-        statuspeca='em_mao'
-    ).first()
-    
-    if mao_66:
-        jogador_atual = mao_66.idusuario
-        usuario = session.query(Usuario).filter_by(idusuario=jogador_atual).first()
-        print(f"{usuario.nome} tem a peça 6-6 e inicia a partida!")
-        
-        # Jogador joga a peça 6-6
-        input("Pressione Enter para jogar a peça 6-6...")
-        session.execute(text(
-            f"CALL ValidarJogada({idpartida}, {jogador_atual}, {peca_66.idpeca}, 'centro', 6)"
-        ))
-        
-        # Atualizar extremidades iniciais
-        partida = session.query(Partida).filter_by(idpartida=idpartida).first()
-        partida.valorextesquerda = 6
-        partida.valorextdireita = 6
-        session.commit()
-        
+        print(f"Dupla vencedora: {cache.assentos_partida(session, idpartida).duplas.get(idduplavencedora)}")
+    print(f"Pontos da partida: {pontos}")
+
+# Reconstrói em memória uma partida interrompida a partir do registro
+# binário (distribuição inicial + movimentos gravados). Retorna (estado,
+# jogador que fez o último movimento).
+def retomar_partida(registro):
+    nomes = cache.nomes(session, [j for j, _ in registro.jogadores])
+    return reproduzir(registro, obter_conjunto(session), nomes=nomes)
+
+# Função principal do jogo. Com `semente`, a distribuição e as compras do
+# monte são reproduzíveis; os jogadores em `computador` são jogados pelo bot.
+# Uma partida que já tem movimentos gravados é retomada de onde parou.
+def jogar_partida_interativa(idpartida, semente=None, computador=()):
+    partida = session.get(Partida, idpartida)
+    if partida is None:
+        print(f"Partida {idpartida} não encontrada.")
+        return
+    if partida.datahorafim is not None:
+        print(f"Partida {idpartida} já foi finalizada.")
+        return
+    ultima_ordem = partida.proximaordemacao - 1
+    registro = carregar_registro(session, idpartida) if ultima_ordem else None
+
+    if registro is not None:
+        estado, jogador_anterior = retomar_partida(registro)
+        print(f"\n=== RETOMANDO PARTIDA {idpartida} (movimento {ultima_ordem}) ===")
+    else:
+        print(f"\n=== INICIANDO PARTIDA {idpartida} ===")
+
+        # Distribuir peças
+        distribuir_pecas(idpartida, semente)
+        estado = EstadoPartida.carregar(session, idpartida)
+    estado.rng = random.Random(semente)
+    diario = DiarioMovimentos(session, idpartida, ultima_ordem=ultima_ordem)
+    bot = Bot(estado.conjunto, semente=semente) if computador else None
+
+    if registro is not None:
+        jogador_atual = estado.jogador_atual
+        print(f"Vez de {estado.nomes[jogador_atual]}.")
     else:
-        # Começar com jogador aleatório se ninguém tem 6-6
-        participantes = session.query(PartidaUsuario).filter_by(idpartida=idpartida).all()
-        jogador_atual = random.choice(participantes).idusuario
-        usuario = session.query(Usuario).filter_by(idusuario=jogador_atual).first()
-        print(f"Ninguém tem 6-6. {usuario.nome} inicia a partida!")
-    
-    # Loop principal do jogo
+        jogador_atual, jogador_anterior = abrir_partida(estado, diario, computador)
+
+    motivo, id_vencedor, id_dupla_vencedora = conduzir_partida(
+        estado, diario, jogador_atual, jogador_anterior, computador, bot)
+    finalizar_partida(idpartida, motivo, idvencedor=id_vencedor,
+                      idduplavencedora=id_dupla_vencedora, diario=diario)
+
+# Primeira jogada de uma partida recém-distribuída. Sem `abertura`, quem tem
+# a peça 6-6 a joga (ou, se ninguém tem, um jogador sorteado começa); com
+# ela, esse jogador abre com a peça que quiser. Retorna (jogador da vez,
+# jogador que acabou de jogar ou None).
+def abrir_partida(estado, diario, computador=(), abertura=None):
+    if abertura is not None:
+        print(f"{estado.nomes[abertura]} abre a partida!")
+        return abertura, None
+
+    # Encontrar jogador com peça 6-6 para começar
+    peca_66 = estado.conjunto.buscar(6, 6)
+    jogador_atual = estado.dono(peca_66.idpeca) if peca_66 else None
+
+    if jogador_atual is not None:
+        print(f"{estado.nomes[jogador_atual]} tem a peça 6-6 e inicia a partida!")
+
+        # Jogador joga a peça 6-6 e a vez passa para o próximo
+        if jogador_atual not in computador:
+            input("Pressione Enter para jogar a peça 6-6...")
+        jogar_peca(estado, diario, jogador_atual, peca_66, 'centro')
+        return obter_proximo_jogador(estado, jogador_atual), jogador_atual
+
+    # Começar com jogador aleatório se ninguém tem 6-6
+    jogador_atual = estado.rng.choice(estado.jogadores)
+    print(f"Ninguém tem 6-6. {estado.nomes[jogador_atual]} inicia a partida!")
+    return jogador_atual, None
+
+# Loop principal do jogo: alterna as jogadas até alguém bater ou a mesa
+# trancar. Retorna (motivo, idvencedor, idduplavencedora), sem gravar o fim.
+def conduzir_partida(estado, diario, jogador_atual, jogador_anterior, computador=(), bot=None):
     turno = 1
     while True:
+        # Verificar se o jogador que acabou de jogar bateu ou se o jogo trancou
+        fim = verificar_fim_partida(estado, jogador_anterior)
+        if fim:
+            motivo, id_vencedor, id_dupla_vencedora = fim
+            if motivo == 'bater':
+                print(f"\n🎉 {estado.nomes[id_vencedor]} BATEU O JOGO!")
+            else:
+                print(f"\n🔒 JOGO TRANCADO!")
+            return fim
+
         print(f"\n{'='*50}")
         print(f"TURNO {turno}")
         print(f"{'='*50}")
-        
-        usuario_atual = session.query(Usuario).filter_by(idusuario=jogador_atual).first()
-        print(f"Vez de: {usuario_atual.nome}")
-        
+        print(f"Vez de: {estado.nomes[jogador_atual]}")
+
         # Mostrar estado atual
-        mostrar_mesa(idpartida)
-        mostrar_mao_jogador(idpartida, jogador_atual)
-        
-        # Verificar se jogador atual bateu
-        if verificar_jogador_bateu(idpartida, jogador_atual):
-            print(f"\n🎉 {usuario_atual.nome} BATEU O JOGO!")
-            finalizar_partida(idpartida, 'bater', idvencedor=jogador_atual)
-            break
-        
-        # Verificar se jogo está trancado
-        if verificar_jogo_trancado(idpartida):
-            print(f"\n🔒 JOGO TRANCADO!")
-            if len(session.query(PartidaUsuario).filter_by(idpartida=idpartida).all()) <= 3:
-                id_vencedor, pontos = calcular_pontuacao_trancamento(idpartida)
-                finalizar_partida(idpartida, 'trancado', idvencedor=id_vencedor)
-            else:
-                id_vencedor, id_dupla_vencedora, pontos = calcular_pontuacao_trancamento(idpartida)
-                finalizar_partida(idpartida, 'trancado', idduplavencedora=id_dupla_vencedora)
-            break
-        
+        mostrar_mesa(estado)
+        mostrar_mao_jogador(estado, jogador_atual)
+
         # Aguardar jogada do usuário
-        input("\nPressione Enter para fazer sua jogada...")
-        jogada_realizada = realizar_jogada_usuario(idpartida, jogador_atual)
-        
+        if jogador_atual in computador:
+            jogada_realizada = realizar_jogada_bot(estado, diario, jogador_atual, bot)
+        else:
+            input("\nPressione Enter para fazer sua jogada...")
+            jogada_realizada = realizar_jogada_usuario(estado, diario, jogador_atual)
+
         if jogada_realizada:
             # Avançar para próximo jogador
             jogador_anterior = jogador_atual
-            jogador_atual = obter_proximo_jogador(idpartida, jogador_atual)
+            jogador_atual = obter_proximo_jogador(estado, jogador_atual)
             turno += 1
         else:
             print("Jogada inválida, tente novamente.")
 
+# Partida sem interação (autojogo.py, stress.py): cria, distribui e joga
+# até o fim, com a abertura de abrir_partida e as regras de
+# conduzir_partida, sem mensagens. `politicas` dá a política de cada
+# jogador (idusuario -> função (estado, idusuario, validas, rng) -> (peça,
+# extremidade)), usada quando ele tem peça jogável; sem política ele joga a
+# primeira peça válida. Sem peça jogável compra do monte e, com o monte
+# vazio, passa. Retorna (estado, (motivo, idvencedor, idduplavencedora),
+# movimentos).
+def jogar_partida_automatica(jogadores, rng, politicas=None):
+    politicas = politicas or {}
+    idpartida = criar_partida(jogadores)
+    distribuir_partidas(session, {idpartida: jogadores}, rng=rng)
+    estado = EstadoPartida.carregar(session, idpartida)
+    estado.rng = rng
+    diario = DiarioMovimentos(session, idpartida, ultima_ordem=0)
+
+    peca_66 = estado.conjunto.buscar(6, 6)
+    jogador_atual = estado.dono(peca_66.idpeca) if peca_66 else None
+    jogador_anterior = None
+    if jogador_atual is not None:
+        jogar_peca(estado, diario, jogador_atual, peca_66, 'centro')
+        jogador_anterior, jogador_atual = jogador_atual, obter_proximo_jogador(estado, jogador_atual)
+    else:
+        jogador_atual = rng.choice(estado.jogadores)
+
+    while True:
+        fim = verificar_fim_partida(estado, jogador_anterior)
+        if fim:
+            encerrar_partida(idpartida, *fim, diario=diario)
+            return estado, fim, diario.ordem
+
+        validas = obter_jogadas_validas(estado, jogador_atual)
+        if validas:
+            politica = politicas.get(jogador_atual)
+            if politica is None:
+                peca, extremidade = validas[0], estado.encaixes(validas[0])[0]
+            else:
+                peca, extremidade = politica(estado, jogador_atual, validas, rng)
+            jogar_peca(estado, diario, jogador_atual, peca, extremidade)
+        elif comprar_peca(estado, diario, jogador_atual) is None:
+            passar_vez(estado, diario, jogador_atual)
+
+        jogador_anterior, jogador_atual = jogador_atual, obter_proximo_jogador(estado, jogador_atual)
+
+# Série de mãos até uma pontuação alvo (serie.py): nova ou retomada
+def jogar_serie():
+    from serie import SerieEmJogo, ALVO_PADRAO
+
+    idserie = input("ID da série (Enter = nova): ").strip()
+    if idserie:
+        serie, andamento = SerieEmJogo.carregar(int(idserie))
+    else:
+        print("IDs dos jogadores (ex: 1,2,3,4):")
+        ids = [int(x.strip()) for x in input().split(',')]
+        nomes_duplas = None
+        if len(ids) == 4:
+            nomes_duplas = [input(f"Nome da dupla {i+1}: ") for i in range(2)]
+        alvo = input(f"Pontos para vencer [{ALVO_PADRAO}]: ").strip()
+        serie, andamento = SerieEmJogo.criar(ids, int(alvo) if alvo else ALVO_PADRAO, nomes_duplas)
+        print(f"Série criada: {serie.idserie}\n")
+    if serie.vencedor is not None:
+        print(f"Série já finalizada. {serie.resumo_placar()}\n")
+        return
+    ids = input("IDs jogados pelo computador (Enter = nenhum): ")
+    serie.jogar({int(x) for x in ids.split(',') if x.strip()}, andamento=andamento)
+
 # ========================= ATUALIZAR MENU =========================
 
 def menu():
@@ -570,6 +572,8 @@ def menu():
 5. Listar partidas
 6. Ranking
 7. Histórico
+8. Exportar dados
+9. Jogar série (até uma pontuação)
 0. Sair
         """)
         c = input("Opção: ")
@@ -579,10 +583,13 @@ def menu():
         elif c == "3": iniciar_partida()
         elif c == "4": 
             pid = int(input("ID da partida: "))
-            jogar_partida_interativa(pid)
+            ids = input("IDs jogados pelo computador (Enter = nenhum): ")
+            jogar_partida_interativa(pid, computador={int(x) for x in ids.split(',') if x.strip()})
         elif c == "5": listar_partidas()
         elif c == "6": ranking()
         elif c == "7": historico()
+        elif c == "8": exportar_dados()
+        elif c == "9": jogar_serie()
         elif c == "0": 
             session.close()
             sys.exit()
@@ -0,0 +1,300 @@
+import random
+from collections import namedtuple
+from sqlalchemy import text
+
+import cache
+
+# Peça do dominó em memória (mesmos nomes de atributos do modelo Peca)
+PecaDomino = namedtuple("PecaDomino", ["idpeca", "ladoa", "ladob", "pontospeca"])
+
+# Pontuação de uma mesa: pontos na mão por jogador, total por time (a dupla;
+# jogador sem dupla é um time sozinho, de chave -idusuario) e se está
+# trancada. Mesmas regras da função PontuacaoPartida do banco.
+Pontuacao = namedtuple("Pontuacao", ["jogadores", "duplas", "trancado"])
+
+
+# Percorre os índices dos bits ligados de uma máscara
+def bits(mascara):
+    while mascara:
+        baixo = mascara & -mascara
+        yield baixo.bit_length() - 1
+        mascara ^= baixo
+
+
+# Conjunto das 28 peças: cada peça ocupa um bit, na ordem do idPeca
+class ConjuntoPecas:
+    def __init__(self, pecas):
+        self.pecas = tuple(sorted(pecas, key=lambda p: p.idpeca))
+        self.indice = {p.idpeca: i for i, p in enumerate(self.pecas)}
+        self.todas = (1 << len(self.pecas)) - 1
+
+        # Máscara das peças que têm o valor v em algum dos lados
+        self.por_valor = [0] * 7
+        for i, p in enumerate(self.pecas):
+            self.por_valor[p.ladoa] |= 1 << i
+            self.por_valor[p.ladob] |= 1 << i
+
+    def bit(self, idpeca):
+        return 1 << self.indice[idpeca]
+
+    def mascara(self, idspecas):
+        m = 0
+        for idpeca in idspecas:
+            m |= 1 << self.indice[idpeca]
+        return m
+
+    def listar(self, mascara):
+        return [self.pecas[i] for i in bits(mascara)]
+
+    def pontos(self, mascara):
+        return sum(self.pecas[i].pontospeca for i in bits(mascara))
+
+    def peca(self, idpeca):
+        return self.pecas[self.indice[idpeca]]
+
+    def buscar(self, ladoa, ladob):
+        for p in self.pecas:
+            if (p.ladoa, p.ladob) in ((ladoa, ladob), (ladob, ladoa)):
+                return p
+        return None
+
+
+# Carrega o conjunto de peças do banco
+def carregar_conjunto(session):
+    rows = session.execute(text(
+        "SELECT idpeca, ladoa, ladob, pontospeca FROM peca ORDER BY idpeca"
+    )).fetchall()
+    return ConjuntoPecas(PecaDomino(*r) for r in rows)
+
+
+# As peças não mudam: o conjunto é carregado uma única vez por processo
+_conjunto = None
+
+def obter_conjunto(session):
+    global _conjunto
+    if _conjunto is None:
+        _conjunto = carregar_conjunto(session)
+    return _conjunto
+
+
+# Estado completo de uma partida em memória: mãos como máscaras de bits,
+# extremidades da mesa e vez. As jogadas são validadas aqui e só as
+# jogadas efetivadas vão para o banco.
+class EstadoPartida:
+    def __init__(self, idpartida, conjunto, jogadores, nomes=None, duplas=None, semente=None):
+        self.idpartida = idpartida
+        self.conjunto = conjunto
+        self.jogadores = list(jogadores)        # idusuario na ordem da mesa
+        self.nomes = dict(nomes or {})
+        self.duplas = dict(duplas or {})        # idusuario -> iddupla
+        self.maos = {j: 0 for j in self.jogadores}
+        self.monte = 0
+        self.ext_esq = None
+        self.ext_dir = None
+        self.mesa = []                          # (idpeca, extremidade) na ordem jogada
+        self.vez = 0
+        self.rng = random.Random(semente)
+
+    # ---------- carga ----------
+    @classmethod
+    def carregar(cls, session, idpartida, conjunto=None):
+        conjunto = conjunto or obter_conjunto(session)
+
+        # Assentos e nomes vêm do cache do processo (cache.py)
+        assentos = cache.assentos_partida(session, idpartida)
+        jogadores = [j for j, _ in assentos.jogadores]
+        estado = cls(
+            idpartida, conjunto, jogadores,
+            nomes=cache.nomes(session, jogadores),
+            duplas=dict(assentos.jogadores),
+        )
+
+        for idpeca, idusuario, status in session.execute(text("""
+            SELECT idpeca, idusuario, statuspeca FROM maopartida WHERE idpartida = :p
+        """), {"p": idpartida}):
+            if status == 'em_mao' and idusuario in estado.maos:
+                estado.maos[idusuario] |= conjunto.bit(idpeca)
+            elif status == 'no_monte':
+                estado.monte |= conjunto.bit(idpeca)
+
+        ext = session.execute(text("""
+            SELECT valorextesquerda, valorextdireita FROM partida WHERE idpartida = :p
+        """), {"p": idpartida}).first()
+        if ext:
+            estado.ext_esq, estado.ext_dir = ext
+
+        estado.mesa = [tuple(r) for r in session.execute(text("""
+            SELECT idpecajogada, extremidademesa FROM movimentacao
+            WHERE idpartida = :p AND tipoacao = 'jogada'
+            ORDER BY ordemacao
+        """), {"p": idpartida})]
+        return estado
+
+    # ---------- consultas (operações de bits) ----------
+    def mesa_vazia(self):
+        return self.ext_esq is None and self.ext_dir is None
+
+    def mascara_aberta(self):
+        if self.mesa_vazia():
+            return self.conjunto.todas
+        m = 0
+        if self.ext_esq is not None:
+            m |= self.conjunto.por_valor[self.ext_esq]
+        if self.ext_dir is not None:
+            m |= self.conjunto.por_valor[self.ext_dir]
+        return m
+
+    def mascara_jogaveis(self, idusuario):
+        return self.maos[idusuario] & self.mascara_aberta()
+
+    def jogadas_validas(self, idusuario):
+        return self.conjunto.listar(self.mascara_jogaveis(idusuario))
+
+    def mao(self, idusuario):
+        return self.conjunto.listar(self.maos[idusuario])
+
+    def tem_peca(self, idusuario, idpeca):
+        return bool(self.maos[idusuario] & self.conjunto.bit(idpeca))
+
+    def dono(self, idpeca):
+        b = self.conjunto.bit(idpeca)
+        for j, m in self.maos.items():
+            if m & b:
+                return j
+        return None
+
+    # Extremidades em que a peça encaixa
+    def encaixes(self, peca):
+        if self.mesa_vazia():
+            return ['centro']
+        opcoes = []
+        if self.ext_esq in (peca.ladoa, peca.ladob):
+            opcoes.append('esquerda')
+        if self.ext_dir in (peca.ladoa, peca.ladob):
+            opcoes.append('direita')
+        return opcoes
+
+    def pecas_no_monte(self):
+        return self.monte.bit_count()
+
+    def bateu(self, idusuario):
+        return self.maos[idusuario] == 0
+
+    def quem_bateu(self):
+        for j in self.jogadores:
+            if self.maos[j] == 0:
+                return j
+        return None
+
+    # Trancado: monte vazio e nenhum jogador com peça que encaixe
+    def trancado(self):
+        if self.monte:
+            return False
+        aberta = self.mascara_aberta()
+        return not any(m & aberta for m in self.maos.values())
+
+    def pontos_mao(self, idusuario):
+        return self.conjunto.pontos(self.maos[idusuario])
+
+    # Pontos de todos os jogadores e times e o trancamento, numa passada
+    def pontuacao(self):
+        aberta = self.mascara_aberta()
+        jogadores, duplas, jogaveis = {}, {}, 0
+        for j in self.jogadores:
+            mao = self.maos[j]
+            pontos = jogadores[j] = self.conjunto.pontos(mao)
+            time = self.duplas.get(j)
+            time = -j if time is None else time
+            duplas[time] = duplas.get(time, 0) + pontos
+            jogaveis |= mao & aberta
+        return Pontuacao(jogadores, duplas, not self.monte and not jogaveis)
+
+    # Pontos da partida encerrada por `motivo`, como o gatilho
+    # calcularPontosPartida os grava
+    def pontos_partida(self, motivo, idvencedor=None, iddupla=None):
+        p = self.pontuacao()
+        if motivo == 'bater':
+            if iddupla is not None:
+                return sum(v for j, v in p.jogadores.items() if self.duplas.get(j) != iddupla)
+            return sum(v for j, v in p.jogadores.items() if j != idvencedor)
+        if iddupla is not None:
+            return min((v for d, v in p.duplas.items() if d != iddupla), default=0)
+        return min((v for j, v in p.jogadores.items() if j != idvencedor), default=0)
+
+    # ---------- vez ----------
+    @property
+    def jogador_atual(self):
+        return self.jogadores[self.vez]
+
+    def definir_vez(self, idusuario):
+        self.vez = self.jogadores.index(idusuario)
+
+    def proximo_jogador(self, idusuario=None):
+        pos = self.vez if idusuario is None else self.jogadores.index(idusuario)
+        return self.jogadores[(pos + 1) % len(self.jogadores)]
+
+    def avancar_vez(self):
+        self.vez = (self.vez + 1) % len(self.jogadores)
+        return self.jogador_atual
+
+    # ---------- jogadas ----------
+    # Coloca a peça na mesa; retorna (valor da extremidade usada, novo valor)
+    def jogar(self, idusuario, idpeca, extremidade):
+        b = self.conjunto.bit(idpeca)
+        if not self.maos[idusuario] & b:
+            raise ValueError(f"Peça {idpeca} não está na mão do jogador {idusuario}")
+        peca = self.conjunto.peca(idpeca)
+
+        if self.mesa_vazia():
+            extremidade = 'centro'
+            valor, novo_esq, novo_dir = peca.ladoa, peca.ladoa, peca.ladob
+        elif extremidade == 'centro':
+            raise ValueError("Só a primeira peça vai ao centro da mesa")
+        elif extremidade == 'esquerda':
+            valor = self.ext_esq
+            if valor not in (peca.ladoa, peca.ladob):
+                raise ValueError(f"Peça [{peca.ladoa}-{peca.ladob}] não encaixa em {valor}")
+            novo_esq = peca.ladob if peca.ladoa == valor else peca.ladoa
+            novo_dir = self.ext_dir
+        elif extremidade == 'direita':
+            valor = self.ext_dir
+            if valor not in (peca.ladoa, peca.ladob):
+                raise ValueError(f"Peça [{peca.ladoa}-{peca.ladob}] não encaixa em {valor}")
+            novo_esq = self.ext_esq
+            novo_dir = peca.ladob if peca.ladoa == valor else peca.ladoa
+        else:
+            raise ValueError(f"Extremidade inválida: {extremidade}")
+
+        self.maos[idusuario] &= ~b
+        self.ext_esq, self.ext_dir = novo_esq, novo_dir
+        self.mesa.append((idpeca, extremidade))
+        return valor, (novo_dir if extremidade == 'direita' else novo_esq)
+
+    # Passa uma peça do monte para a mão; sem idpeca, sorteia uma do monte
+    def comprar(self, idusuario, idpeca=None):
+        if not self.monte:
+            return None
+        if idpeca is None:
+            idx = self.rng.choice(list(bits(self.monte)))
+            b = 1 << idx
+            idpeca = self.conjunto.pecas[idx].idpeca
+        else:
+            b = self.conjunto.bit(idpeca)
+            if not self.monte & b:
+                raise ValueError(f"Peça {idpeca} não está no monte")
+        self.monte &= ~b
+        self.maos[idusuario] |= b
+        return idpeca
+
+# Verifica se a partida terminou depois da jogada de `jogador_anterior`.
+# Retorna (motivo, idvencedor, idduplavencedora) ou None. Trancada, vence
+# quem tem menos pontos na mão; com 4 jogadores, a dupla com menos pontos.
+def verificar_fim_partida(estado, jogador_anterior):
+    if jogador_anterior is not None and estado.bateu(jogador_anterior):
+        return 'bater', jogador_anterior, None
+    pontuacao = estado.pontuacao()
+    if not pontuacao.trancado:
+        return None
+    if len(estado.jogadores) <= 3:
+        return 'trancado', min(estado.jogadores, key=pontuacao.jogadores.get), None
+    return 'trancado', None, min(pontuacao.duplas, key=pontuacao.duplas.get)
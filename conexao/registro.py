@@ -0,0 +1,382 @@
+import sys
+import time
+import struct
+import argparse
+from array import array
+from collections import namedtuple, Counter
+from sqlalchemy import text, bindparam
+
+from conexao import session
+from motor import EstadoPartida, obter_conjunto, verificar_fim_partida
+
+# Registro binário compacto de uma partida: a distribuição inicial e a
+# sequência de Movimentacao, em 2 bytes por movimento. Serve para retomar
+# uma partida interrompida, reproduzi-la para auditoria e conferir em
+# massa os resultados gravados em Partida.
+#
+# Formato (little-endian):
+#   cabeçalho   "CPVR", versão (1 byte), idpartida (4), jogadores (1: bits
+#               0-3; bits 4-7, assento que abriu + 1 ou 0 = quem tem o 6-6),
+#               peças (1)
+#   jogadores   por assento: idusuario (4), iddupla (4, 0 = sem dupla)
+#   distribuição um nibble por peça, na ordem do idPeca: assento ou 0xF (monte)
+#   movimentos  2 bytes cada: peça (bits 0-4, 31 = nenhuma), extremidade
+#               (5-6), assento (7-8), tipo (9-10)
+# Num arquivo, cada registro vem precedido do seu tamanho (4 bytes).
+#
+# Uso: python registro.py exportar arquivo.bin [idpartida ...]
+#      python registro.py reproduzir idpartida
+#      python registro.py verificar [--arquivo arquivo.bin] [--lote 1000]
+
+MAGICA = b"CPVR"
+VERSAO = 1
+CABECALHO = struct.Struct("<4sBIBB")
+JOGADOR = struct.Struct("<II")
+TAMANHO = struct.Struct("<I")
+
+MONTE = 0xF
+SEM_PECA = 31
+TIPOS = ('jogada', 'comprou', 'passou')
+EXTREMIDADES = (None, 'centro', 'esquerda', 'direita')
+
+# (tipo, assento, índice da peça ou None, extremidade)
+Movimento = namedtuple("Movimento", ["tipo", "assento", "peca", "extremidade"])
+
+# jogadores: [(idusuario, iddupla), ...] na ordem da mesa; distribuicao:
+# assento (ou None, monte) por índice de peça; abertura: assento que abre a
+# partida (Partida.idJogadorIniciou, nas mãos de uma série) ou None, quando
+# abre quem recebeu o 6-6
+Registro = namedtuple("Registro", ["idpartida", "jogadores", "distribuicao", "movimentos", "abertura"],
+                      defaults=[None])
+
+
+# Tabela de decodificação: um Movimento pronto para cada código de 11 bits
+def _tabela():
+    tabela = [None] * (1 << 11)
+    for codigo in range(1 << 11):
+        tipo = codigo >> 9
+        if tipo < len(TIPOS):
+            peca = codigo & 0x1F
+            tabela[codigo] = Movimento(TIPOS[tipo], (codigo >> 7) & 3,
+                                       None if peca == SEM_PECA else peca,
+                                       EXTREMIDADES[(codigo >> 5) & 3])
+    return tabela
+
+_DECODIFICAR = _tabela()
+_CODIGO_TIPO = {t: i for i, t in enumerate(TIPOS)}
+_CODIGO_EXTREMIDADE = {e: i for i, e in enumerate(EXTREMIDADES)}
+
+
+# ---------- codificação ----------
+def codificar(registro):
+    n, pecas = len(registro.jogadores), len(registro.distribuicao)
+    if not 1 <= n <= 4 or pecas >= SEM_PECA:
+        raise ValueError(f"Partida {registro.idpartida}: {n} jogadores e {pecas} peças não cabem no formato")
+
+    abertura = 0 if registro.abertura is None else registro.abertura + 1
+    dados = bytearray(CABECALHO.pack(MAGICA, VERSAO, registro.idpartida, n | abertura << 4, pecas))
+    for idusuario, iddupla in registro.jogadores:
+        dados += JOGADOR.pack(idusuario, iddupla or 0)
+
+    nibbles = [MONTE if a is None else a for a in registro.distribuicao]
+    if pecas % 2:
+        nibbles.append(MONTE)
+    dados += bytes(nibbles[i] | nibbles[i + 1] << 4 for i in range(0, len(nibbles), 2))
+
+    codigos = array('H', (
+        _CODIGO_TIPO[m.tipo] << 9 | m.assento << 7
+        | _CODIGO_EXTREMIDADE[m.extremidade] << 5
+        | (SEM_PECA if m.peca is None else m.peca)
+        for m in registro.movimentos
+    ))
+    if sys.byteorder == 'big':
+        codigos.byteswap()
+    return bytes(dados + codigos.tobytes())
+
+
+def decodificar(dados):
+    magica, versao, idpartida, n, pecas = CABECALHO.unpack_from(dados)
+    if magica != MAGICA or versao != VERSAO:
+        raise ValueError("Registro de partida inválido ou de versão desconhecida")
+    n, abertura = n & 0xF, (n >> 4) - 1
+    pos = CABECALHO.size
+    jogadores = []
+    for _ in range(n):
+        idusuario, iddupla = JOGADOR.unpack_from(dados, pos)
+        jogadores.append((idusuario, iddupla or None))
+        pos += JOGADOR.size
+
+    distribuicao = []
+    for byte in dados[pos:pos + (pecas + 1) // 2]:
+        distribuicao += (byte & 0xF, byte >> 4)
+    distribuicao = [None if a == MONTE else a for a in distribuicao[:pecas]]
+    pos += (pecas + 1) // 2
+
+    codigos = array('H', dados[pos:])
+    if sys.byteorder == 'big':
+        codigos.byteswap()
+    movimentos = [_DECODIFICAR[c] for c in codigos]
+    if None in movimentos:
+        raise ValueError(f"Partida {idpartida}: movimento com tipo desconhecido")
+    return Registro(idpartida, jogadores, distribuicao, movimentos, None if abertura < 0 else abertura)
+
+
+# ---------- arquivo ----------
+def gravar_arquivo(caminho, registros):
+    total = 0
+    with open(caminho, "wb") as f:
+        for registro in registros:
+            dados = codificar(registro)
+            f.write(TAMANHO.pack(len(dados)))
+            f.write(dados)
+            total += 1
+    return total
+
+
+def ler_arquivo(caminho):
+    with open(caminho, "rb") as f:
+        dados = f.read()
+    pos = 0
+    while pos < len(dados):
+        (tamanho,) = TAMANHO.unpack_from(dados, pos)
+        pos += TAMANHO.size
+        yield decodificar(dados[pos:pos + tamanho])
+        pos += tamanho
+
+
+# ---------- carga do banco ----------
+# Monta os registros de várias partidas: as arquivadas (arquivo.py) vêm
+# prontas de PartidaArquivada; as demais são montadas em três consultas.
+# A distribuição inicial é deduzida do estado atual: peça comprada veio do
+# monte, peça jogada sem ter sido comprada era de quem a jogou, o resto
+# está onde MaoPartida diz. Partidas sem peças distribuídas ficam de fora.
+def carregar_registros(session, idspartidas, conjunto=None):
+    idspartidas = list(idspartidas)
+    if not idspartidas:
+        return {}
+    conjunto = conjunto or obter_conjunto(session)
+
+    arquivados = {p: decodificar(bytes(dados)) for p, dados in session.execute(text(
+        "SELECT idpartida, registro FROM partidaarquivada WHERE idpartida IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)), {"ids": idspartidas})}
+    ativas = [p for p in idspartidas if p not in arquivados]
+    if not ativas:
+        return arquivados
+
+    def consulta(sql):
+        return session.execute(text(sql).bindparams(bindparam("ids", expanding=True)),
+                               {"ids": ativas})
+
+    jogadores, assentos, aberturas = {}, {}, {}
+    for idpartida, idusuario, iddupla, iniciou in consulta("""
+        SELECT PU.idpartida, PU.idusuario, PU.iddupla, P.idjogadoriniciou
+        FROM partidausuario PU
+        JOIN partida P ON P.idpartida = PU.idpartida
+        WHERE PU.idpartida IN :ids ORDER BY PU.idpartida, PU.posicaomesa
+    """):
+        assentos.setdefault(idpartida, {})[idusuario] = len(jogadores.setdefault(idpartida, []))
+        jogadores[idpartida].append((idusuario, iddupla))
+        if idusuario == iniciou:
+            aberturas[idpartida] = assentos[idpartida][idusuario]
+
+    distribuicoes = {}
+    for idpartida, idpeca, idusuario, status in consulta("""
+        SELECT idpartida, idpeca, idusuario, statuspeca FROM maopartida WHERE idpartida IN :ids
+    """):
+        d = distribuicoes.setdefault(idpartida, [None] * len(conjunto.pecas))
+        if status == 'em_mao':
+            d[conjunto.indice[idpeca]] = assentos[idpartida][idusuario]
+
+    movimentos = {}
+    for idpartida, idusuario, tipo, idpeca, extremidade in consulta("""
+        SELECT idpartida, idusuario, tipoacao, idpecajogada, extremidademesa FROM movimentacao
+        WHERE idpartida IN :ids ORDER BY idpartida, ordemacao
+    """):
+        if idpartida not in distribuicoes:
+            continue
+        assento = assentos[idpartida][idusuario]
+        peca = None if idpeca is None else conjunto.indice[idpeca]
+        lista, compradas = movimentos.setdefault(idpartida, ([], set()))
+        if tipo == 'comprou':
+            distribuicoes[idpartida][peca] = None
+            compradas.add(peca)
+        elif tipo == 'jogada' and peca not in compradas:
+            distribuicoes[idpartida][peca] = assento
+        lista.append(Movimento(tipo, assento, peca, extremidade if tipo == 'jogada' else None))
+
+    registros = {p: Registro(p, jogadores[p], distribuicoes[p], movimentos.get(p, ([],))[0], aberturas.get(p))
+                 for p in ativas if p in distribuicoes}
+    registros.update(arquivados)
+    return registros
+
+
+def carregar_registro(session, idpartida, conjunto=None):
+    return carregar_registros(session, [idpartida], conjunto).get(idpartida)
+
+
+# ---------- reprodução ----------
+# Reaplica o registro num EstadoPartida novo, conferindo as regras: a vez
+# gira pela mesa (começando pela abertura do registro ou, sem ela, por quem
+# recebeu o 6-6), as peças saem da mão
+# ou do monte certos e ninguém joga depois de alguém bater. `passo` é
+# chamado após cada movimento. Retorna (estado, jogador que fez o último
+# movimento ou None); um registro inconsistente levanta ValueError.
+def reproduzir(registro, conjunto, nomes=None, passo=None):
+    jogadores = [j for j, _ in registro.jogadores]
+    estado = EstadoPartida(registro.idpartida, conjunto, jogadores, nomes=nomes,
+                           duplas={j: d for j, d in registro.jogadores})
+    for i, assento in enumerate(registro.distribuicao):
+        if assento is None:
+            estado.monte |= 1 << i
+        else:
+            estado.maos[jogadores[assento]] |= 1 << i
+
+    assento = registro.abertura
+    if assento is None:
+        peca_66 = conjunto.buscar(6, 6)
+        dono = estado.dono(peca_66.idpeca) if peca_66 else None
+        assento = None if dono is None else jogadores.index(dono)
+    anterior = None
+    for ordem, m in enumerate(registro.movimentos, 1):
+        if assento is not None and m.assento != assento:
+            raise ValueError(f"Partida {registro.idpartida}, movimento {ordem}: fora da vez")
+        if anterior is not None and estado.bateu(anterior):
+            raise ValueError(f"Partida {registro.idpartida}, movimento {ordem}: após o fim da partida")
+        idusuario = jogadores[m.assento]
+        idpeca = None if m.peca is None else conjunto.pecas[m.peca].idpeca
+        if m.tipo == 'jogada':
+            if (m.extremidade == 'centro') != estado.mesa_vazia():
+                raise ValueError(f"Partida {registro.idpartida}, movimento {ordem}: extremidade inválida")
+            estado.jogar(idusuario, idpeca, m.extremidade)
+        elif m.tipo == 'comprou':
+            estado.comprar(idusuario, idpeca)
+        anterior = idusuario
+        assento = (m.assento + 1) % len(jogadores)
+        estado.vez = assento
+        if passo:
+            passo(ordem, m, estado)
+    return estado, anterior
+
+
+# Pontos que o gatilho calcularPontosPartida deve gravar para o fim dado
+def pontos_esperados(estado, motivo, idvencedor, iddupla):
+    return estado.pontos_partida(motivo, idvencedor, iddupla)
+
+
+# ---------- verificação em massa ----------
+# Reproduz cada registro e compara o fim com o gravado em Partida. Retorna
+# um Counter por situação e a lista de problemas (idpartida, descrição).
+def verificar(session, registros, conjunto):
+    registros = list(registros)
+    gravados = {}
+    for i in range(0, len(registros), 1000):
+        ids = [r.idpartida for r in registros[i:i + 1000]]
+        for r in session.execute(text("""
+            SELECT idpartida, modotermino, idjogadorvencedor, idduplavencedora, pontosdapartida
+            FROM partida WHERE idpartida IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"ids": ids}):
+            gravados[r[0]] = tuple(r[1:])
+
+    situacoes, problemas = Counter(), []
+    for registro in registros:
+        gravado = gravados.get(registro.idpartida)
+        try:
+            estado, anterior = reproduzir(registro, conjunto)
+        except ValueError as e:
+            situacoes["inválido"] += 1
+            problemas.append((registro.idpartida, str(e)))
+            continue
+        fim = verificar_fim_partida(estado, anterior)
+        if gravado is None or gravado[0] is None:
+            situacoes["em andamento" if fim is None else "fim não gravado"] += 1
+            if fim is not None:
+                problemas.append((registro.idpartida, f"terminou por {fim[0]} mas não foi finalizada"))
+            continue
+        if fim is None:
+            situacoes["incompleto"] += 1
+            problemas.append((registro.idpartida, f"gravada como {gravado[0]}, mas a reprodução não terminou"))
+            continue
+        esperado = (*fim, pontos_esperados(estado, *fim))
+        if esperado[:3] != gravado[:3]:
+            situacoes["resultado divergente"] += 1
+            problemas.append((registro.idpartida, f"reprodução {esperado[:3]} | gravado {gravado[:3]}"))
+        elif esperado[3] != gravado[3]:
+            situacoes["pontos divergentes"] += 1
+            problemas.append((registro.idpartida, f"{fim[0]}: pontos esperados {esperado[3]} | gravados {gravado[3]}"))
+        else:
+            situacoes["ok"] += 1
+    return situacoes, problemas
+
+
+def partidas_finalizadas(session):
+    return session.execute(text(
+        "SELECT idpartida FROM partida WHERE datahorafim IS NOT NULL ORDER BY idpartida"
+    )).scalars().all()
+
+
+# Registros das partidas pedidas (ou de todas as finalizadas), em lotes
+def registros_do_banco(session, ids=None, lote=1000, conjunto=None):
+    ids = ids or partidas_finalizadas(session)
+    conjunto = conjunto or obter_conjunto(session)
+    for i in range(0, len(ids), lote):
+        yield from carregar_registros(session, ids[i:i + lote], conjunto).values()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro binário das partidas")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p = comandos.add_parser("exportar", help="grava os registros num arquivo")
+    p.add_argument("arquivo")
+    p.add_argument("ids", nargs="*", type=int, help="partidas (padrão: todas as finalizadas)")
+    p = comandos.add_parser("reproduzir", help="mostra a partida movimento a movimento")
+    p.add_argument("idpartida", type=int)
+    p = comandos.add_parser("verificar", help="confere os resultados gravados em Partida")
+    p.add_argument("--arquivo", help="lê os registros do arquivo em vez do banco")
+    p.add_argument("--lote", type=int, default=1000)
+    args = parser.parse_args()
+
+    conjunto = obter_conjunto(session)
+    if args.comando == "exportar":
+        registros = list(registros_do_banco(session, args.ids, conjunto=conjunto))
+        gravar_arquivo(args.arquivo, registros)
+        movimentos = sum(len(r.movimentos) for r in registros)
+        tamanho = sum(len(codificar(r)) for r in registros)
+        print(f"{len(registros)} partida(s), {movimentos} movimentos, {tamanho} bytes "
+              f"({tamanho / max(len(registros), 1):.0f} bytes por partida).")
+
+    elif args.comando == "reproduzir":
+        registro = carregar_registro(session, args.idpartida, conjunto)
+        if registro is None:
+            sys.exit(f"Partida {args.idpartida} sem peças distribuídas.")
+
+        def mostrar(ordem, m, estado):
+            quem = f"assento {m.assento + 1}"
+            if m.tipo == 'passou':
+                print(f"{ordem:>3}. {quem} passou")
+                return
+            p = conjunto.pecas[m.peca]
+            onde = f" na {m.extremidade}" if m.tipo == 'jogada' else ""
+            print(f"{ordem:>3}. {quem} {m.tipo} [{p.ladoa}-{p.ladob}]{onde} | "
+                  f"mesa {estado.ext_esq}..{estado.ext_dir} | monte {estado.pecas_no_monte()}")
+
+        estado, anterior = reproduzir(registro, conjunto, passo=mostrar)
+        for j in estado.jogadores:
+            print(f"Jogador {j}: {len(estado.mao(j))} peça(s), {estado.pontos_mao(j)} ponto(s)")
+        print(f"Próximo a jogar: {estado.jogador_atual}")
+
+    else:
+        inicio = time.perf_counter()
+        if args.arquivo:
+            registros = list(ler_arquivo(args.arquivo))
+        else:
+            registros = list(registros_do_banco(session, lote=args.lote, conjunto=conjunto))
+        carga = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        situacoes, problemas = verificar(session, registros, conjunto)
+        decorrido = time.perf_counter() - inicio
+        for idpartida, descricao in problemas[:50]:
+            print(f"Partida {idpartida}: {descricao}")
+        print(f"{len(registros)} partida(s) em {carga:.2f} s de carga e {decorrido:.2f} s de reprodução "
+              f"({len(registros) / max(decorrido, 1e-9):.0f} partidas/s): "
+              + ", ".join(f"{s} {n}" for s, n in situacoes.most_common()))
+        sys.exit(1 if len(problemas) else 0)
@@ -0,0 +1,34 @@
+import sys
+from sqlalchemy import text
+from conexao import session
+
+# Histórico a partir da tabela ResumoPartida, gravada por finalizar_partida;
+# as páginas do histórico são as de listagens.paginas_historico.
+#
+# Uso: python resumos.py preencher [tamanho_do_lote]
+
+
+# Grava o resumo da partida na transação corrente (sem commit)
+def gravar_resumo(idpartida, total_movimentacoes=None):
+    session.execute(text("SELECT GravarResumoPartida(:p, :total)"),
+                    {"p": idpartida, "total": total_movimentacoes})
+
+
+# Cria os resumos das partidas finalizadas que ainda não têm, em lotes
+# com commit próprio; retorna o total preenchido
+def preencher(lote=1000):
+    total = 0
+    while True:
+        feitos = session.execute(text("SELECT PreencherResumos(:lote)"), {"lote": lote}).scalar()
+        session.commit()
+        total += feitos
+        if feitos < lote:
+            return total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "preencher":
+        print("Uso: python resumos.py preencher [tamanho_do_lote]")
+        sys.exit(2)
+    lote = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    print(f"{preencher(lote)} resumo(s) preenchido(s).")
@@ -0,0 +1,303 @@
+import random
+import argparse
+from sqlalchemy import text, insert
+
+from conexao import session, banco_embutido, Serie, PartidaUsuario
+from motor import EstadoPartida, obter_conjunto
+from diario import DiarioMovimentos
+from distribuicao import distribuir_partidas
+from registro import carregar_registro
+from resumos import gravar_resumo
+from bot import Bot
+import cache
+import main
+
+# Séries: mãos (partidas) seguidas até um time chegar à pontuação alvo,
+# com os mesmos assentos e duplas. Assentos, duplas, nomes e placar ficam
+# em memória durante a série inteira; a cada mão o banco recebe só a nova
+# partida com os assentos já conhecidos (um comando), a distribuição e, ao
+# fim, o resultado da mão com o placar das duplas (um comando, na mesma
+# transação dos movimentos pendentes). As duplas são criadas na primeira
+# mão e Dupla.pontuacaoTotal acumula os pontos de todas as mãos.
+#
+# A primeira mão começa pelo 6-6, como uma partida avulsa; nas seguintes a
+# abertura gira pela mesa (o assento seguinte ao de quem abriu a anterior)
+# e quem abre joga a peça que quiser. Quem abriu cada mão fica em
+# Partida.idJogadorIniciou, que registro.py usa para conferir a vez.
+#
+# Uso: python serie.py nova idusuario,idusuario[,...] [--alvo 100] [--computador ids] [--semente N]
+#      python serie.py continuar idserie [--computador ids]
+
+ALVO_PADRAO = 100
+
+
+# Time de um jogador no placar: a dupla, ou o próprio jogador (-idusuario)
+# quando joga sozinho, como em EstadoPartida.pontuacao()
+def time_de(duplas, idusuario):
+    iddupla = duplas.get(idusuario)
+    return -idusuario if iddupla is None else iddupla
+
+
+# Uma série em andamento, com tudo o que não muda entre as mãos
+class SerieEmJogo:
+    def __init__(self, idserie, alvo, jogadores, duplas, nomes, nomes_duplas, rng=None):
+        self.idserie = idserie
+        self.alvo = alvo
+        self.jogadores = list(jogadores)        # idusuario na ordem da mesa
+        self.duplas = dict(duplas)              # idusuario -> iddupla ou None
+        self.nomes = dict(nomes)
+        self.nomes_duplas = dict(nomes_duplas)  # iddupla -> nome
+        self.placar = {time_de(self.duplas, j): 0 for j in self.jogadores}
+        self.maos = 0                           # mãos finalizadas
+        self.abertura = None                    # quem abriu a última mão
+        self.vencedor = None                    # time que chegou ao alvo
+        self.rng = rng or random.Random()
+        self.conjunto = obter_conjunto(session)
+
+    # Cria a série e a sua primeira mão (com as duplas); retorna
+    # (SerieEmJogo, idpartida da primeira mão)
+    @classmethod
+    def criar(cls, ids, alvo=ALVO_PADRAO, nomes_duplas=None, semente=None):
+        registro = Serie(pontosalvo=alvo)
+        session.add(registro)
+        session.flush()
+        idpartida = main.criar_partida(ids, nomes_duplas, idserie=registro.idserie)
+
+        # criar_partida já deixou os assentos e os nomes no cache
+        assentos = cache.assentos_partida(session, idpartida)
+        serie = cls(registro.idserie, alvo, ids, dict(assentos.jogadores),
+                    cache.nomes(session, ids), assentos.duplas, random.Random(semente))
+        return serie, idpartida
+
+    # Recarrega uma série interrompida; retorna (SerieEmJogo, idpartida da
+    # mão em andamento ou None)
+    @classmethod
+    def carregar(cls, idserie, semente=None):
+        alvo = session.execute(text(
+            "SELECT pontosalvo FROM serie WHERE idserie = :s"
+        ), {"s": idserie}).scalar()
+        if alvo is None:
+            raise ValueError(f"Série {idserie} não encontrada")
+        maos = session.execute(text("""
+            SELECT idpartida, datahorafim, idjogadoriniciou, idjogadorvencedor,
+                   idduplavencedora, pontosdapartida
+            FROM partida WHERE idserie = :s ORDER BY idpartida
+        """), {"s": idserie}).fetchall()
+
+        assentos = cache.assentos_partida(session, maos[-1].idpartida)
+        jogadores = [j for j, _ in assentos.jogadores]
+        serie = cls(idserie, alvo, jogadores, dict(assentos.jogadores),
+                    cache.nomes(session, jogadores), assentos.duplas, random.Random(semente))
+        andamento = None
+        for m in maos:
+            if m.datahorafim is None:
+                andamento = m.idpartida
+                continue
+            vencedor = m.idduplavencedora or time_de(serie.duplas, m.idjogadorvencedor)
+            serie.placar[vencedor] += m.pontosdapartida
+            serie.maos += 1
+            serie.abertura = m.idjogadoriniciou
+            if serie.placar[vencedor] >= alvo:
+                serie.vencedor = vencedor
+        return serie, andamento
+
+    # ---------- mãos ----------
+    # Próximo a abrir: o assento seguinte ao de quem abriu a mão anterior
+    def proxima_abertura(self):
+        if self.abertura is None:
+            return None
+        return self.jogadores[(self.jogadores.index(self.abertura) + 1) % len(self.jogadores)]
+
+    # Grava a próxima mão (partida e assentos) num único comando, com os
+    # assentos em memória (dois no banco embutido); retorna o idpartida
+    def nova_partida(self, abertura):
+        if banco_embutido():
+            idpartida = session.execute(text(
+                "INSERT INTO partida (idserie, idjogadoriniciou) VALUES (:s, :a) RETURNING idpartida"
+            ), {"s": self.idserie, "a": abertura}).scalar()
+            session.execute(insert(PartidaUsuario.__table__).values([
+                {"idpartida": idpartida, "idusuario": j, "iddupla": self.duplas.get(j), "posicaomesa": i}
+                for i, j in enumerate(self.jogadores, 1)]))
+        else:
+            idpartida = self._nova_partida_postgres(abertura)
+        cache.definir_apos_commit(session, cache.assentos, idpartida, cache.Assentos(
+            [(j, self.duplas.get(j)) for j in self.jogadores], self.nomes_duplas))
+        session.commit()
+        return idpartida
+
+    def _nova_partida_postgres(self, abertura):
+        return session.execute(text("""
+            WITH P AS (
+                INSERT INTO partida (idserie, idjogadoriniciou) VALUES (:s, :a)
+                RETURNING idpartida
+            )
+            INSERT INTO partidausuario (idpartida, idusuario, iddupla, posicaomesa)
+            SELECT P.idpartida, A.idusuario, A.iddupla, A.posicao
+            FROM P, unnest(CAST(:usuarios AS INT[]), CAST(:duplas AS INT[]))
+                    WITH ORDINALITY AS A(idusuario, iddupla, posicao)
+            ORDER BY A.idusuario   -- ver main.criar_partida
+            RETURNING idpartida
+        """), {"s": self.idserie, "a": abertura, "usuarios": self.jogadores,
+               "duplas": [self.duplas.get(j) for j in self.jogadores]}).scalars().first()
+
+    # Distribui as peças da mão e monta o seu estado em memória, sem reler
+    # a partida
+    def distribuir(self, idpartida):
+        linhas = distribuir_partidas(session, {idpartida: self.jogadores}, rng=self.rng)[idpartida]
+        estado = EstadoPartida(idpartida, self.conjunto, self.jogadores,
+                               nomes=self.nomes, duplas=self.duplas)
+        for linha in linhas:
+            b = self.conjunto.bit(linha["idpeca"])
+            if linha["statuspeca"] == 'em_mao':
+                estado.maos[linha["idusuario"]] |= b
+            else:
+                estado.monte |= b
+        estado.rng = self.rng
+        return estado
+
+    # Grava o fim da mão: movimentos pendentes, resultado da partida (os
+    # pontos vêm do gatilho calcularPontosPartida), quem abriu e o placar da
+    # dupla vencedora, numa única transação; o fim da série entra na mesma
+    # transação. Retorna os pontos da mão.
+    def encerrar_mao(self, estado, diario, motivo, idvencedor, iddupla, abertura):
+        vencedor = iddupla or time_de(self.duplas, idvencedor)
+        try:
+            diario.descarregar(commit=False)
+            params = {"p": estado.idpartida, "motivo": motivo, "abertura": abertura,
+                      "idvencedor": idvencedor if iddupla is None else None, "iddupla": iddupla,
+                      "vencedora": vencedor if vencedor > 0 else None}
+            if banco_embutido():
+                pontos = self._encerrar_partida_embutido(params)
+            else:
+                pontos = session.execute(text("""
+                    WITH F AS (
+                        UPDATE partida SET
+                            datahorafim = CURRENT_TIMESTAMP,
+                            modotermino = :motivo,
+                            idjogadorvencedor = :idvencedor,
+                            idduplavencedora = :iddupla,
+                            idjogadoriniciou = :abertura
+                        WHERE idpartida = :p
+                        RETURNING pontosdapartida
+                    ), D AS (
+                        UPDATE dupla SET pontuacaototal = pontuacaototal + F.pontosdapartida
+                        FROM F WHERE iddupla = :vencedora
+                    )
+                    SELECT pontosdapartida FROM F
+                """), params).scalar()
+            gravar_resumo(estado.idpartida, diario.ordem)
+
+            total = self.placar[vencedor] + pontos
+            if total >= self.alvo:
+                session.execute(text("""
+                    UPDATE serie SET datahorafim = CURRENT_TIMESTAMP,
+                        idjogadorvencedor = :idvencedor, idduplavencedora = :iddupla
+                    WHERE idserie = :s
+                """), {"s": self.idserie, "idvencedor": -vencedor if vencedor < 0 else None,
+                       "iddupla": vencedor if vencedor > 0 else None})
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        self.placar[vencedor] = total
+        self.maos += 1
+        self.abertura = abertura
+        if total >= self.alvo:
+            self.vencedor = vencedor
+        return pontos
+
+    # No banco embutido o gatilho roda depois do UPDATE (o RETURNING não vê
+    # os pontos): o fim da partida e o placar da dupla em comandos separados
+    def _encerrar_partida_embutido(self, params):
+        session.execute(text("""
+            UPDATE partida SET
+                datahorafim = CURRENT_TIMESTAMP,
+                modotermino = :motivo,
+                idjogadorvencedor = :idvencedor,
+                idduplavencedora = :iddupla,
+                idjogadoriniciou = :abertura
+            WHERE idpartida = :p
+        """), params)
+        pontos = session.execute(text(
+            "SELECT pontosdapartida FROM partida WHERE idpartida = :p"
+        ), params).scalar()
+        session.execute(text(
+            "UPDATE dupla SET pontuacaototal = pontuacaototal + :pontos WHERE iddupla = :vencedora"
+        ), {**params, "pontos": pontos})
+        return pontos
+
+    # Joga uma mão inteira; `idpartida` retoma uma mão já criada
+    def jogar_mao(self, computador=(), bot=None, idpartida=None):
+        registro = carregar_registro(session, idpartida, self.conjunto) if idpartida else None
+        if registro is not None and registro.movimentos:
+            estado, jogador_anterior = main.retomar_partida(registro)
+            diario = DiarioMovimentos(session, idpartida, ultima_ordem=len(registro.movimentos))
+            abertura = estado.jogadores[registro.movimentos[0].assento]
+            jogador_atual = estado.jogador_atual
+            print(f"\n=== RETOMANDO MÃO {self.maos + 1} (partida {idpartida}) ===")
+        else:
+            abertura = self.proxima_abertura()
+            if idpartida is None:
+                idpartida = self.nova_partida(abertura)
+            elif abertura is not None:
+                session.execute(text("UPDATE partida SET idjogadoriniciou = :a WHERE idpartida = :p"),
+                                {"a": abertura, "p": idpartida})
+            print(f"\n=== MÃO {self.maos + 1} DA SÉRIE {self.idserie} (partida {idpartida}) ===")
+            estado = self.distribuir(idpartida)
+            diario = DiarioMovimentos(session, idpartida, ultima_ordem=0)
+            jogador_atual, jogador_anterior = main.abrir_partida(estado, diario, computador, abertura)
+            # Na primeira mão abre quem jogou o 6-6 (ou o sorteado)
+            abertura = abertura or jogador_anterior or jogador_atual
+
+        motivo, idvencedor, iddupla = main.conduzir_partida(
+            estado, diario, jogador_atual, jogador_anterior, computador, bot)
+        pontos = self.encerrar_mao(estado, diario, motivo, idvencedor, iddupla, abertura)
+        print(f"\nMão {self.maos}: {motivo}, {pontos} ponto(s) para {self.nome_time(iddupla or time_de(self.duplas, idvencedor))}")
+        return pontos
+
+    # Joga mãos até um time chegar ao alvo; `andamento` é a mão interrompida
+    def jogar(self, computador=(), semente=None, andamento=None):
+        bot = Bot(self.conjunto, semente=semente) if computador else None
+        while self.vencedor is None:
+            self.jogar_mao(computador, bot, andamento)
+            andamento = None
+            print(self.resumo_placar())
+        print(f"\n=== SÉRIE {self.idserie} FINALIZADA: {self.nome_time(self.vencedor)} "
+              f"venceu com {self.placar[self.vencedor]} ponto(s) em {self.maos} mão(s) ===")
+        return self.vencedor
+
+    # ---------- placar ----------
+    def nome_time(self, t):
+        return self.nomes.get(-t) if t < 0 else self.nomes_duplas.get(t)
+
+    def resumo_placar(self):
+        return (f"Placar (até {self.alvo}): "
+                + " | ".join(f"{self.nome_time(t)} {p}" for t, p in self.placar.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Série de mãos até uma pontuação alvo")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p = comandos.add_parser("nova", help="cria e joga uma série")
+    p.add_argument("jogadores", help="IDs na ordem da mesa, separados por vírgula")
+    p.add_argument("--alvo", type=int, default=ALVO_PADRAO)
+    p = comandos.add_parser("continuar", help="retoma uma série interrompida")
+    p.add_argument("idserie", type=int)
+    for p in comandos.choices.values():
+        p.add_argument("--computador", default="", help="IDs jogados pelo computador")
+        p.add_argument("--semente", type=int)
+    args = parser.parse_args()
+
+    computador = {int(x) for x in args.computador.split(",") if x.strip()}
+    if args.comando == "nova":
+        serie, andamento = SerieEmJogo.criar([int(x) for x in args.jogadores.split(",")],
+                                             args.alvo, semente=args.semente)
+    else:
+        serie, andamento = SerieEmJogo.carregar(args.idserie, args.semente)
+    print(f"Série {serie.idserie}")
+    if serie.vencedor is None:
+        serie.jogar(computador, args.semente, andamento)
+    else:
+        print(f"Série já finalizada. {serie.resumo_placar()}")
+    session.close()
@@ -0,0 +1,386 @@
+import json
+import random
+import asyncio
+import argparse
+from sqlalchemy import text, insert
+
+from conexao import obter_engine_async, MaoPartida, POOL, INSTRUMENTAR
+from motor import EstadoPartida, ConjuntoPecas, PecaDomino, verificar_fim_partida
+from diario import DiarioMovimentos
+from registro import carregar_registro, reproduzir
+from distribuicao import sortear_distribuicao
+from listagens import consulta_ranking
+
+# Servidor asyncio: hospeda muitas partidas em um único loop de eventos,
+# com um pool de conexões assíncrono compartilhado (asyncpg).
+#
+# Protocolo: uma mensagem JSON por linha, via TCP ou socket Unix.
+#   {"op": "criar_jogador", "nome": "Ana"}
+#   {"op": "criar_partida", "jogadores": [1, 2, 3, 4], "duplas": ["A", "B"]}
+#   {"op": "iniciar", "idpartida": 7, "semente": 123}
+#   {"op": "estado", "idpartida": 7, "idusuario": 1}
+#   {"op": "jogar", "idpartida": 7, "idusuario": 1, "idpeca": 12, "extremidade": "esquerda"}
+#   {"op": "comprar", "idpartida": 7, "idusuario": 1}
+#   {"op": "passar", "idpartida": 7, "idusuario": 1}
+#   {"op": "ranking", "limite": 10, "apos": [3, 40, 17]}   ("apos" = "proximo" da página anterior)
+#   {"op": "metricas", "formato": "json" | "prometheus"}   (com CAPIVARA_INSTRUMENTAR)
+# Resposta: {"ok": true, ...} ou {"ok": false, "erro": "..."}
+#
+# Uso: python servidor.py [--host 127.0.0.1] [--porta 7000] [--unix /tmp/capivara.sock]
+
+
+class ErroJogo(Exception):
+    pass
+
+
+# Partida em andamento no servidor
+class Mesa:
+    def __init__(self, estado, diario):
+        self.estado = estado
+        self.diario = diario
+        self.anterior = None
+        self.fim = None
+        self.trava = asyncio.Lock()
+
+    # O que uma ação altera na mesa (estado e pendentes do diário), para
+    # desfazê-la se a gravação falhar
+    def salvar(self):
+        e, d = self.estado, self.diario
+        return (dict(e.maos), e.monte, e.ext_esq, e.ext_dir, len(e.mesa), e.vez, e.rng.getstate(),
+                d.ordem, list(d.movimentos), dict(d.maos), d.extremidades, self.anterior)
+
+    def restaurar(self, copia):
+        e, d = self.estado, self.diario
+        (maos, e.monte, e.ext_esq, e.ext_dir, jogadas, e.vez, rng,
+         d.ordem, d.movimentos, d.maos, d.extremidades, self.anterior) = copia
+        e.maos = maos
+        del e.mesa[jogadas:]
+        e.rng.setstate(rng)
+
+
+class Servidor:
+    def __init__(self, engine):
+        self.engine = engine
+        self.conjunto = None
+        self.mesas = {}
+        self.inicios = {}   # idpartida -> [trava, pedidos que a usam]
+
+    async def carregar_conjunto(self):
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(text(
+                "SELECT idpeca, ladoa, ladob, pontospeca FROM peca ORDER BY idpeca"
+            ))).fetchall()
+        self.conjunto = ConjuntoPecas(PecaDomino(*r) for r in rows)
+
+    # ---------- operações ----------
+    async def op_criar_jogador(self, msg):
+        async with self.engine.begin() as conn:
+            idusuario = (await conn.execute(text(
+                "INSERT INTO usuario (nome) VALUES (:nome) RETURNING idusuario"
+            ), {"nome": msg["nome"]})).scalar()
+        return {"idusuario": idusuario}
+
+    async def op_criar_partida(self, msg):
+        ids = [int(i) for i in msg["jogadores"]]
+        if not 2 <= len(ids) <= 4:
+            raise ErroJogo("A partida deve ter de 2 a 4 jogadores")
+        async with self.engine.begin() as conn:
+            idpartida = (await conn.execute(text(
+                "INSERT INTO partida DEFAULT VALUES RETURNING idpartida"
+            ))).scalar()
+            duplas = []
+            if len(ids) == 4:
+                for nome in msg.get("duplas") or ["Dupla 1", "Dupla 2"]:
+                    duplas.append((await conn.execute(text("""
+                        INSERT INTO dupla (idpartida, nomedupla, pontuacaototal)
+                        VALUES (:p, :nome, 0) RETURNING iddupla
+                    """), {"p": idpartida, "nome": nome})).scalar())
+            # Em ordem de idusuario, como em main.criar_partida
+            assentos = sorted((uid, pos) for pos, uid in enumerate(ids, 1))
+            await conn.execute(text("""
+                INSERT INTO partidausuario (idpartida, idusuario, iddupla, posicaomesa)
+                VALUES (:p, :u, :d, :pos)
+            """), [{"p": idpartida, "u": uid, "d": duplas[(pos - 1) // 2] if duplas else None, "pos": pos}
+                   for uid, pos in assentos])
+        return {"idpartida": idpartida}
+
+    # Distribui as peças e joga a 6-6 de quem a tiver. Uma partida que já
+    # tem movimentos gravados (ex.: após reiniciar o servidor) é retomada
+    # pelo registro, como em main.jogar_partida_interativa; partida
+    # finalizada ou arquivada é recusada.
+    async def op_iniciar(self, msg):
+        # Um início por partida de cada vez: dois pedidos para a mesma
+        # partida não a distribuem duas vezes, e partidas diferentes não
+        # esperam umas pelas outras
+        idpartida = int(msg["idpartida"])
+        inicio = self.inicios.setdefault(idpartida, [asyncio.Lock(), 0])
+        inicio[1] += 1
+        try:
+            async with inicio[0]:
+                return await self._iniciar(idpartida, msg.get("semente"))
+        finally:
+            inicio[1] -= 1
+            if not inicio[1]:
+                del self.inicios[idpartida]
+
+    async def _iniciar(self, idpartida, semente):
+        if idpartida in self.mesas:
+            return self._visao(self.mesas[idpartida], None)
+        rng = random.Random(semente)
+        async with self.engine.begin() as conn:
+            partida = (await conn.execute(text("""
+                SELECT P.datahorafim, P.proximaordemacao,
+                       EXISTS (SELECT 1 FROM partidaarquivada A WHERE A.idpartida = P.idpartida)
+                FROM partida P WHERE P.idpartida = :p FOR UPDATE
+            """), {"p": idpartida})).first()
+            if partida is None:
+                raise ErroJogo(f"Partida {idpartida} não encontrada")
+            datahorafim, proxima, arquivada = partida
+            if datahorafim is not None or arquivada:
+                raise ErroJogo(f"Partida {idpartida} já foi finalizada")
+
+            rows = (await conn.execute(text("""
+                SELECT PU.idusuario, U.nome, PU.iddupla
+                FROM partidausuario PU JOIN usuario U ON U.idusuario = PU.idusuario
+                WHERE PU.idpartida = :p ORDER BY PU.posicaomesa
+            """), {"p": idpartida})).fetchall()
+            if not rows:
+                raise ErroJogo(f"Partida {idpartida} sem jogadores")
+            jogadores = [r[0] for r in rows]
+            nomes = {r[0]: r[1] for r in rows}
+
+            registro = None
+            if proxima > 1:
+                registro = await conn.run_sync(carregar_registro, idpartida, self.conjunto)
+                if registro is None:
+                    raise ErroJogo(f"Partida {idpartida} tem movimentos mas não tem peças distribuídas")
+            else:
+                linhas = sortear_distribuicao(idpartida, self.conjunto, jogadores, rng)
+                await conn.execute(text("DELETE FROM maopartida WHERE idpartida = :p"), {"p": idpartida})
+                await conn.execute(insert(MaoPartida.__table__).values(linhas))
+
+        if registro is not None:
+            try:
+                estado, anterior = reproduzir(registro, self.conjunto, nomes=nomes)
+            except ValueError as e:
+                raise ErroJogo(str(e))
+            estado.rng = rng
+            mesa = Mesa(estado, DiarioMovimentos(None, idpartida, ultima_ordem=len(registro.movimentos)))
+            mesa.anterior = anterior
+            self.mesas[idpartida] = mesa
+            # O último movimento gravado pode ter encerrado a partida
+            fim = verificar_fim_partida(estado, anterior)
+            if fim:
+                async with mesa.trava:
+                    await self._finalizar(mesa, *fim)
+            return self._visao(mesa, None)
+
+        estado = EstadoPartida(idpartida, self.conjunto, jogadores, nomes=nomes,
+                               duplas={r[0]: r[2] for r in rows})
+        estado.rng = rng
+        for linha in linhas:
+            if linha["statuspeca"] == 'em_mao':
+                estado.maos[linha["idusuario"]] |= self.conjunto.bit(linha["idpeca"])
+            else:
+                estado.monte |= self.conjunto.bit(linha["idpeca"])
+
+        mesa = Mesa(estado, DiarioMovimentos(None, idpartida, ultima_ordem=0))
+        self.mesas[idpartida] = mesa
+
+        peca_66 = self.conjunto.buscar(6, 6)
+        dono = estado.dono(peca_66.idpeca)
+        if dono is not None:
+            estado.definir_vez(dono)
+            async with mesa.trava:
+                await self._aplicar(mesa, dono, lambda: self._jogar(mesa, dono, peca_66.idpeca, 'centro'))
+        else:
+            estado.definir_vez(rng.choice(jogadores))
+        return self._visao(mesa, None)
+
+    async def op_estado(self, msg):
+        mesa = self._mesa(msg)
+        return self._visao(mesa, msg.get("idusuario"))
+
+    async def op_jogar(self, msg):
+        mesa, idusuario = self._mesa(msg), int(msg["idusuario"])
+        idpeca, extremidade = int(msg["idpeca"]), msg.get("extremidade", 'centro')
+        async with mesa.trava:
+            await self._aplicar(mesa, idusuario, lambda: self._jogar(mesa, idusuario, idpeca, extremidade))
+        return self._visao(mesa, idusuario)
+
+    async def op_comprar(self, msg):
+        mesa, idusuario = self._mesa(msg), int(msg["idusuario"])
+
+        def comprar():
+            idpeca = mesa.estado.comprar(idusuario)
+            if idpeca is None:
+                raise ErroJogo("Monte vazio")
+            mesa.diario.registrar_compra(idusuario, idpeca)
+
+        async with mesa.trava:
+            await self._aplicar(mesa, idusuario, comprar)
+        return self._visao(mesa, idusuario)
+
+    async def op_passar(self, msg):
+        mesa, idusuario = self._mesa(msg), int(msg["idusuario"])
+        async with mesa.trava:
+            await self._aplicar(mesa, idusuario, lambda: mesa.diario.registrar_passe(idusuario))
+        return self._visao(mesa, idusuario)
+
+    # Página por chave, como listagens.paginas_ranking: `apos` é o
+    # "proximo" devolvido pela página anterior
+    async def op_ranking(self, msg):
+        limite, apos = int(msg.get("limite", 10)), msg.get("apos")
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(*consulta_ranking(apos, limite))).fetchall()
+        return {
+            "ranking": [
+                {"idusuario": r[0], "nome": r[1], "partidas": r[2], "vitorias": int(r[3]),
+                 "percentual": float(r[4]), "pontos": int(r[5])}
+                for r in rows
+            ],
+            "proximo": [rows[-1].partidasvencidas, rows[-1].totalpontosganhos, rows[-1].idusuario]
+                       if len(rows) == limite else None,
+        }
+
+    async def op_metricas(self, msg):
+        if not INSTRUMENTAR:
+            raise ErroJogo("Instrumentação desativada (CAPIVARA_INSTRUMENTAR)")
+        from instrumentacao import instrumentacao
+        if msg.get("formato") == "prometheus":
+            return {"prometheus": instrumentacao.prometheus()}
+        return {"metricas": instrumentacao.instantaneo()}
+
+    # ---------- regras ----------
+    def _mesa(self, msg):
+        mesa = self.mesas.get(int(msg["idpartida"]))
+        if mesa is None:
+            raise ErroJogo("Partida não iniciada neste servidor")
+        return mesa
+
+    def _jogar(self, mesa, idusuario, idpeca, extremidade):
+        estado = mesa.estado
+        try:
+            estado.jogar(idusuario, idpeca, extremidade)
+        except (ValueError, KeyError) as e:
+            raise ErroJogo(str(e))
+        mesa.diario.registrar_jogada(idusuario, idpeca, estado.mesa[-1][1], estado.ext_esq, estado.ext_dir)
+
+    # Aplica a ação na vez do jogador, passa a vez, detecta o fim e grava
+    # o diário quando o modo de durabilidade pede. Se a gravação falhar, a
+    # mesa volta ao que era antes da ação, o mesmo que o banco tem.
+    async def _aplicar(self, mesa, idusuario, acao):
+        estado = mesa.estado
+        if mesa.fim:
+            raise ErroJogo("Partida já finalizada")
+        if estado.jogador_atual != idusuario:
+            raise ErroJogo(f"Não é a vez do jogador {idusuario}")
+
+        copia = mesa.salvar()
+        try:
+            acao()
+            mesa.anterior = idusuario
+            estado.avancar_vez()
+
+            fim = verificar_fim_partida(estado, mesa.anterior)
+            if fim:
+                await self._finalizar(mesa, *fim)
+            elif mesa.diario.precisa_descarregar():
+                async with self.engine.begin() as conn:
+                    await self._descarregar(conn, mesa.diario)
+        except Exception:
+            mesa.restaurar(copia)
+            raise
+
+    async def _descarregar(self, conn, diario):
+        for comando, params in diario.comandos():
+            await conn.execute(comando, params)
+        diario.confirmar()
+
+    async def _finalizar(self, mesa, motivo, idvencedor, iddupla):
+        async with self.engine.begin() as conn:
+            await self._descarregar(conn, mesa.diario)
+            pontos = (await conn.execute(text("""
+                UPDATE partida SET datahorafim = CURRENT_TIMESTAMP, modotermino = :motivo,
+                       idjogadorvencedor = :vencedor, idduplavencedora = :dupla
+                WHERE idpartida = :p RETURNING pontosdapartida
+            """), {"motivo": motivo, "vencedor": idvencedor, "dupla": iddupla,
+                   "p": mesa.estado.idpartida})).scalar()
+            await conn.execute(text("SELECT GravarResumoPartida(:p, :total)"),
+                               {"p": mesa.estado.idpartida, "total": mesa.diario.ordem})
+        mesa.fim = {"motivo": motivo, "idvencedor": idvencedor,
+                    "idduplavencedora": iddupla, "pontos": pontos}
+        self.mesas.pop(mesa.estado.idpartida, None)
+
+    def _visao(self, mesa, idusuario):
+        estado = mesa.estado
+        visao = {
+            "idpartida": estado.idpartida,
+            "extremidades": [estado.ext_esq, estado.ext_dir],
+            "mesa": [[p.ladoa, p.ladob] for p in (estado.conjunto.peca(i) for i, _ in estado.mesa)],
+            "vez": None if mesa.fim else estado.jogador_atual,
+            "monte": estado.pecas_no_monte(),
+            "fim": mesa.fim,
+        }
+        if idusuario is not None and int(idusuario) in estado.maos:
+            idusuario = int(idusuario)
+            visao["mao"] = [[p.idpeca, p.ladoa, p.ladob] for p in estado.mao(idusuario)]
+            visao["jogaveis"] = [[p.idpeca, estado.encaixes(p)] for p in estado.jogadas_validas(idusuario)]
+        return visao
+
+    # ---------- rede ----------
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                resposta = await self.processar(linha)
+                writer.write(json.dumps(resposta, default=str).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def processar(self, linha):
+        try:
+            msg = json.loads(linha)
+            operacao = getattr(self, f"op_{msg.get('op')}", None)
+            if operacao is None:
+                raise ErroJogo(f"Operação desconhecida: {msg.get('op')}")
+            if INSTRUMENTAR:
+                # A pilha dentro do engine assíncrono não chega até aqui;
+                # o rótulo atribui os comandos à operação
+                from instrumentacao import rotulo
+                with rotulo(f"servidor.{operacao.__name__}"):
+                    return {"ok": True, **await operacao(msg)}
+            return {"ok": True, **await operacao(msg)}
+        except (ErroJogo, KeyError, ValueError, TypeError) as e:
+            return {"ok": False, "erro": str(e)}
+        except Exception as e:
+            return {"ok": False, "erro": f"Erro interno: {e}"}
+
+
+async def executar(host, porta, unix):
+    servidor = Servidor(obter_engine_async())
+    await servidor.carregar_conjunto()
+    if unix:
+        srv = await asyncio.start_unix_server(servidor.atender, path=unix)
+        print(f"Servidor ouvindo em {unix}")
+    else:
+        srv = await asyncio.start_server(servidor.atender, host, porta)
+        print(f"Servidor ouvindo em {host}:{porta}")
+    async with srv:
+        await srv.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor asyncio do Capivara Game")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=7000)
+    parser.add_argument("--unix", help="caminho do socket Unix (em vez de TCP)")
+    parser.add_argument("--pool", type=int, default=POOL["pool_size"], help="conexões no pool")
+    args = parser.parse_args()
+    POOL["pool_size"] = args.pool
+    asyncio.run(executar(args.host, args.porta, args.unix))
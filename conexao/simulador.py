@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Simulador Monte Carlo de partidas, sem banco: as regras de
+# distribuir_pecas / jogar_partida_interativa (7 peças por jogador, 6-6
+# abre, compra do monte quando não há jogada, passe com o monte vazio,
+# bater e trancar) e a pontuação dos gatilhos e de
+# motor.verificar_fim_partida, em arrays do NumPy. Milhares de partidas
+# avançam juntas, um turno por passo, e os lotes são divididos entre
+# processos.
+#
+# Uso: python simulador.py [--jogos 1000000] [--jogadores 4] [--politicas gulosa]
+#          [--lote 100000] [--processos N] [--semente 42] [--saida resultado.json]
+#
+# Requer numpy (pip install numpy).
+
+TAMANHO_MAO = 7
+
+# O conjunto de Peca na ordem de database/script.sql: (0,0), (0,1), ..., (6,6)
+LADO_A, LADO_B = np.array([(a, b) for a in range(7) for b in range(a, 7)], dtype=np.int8).T
+PONTOS = (LADO_A + LADO_B).astype(np.int16)
+BUCHA = LADO_A == LADO_B
+PECA_66 = len(LADO_A) - 1
+INDICES = np.arange(len(LADO_A))
+
+# Situação de cada peça em `dono`: o assento do jogador (0..n-1) quando na mão
+NO_MONTE = -1
+JOGADA = -2
+
+
+# ---------- políticas ----------
+# Nota de cada peça jogável (maior vence); as outras recebem -inf
+def nota_primeira(rng, linhas):
+    return np.broadcast_to(-INDICES.astype(np.float64), (linhas, len(INDICES)))
+
+
+def nota_aleatoria(rng, linhas):
+    return rng.random((linhas, len(INDICES)))
+
+
+# Mesma ordem da política "gulosa" do autojogo: pontos, bucha, menor id
+def nota_gulosa(rng, linhas):
+    nota = PONTOS * 4.0 + BUCHA * 2.0 - INDICES / len(INDICES)
+    return np.broadcast_to(nota, (linhas, len(INDICES)))
+
+
+POLITICAS = {"primeira": nota_primeira, "aleatoria": nota_aleatoria, "gulosa": nota_gulosa}
+
+
+def encaixa(esq, dir_):
+    return ((LADO_A == esq[:, None]) | (LADO_B == esq[:, None]) |
+            (LADO_A == dir_[:, None]) | (LADO_B == dir_[:, None]))
+
+
+# ---------- simulação ----------
+# Simula `jogos` partidas com `jogadores` assentos; `politicas` tem uma
+# política por assento. Retorna arrays por partida.
+def simular(jogos, jogadores, politicas, rng):
+    n = jogadores
+    linhas = np.arange(jogos)
+
+    # Distribuição: embaralha as 28 peças e dá 7 a cada assento, na ordem
+    ordem = np.argsort(rng.random((jogos, len(INDICES))), axis=1)
+    assento_da_posicao = np.full(len(INDICES), NO_MONTE, dtype=np.int8)
+    assento_da_posicao[:n * TAMANHO_MAO] = np.arange(n * TAMANHO_MAO) // TAMANHO_MAO
+    dono = np.empty((jogos, len(INDICES)), dtype=np.int8)
+    dono[linhas[:, None], ordem] = assento_da_posicao
+
+    esq = np.full(jogos, -1, dtype=np.int8)
+    dir_ = np.full(jogos, -1, dtype=np.int8)
+    movimentos = np.zeros(jogos, dtype=np.int16)
+
+    # Abertura: quem tem a 6-6 joga no centro; se ela ficou no monte,
+    # começa um assento sorteado com a mesa vazia
+    abridor = dono[:, PECA_66].copy()
+    tem_66 = abridor >= 0
+    dono[tem_66, PECA_66] = JOGADA
+    esq[tem_66] = dir_[tem_66] = 6
+    movimentos[tem_66] = 1
+    vez = np.where(tem_66, (abridor + 1) % n, rng.integers(0, n, jogos)).astype(np.int8)
+    inicial = np.where(tem_66, abridor, vez).astype(np.int8)
+
+    ativa = np.ones(jogos, dtype=bool)
+    vencedor = np.full(jogos, -1, dtype=np.int8)
+    trancado = np.zeros(jogos, dtype=bool)
+    politica_assento = np.array([list(POLITICAS).index(p) for p in politicas], dtype=np.int8)
+
+    while ativa.any():
+        a = np.nonzero(ativa)[0]
+        d, p, e, di = dono[a], vez[a], esq[a], dir_[a]
+        vazia = e < 0
+        cabe = encaixa(e, di) | vazia[:, None]
+        jogaveis = (d == p[:, None]) & cabe
+        pode = jogaveis.any(axis=1)
+
+        # Escolha da peça pela política do assento da vez
+        nota = np.empty(d.shape)
+        politica_vez = politica_assento[p]
+        for k, funcao in enumerate(POLITICAS.values()):
+            m = politica_vez == k
+            if m.any():
+                nota[m] = funcao(rng, int(m.sum()))
+        peca = np.argmax(np.where(jogaveis, nota, -np.inf), axis=1)
+
+        # Jogada: no centro com a mesa vazia; senão na esquerda quando cabe
+        # (a aleatória sorteia quando cabe dos dois lados)
+        j = np.nonzero(pode)[0]
+        pj, la, lb = peca[j], LADO_A[peca[j]], LADO_B[peca[j]]
+        ej, dj = e[j], di[j]
+        cabe_esq = (la == ej) | (lb == ej)
+        cabe_dir = (la == dj) | (lb == dj)
+        sorteio = (politica_vez[j] == list(POLITICAS).index("aleatoria")) & (rng.random(len(j)) < 0.5)
+        na_esq = cabe_esq & ~(cabe_dir & sorteio)
+        centro = vazia[j]
+        novo_esq = np.where(centro, la, np.where(na_esq, np.where(la == ej, lb, la), ej))
+        novo_dir = np.where(centro, lb, np.where(na_esq, dj, np.where(la == dj, lb, la)))
+        d[j, pj] = JOGADA
+        e[j], di[j] = novo_esq, novo_dir
+
+        # Sem jogada: compra uma peça sorteada do monte ou passa
+        c = np.nonzero(~pode)[0]
+        monte = d[c] == NO_MONTE
+        compra = monte.any(axis=1)
+        sorteada = np.argmax(np.where(monte, rng.random(monte.shape), -1.0), axis=1)
+        cc = c[compra]
+        d[cc, sorteada[compra]] = p[cc]
+
+        # Fim: quem jogou bateu? senão, monte vazio e ninguém encaixa
+        bateu = pode & ~(d == p[:, None]).any(axis=1)
+        cabe = encaixa(e, di)
+        trancou = ~bateu & ~(d == NO_MONTE).any(axis=1) & ~((d >= 0) & cabe).any(axis=1)
+
+        dono[a], esq[a], dir_[a] = d, e, di
+        movimentos[a] += 1
+        vencedor[a[bateu]] = p[bateu]
+        trancado[a[trancou]] = True
+        ativa[a[bateu | trancou]] = False
+        vez[a] = (p + 1) % n
+
+    # ---------- pontuação ----------
+    pontos_mao = np.stack([np.where(dono == s, PONTOS, 0).sum(axis=1) for s in range(n)], axis=1)
+    total = pontos_mao.sum(axis=1)
+    dupla = n == 4
+    if dupla:
+        pontos_dupla = np.stack([pontos_mao[:, 0] + pontos_mao[:, 1], pontos_mao[:, 2] + pontos_mao[:, 3]], axis=1)
+
+    # Trancado: menos pontos vence (empate: primeiro na ordem da mesa); a
+    # partida vale a menor soma entre os adversários (em dupla, a da outra dupla)
+    t = np.nonzero(trancado)[0]
+    if dupla:
+        lado = np.argmin(pontos_dupla[t], axis=1)
+        vencedor[t] = lado * 2
+        pontos_trancado = pontos_dupla[t, 1 - lado]
+    else:
+        vencedor[t] = np.argmin(pontos_mao[t], axis=1)
+        outros = pontos_mao[t].astype(np.float64)
+        outros[np.arange(len(t)), vencedor[t]] = np.inf
+        pontos_trancado = outros.min(axis=1)
+
+    # Bateu: a soma das mãos dos outros jogadores, como no gatilho
+    pontos = total.astype(np.int16)
+    pontos[t] = pontos_trancado
+
+    lado_vencedor = vencedor // 2 if dupla else vencedor
+    lado_66 = abridor // 2 if dupla else abridor
+    return {
+        "movimentos": movimentos,
+        "pontos": pontos,
+        "trancado": trancado,
+        "vencedor": vencedor,
+        # 1 se quem tinha a 6-6 (ou a dupla dele) venceu, -1 se a 6-6 ficou no monte
+        "venceu_66": np.where(tem_66, (lado_vencedor == lado_66).astype(np.int8), -1).astype(np.int8),
+        # Posição do vencedor contada a partir de quem abriu (0 = abridor)
+        "posicao_vencedor": ((vencedor - inicial) % n).astype(np.int8),
+    }
+
+
+def simular_lote(jogos, jogadores, politicas, semente):
+    return simular(jogos, jogadores, politicas, np.random.default_rng(semente))
+
+
+def executar(jogos, jogadores, politicas, lote, processos, semente):
+    sementes = np.random.SeedSequence(semente).spawn((jogos + lote - 1) // lote)
+    tamanhos = [min(lote, jogos - i * lote) for i in range(len(sementes))]
+    inicio = time.perf_counter()
+    if processos > 1:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            partes = list(pool.map(simular_lote, tamanhos, [jogadores] * len(tamanhos),
+                                   [politicas] * len(tamanhos), sementes))
+    else:
+        partes = [simular_lote(t, jogadores, politicas, s) for t, s in zip(tamanhos, sementes)]
+    decorrido = time.perf_counter() - inicio
+    dados = {k: np.concatenate([p[k] for p in partes]) for k in partes[0]}
+    return relatorio(dados, jogadores, politicas, decorrido)
+
+
+def distribuicao(valores):
+    q = np.percentile(valores, [50, 95, 99])
+    return {"media": round(float(valores.mean()), 2), "p50": float(q[0]), "p95": float(q[1]),
+            "p99": float(q[2]), "max": int(valores.max())}
+
+
+def relatorio(dados, jogadores, politicas, decorrido):
+    jogos = len(dados["movimentos"])
+    com_66 = dados["venceu_66"] >= 0
+    vencedor = dados["vencedor"]
+    assento = np.arange(jogadores)
+    # Com duplas, os dois assentos da dupla vencedora contam como vitória
+    if jogadores == 4:
+        venceu = (assento[None, :] // 2) == (vencedor[:, None] // 2)
+    else:
+        venceu = assento[None, :] == vencedor[:, None]
+    por_politica = {}
+    for p in sorted(set(politicas)):
+        colunas = [i for i, q in enumerate(politicas) if q == p]
+        por_politica[p] = round(float(venceu[:, colunas].mean()), 4)
+
+    limites = np.arange(0, int(dados["pontos"].max()) + 11, 10)
+    histograma, _ = np.histogram(dados["pontos"], bins=limites)
+    return {
+        "jogos": jogos,
+        "jogadores": jogadores,
+        "politicas": politicas,
+        "segundos": round(decorrido, 3),
+        "jogos_por_segundo": round(jogos / decorrido, 1),
+        "taxa_trancamento": round(float(dados["trancado"].mean()), 4),
+        "taxa_66_distribuida": round(float(com_66.mean()), 4),
+        "vitoria_de_quem_tem_66": round(float(dados["venceu_66"][com_66].mean()), 4) if com_66.any() else None,
+        "vitoria_por_posicao_desde_abridor": [
+            round(float((dados["posicao_vencedor"] == i).mean()), 4) for i in range(jogadores)
+        ],
+        "vitoria_por_assento_politica": por_politica,
+        "movimentos": distribuicao(dados["movimentos"]),
+        "pontos": distribuicao(dados["pontos"]),
+        "histograma_pontos": {f"{a}-{a + 9}": int(n) for a, n in zip(limites[:-1], histograma) if n},
+    }
+
+
+def imprimir(r):
+    print(f"\n=== Simulação: {r['jogos']} partidas, {r['jogadores']} jogadores, "
+          f"políticas {','.join(r['politicas'])} ===")
+    print(f"Tempo: {r['segundos']:.2f} s ({r['jogos_por_segundo']:.0f} partidas/s)")
+    print(f"Trancamento: {r['taxa_trancamento']:.1%}")
+    if r["vitoria_de_quem_tem_66"] is not None:
+        print(f"6-6 distribuída em {r['taxa_66_distribuida']:.1%}; quem a tem vence {r['vitoria_de_quem_tem_66']:.1%}")
+    print("Vitória por posição a partir de quem abre: " +
+          ", ".join(f"{i}: {v:.1%}" for i, v in enumerate(r["vitoria_por_posicao_desde_abridor"])))
+    for p, v in r["vitoria_por_assento_politica"].items():
+        print(f"Vitórias por assento, {p}: {v:.1%}")
+    for nome in ("movimentos", "pontos"):
+        d = r[nome]
+        print(f"{nome.capitalize()}: média {d['media']} | p50 {d['p50']:.0f} | p95 {d['p95']:.0f} "
+              f"| p99 {d['p99']:.0f} | máx {d['max']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulação Monte Carlo de partidas (NumPy, sem banco)")
+    parser.add_argument("--jogos", type=int, default=1_000_000)
+    parser.add_argument("--jogadores", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--politicas", default="gulosa",
+                        help=f"políticas por assento, separadas por vírgula e repetidas pela mesa ({', '.join(POLITICAS)})")
+    parser.add_argument("--lote", type=int, default=100_000, help="partidas por lote (memória ~ lote x 28 bytes por array)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="grava o relatório em JSON")
+    args = parser.parse_args()
+
+    nomes = args.politicas.split(",")
+    desconhecidas = [p for p in nomes if p not in POLITICAS]
+    if desconhecidas:
+        parser.error(f"política desconhecida: {', '.join(desconhecidas)}")
+    politicas = [nomes[i % len(nomes)] for i in range(args.jogadores)]
+    # Com 4 jogadores, cada política ocupa os dois assentos de uma dupla
+    if args.jogadores == 4 and len(nomes) == 2:
+        politicas = [nomes[0], nomes[0], nomes[1], nomes[1]]
+
+    resultado = executar(args.jogos, args.jogadores, politicas, args.lote, args.processos, args.semente)
+    imprimir(resultado)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,88 @@
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import conexao
+from conexao import unidade_de_trabalho, configurar_pool
+from instrumentacao import percentil
+import cache
+import main
+
+# Teste de carga: várias partidas simultâneas, cada uma na sua thread e com
+# a sua própria sessão (unidade_de_trabalho), contra um Postgres local.
+#
+# Uso: python stress.py [--partidas 200] [--threads 32] [--jogadores 4] [--metricas]
+
+
+def criar_usuarios(quantidade):
+    with unidade_de_trabalho() as s:
+        usuarios = [conexao.Usuario(nome=f"stress_{i}") for i in range(quantidade)]
+        s.add_all(usuarios)
+        s.flush()
+        return [u.idusuario for u in usuarios]
+
+
+# Retorna o número de erros e {idpartida: movimentos} das partidas concluídas
+def executar(partidas, threads, jogadores_por_partida, semente, metricas=False):
+    configurar_pool(pool_size=threads, max_overflow=threads // 2)
+    if metricas:
+        from instrumentacao import ativar
+        ativar(conexao.obter_engine())
+    usuarios = criar_usuarios(jogadores_por_partida * 8)
+    rng_base = random.Random(semente)
+    sementes = [rng_base.random() for _ in range(partidas)]
+    local = threading.local()
+
+    def uma_partida(i):
+        if not hasattr(local, "rng"):
+            local.rng = random.Random()
+        local.rng.seed(sementes[i])
+        jogadores = local.rng.sample(usuarios, jogadores_por_partida)
+        inicio = time.perf_counter()
+        with unidade_de_trabalho():
+            # Sem políticas: cada jogador joga a primeira peça válida
+            estado, _, movimentos = main.jogar_partida_automatica(jogadores, local.rng)
+        return time.perf_counter() - inicio, estado.idpartida, movimentos
+
+    latencias, por_partida, erros = [], {}, 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futuros = [pool.submit(uma_partida, i) for i in range(partidas)]
+        for f in as_completed(futuros):
+            try:
+                duracao, idpartida, movimentos = f.result()
+                latencias.append(duracao)
+                por_partida[idpartida] = movimentos
+            except Exception as e:
+                erros += 1
+                print(f"Erro: {e}")
+    decorrido = time.perf_counter() - inicio
+    total_movimentos = sum(por_partida.values())
+
+    print(f"\n=== Stress: {partidas} partidas, {threads} threads, "
+          f"{jogadores_por_partida} jogadores ===")
+    print(f"Tempo total: {decorrido:.2f} s | Erros: {erros}")
+    print(f"Partidas/s: {len(latencias) / decorrido:.1f} | Movimentos/s: {total_movimentos / decorrido:.1f}")
+    if latencias:
+        print(f"Latência por partida (ms): p50={percentil(latencias, 50) * 1000:.1f} "
+              f"p95={percentil(latencias, 95) * 1000:.1f} p99={percentil(latencias, 99) * 1000:.1f}")
+    print(f"Pool: {conexao.obter_engine().pool.status()}")
+    if metricas:
+        from instrumentacao import instrumentacao
+        print(f"\nSQL por função:\n{instrumentacao.relatorio()}")
+        print(f"\nCache:\n{cache.relatorio()}")
+    return erros, por_partida
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga com partidas simultâneas")
+    parser.add_argument("--partidas", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--jogadores", type=int, default=4, choices=[2, 3, 4])
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--metricas", action="store_true", help="mostra o SQL por função do jogo")
+    args = parser.parse_args()
+    erros, _ = executar(args.partidas, args.threads, args.jogadores, args.semente, args.metricas)
+    raise SystemExit(1 if erros else 0)
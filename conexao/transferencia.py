@@ -0,0 +1,383 @@
+import io
+import os
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import (
+    text, insert, select, Table, Column, MetaData, Integer, DateTime, Numeric, LargeBinary,
+)
+
+from conexao import session, banco_embutido
+import estatisticas
+
+# Importação e exportação em massa dos usuários e do histórico de partidas,
+# para migrar ou restaurar dados sem passar pelo menu: um arquivo CSV (com
+# cabeçalho) ou JSONL por tabela, num diretório. No Postgres os dados
+# passam por COPY, em fluxo; sem COPY (banco embutido ou --sem-copy) vão em
+# lotes de INSERT de várias linhas. Nos dois casos a memória usada não
+# depende do tamanho dos arquivos, e os arquivos de um servem para o outro.
+#
+# A importação é uma única transação: cada arquivo vai para uma tabela
+# temporária e dela para a tabela, na ordem das chaves estrangeiras; as
+# referências circulares (Partida e Serie -> Dupla) são preenchidas no
+# fim. Os ids são mantidos e as sequências seguem o maior id importado;
+# EstatisticaUsuario é recalculada (ReconstruirEstatisticas) e os eventos
+# para espectadores ficam desligados durante a carga. Peca vem do script
+# do banco e não é transferida.
+#
+# Uso: python transferencia.py exportar diretorio [--formato csv|jsonl] [--tabelas t1,t2] [--sem-copy]
+#      python transferencia.py importar diretorio [--tabelas t1,t2] [--lote 1000] [--sem-copy]
+
+# Na ordem das chaves estrangeiras
+TABELAS = ("usuario", "serie", "partida", "dupla", "partidausuario",
+           "maopartida", "movimentacao", "partidaarquivada", "resumopartida")
+
+# Colunas que apontam para tabelas importadas depois; entram no fim
+CIRCULARES = {"serie": ("idduplavencedora",), "partida": ("idduplavencedora", "idduplatrancou")}
+
+FORMATOS = ("csv", "jsonl")
+LOTE_PADRAO = 1000
+
+_metadados = MetaData()
+_tabelas = {}
+
+
+# Tabela lida do banco (as colunas de ResumoPartida, por exemplo, não
+# estão nos modelos). O SQLite guarda o nome como está no script (Partida)
+# e a reflexão compara o nome exato
+def tabela(nome):
+    if nome not in _tabelas:
+        real = nome
+        if banco_embutido():
+            real = session.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND lower(name) = :nome"
+            ), {"nome": nome}).scalar() or nome
+        _tabelas[nome] = Table(real, _metadados, autoload_with=session.connection())
+    return _tabelas[nome]
+
+
+def usar_copy(sem_copy=False):
+    return not sem_copy and not banco_embutido()
+
+
+def caminho(diretorio, nome, formato):
+    return os.path.join(diretorio, f"{nome}.{formato}")
+
+
+# Formato em que cada arquivo está (None se a tabela não tem arquivo)
+def formato_de(diretorio, nome):
+    for formato in FORMATOS:
+        if os.path.exists(caminho(diretorio, nome, formato)):
+            return formato
+    return None
+
+
+# ---------- valores ----------
+# Mesmas representações do COPY: bytea em hexadecimal (\x...) e datas ISO;
+# no JSON, NUMERIC vai como texto, para não perder casas num float
+def para_texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (bytes, memoryview)):
+        return "\\x" + bytes(valor).hex()
+    return str(valor)
+
+
+def para_json(valor):
+    if isinstance(valor, (bytes, memoryview)):
+        return "\\x" + bytes(valor).hex()
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+# Conversor do texto (CSV) ou valor JSON para o tipo da coluna; vazio é NULL
+def conversor(coluna):
+    if isinstance(coluna.type, Integer):
+        tipo = int
+    elif isinstance(coluna.type, DateTime):
+        tipo = datetime.fromisoformat
+    elif isinstance(coluna.type, LargeBinary):
+        tipo = lambda v: bytes.fromhex(v[2:])
+    elif isinstance(coluna.type, Numeric):
+        tipo = lambda v: Decimal(str(v))
+    else:
+        tipo = str
+    return lambda v: None if v is None or v == "" else tipo(v)
+
+
+# ---------- fluxos para o COPY ----------
+# Saída do COPY em texto com uma linha JSON por registro: o COPY dobra as
+# barras invertidas, que voltam ao normal aqui, linha a linha (o JSON não
+# tem tabulações nem quebras de linha literais)
+class SaidaJsonl(io.TextIOBase):
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.resto = ""
+
+    def write(self, dados):
+        tamanho = len(dados)
+        dados = self.resto + dados
+        fim = dados.rfind("\n") + 1
+        self.arquivo.write(dados[:fim].replace("\\\\", "\\"))
+        self.resto = dados[fim:]
+        return tamanho
+
+
+# Arquivo de leitura sobre um gerador de linhas, para o COPY ... FROM STDIN
+class EntradaCopy(io.TextIOBase):
+    def __init__(self, linhas):
+        self.linhas = linhas
+        self.buffer = ""
+
+    def read(self, tamanho=-1):
+        while tamanho < 0 or len(self.buffer) < tamanho:
+            linha = next(self.linhas, None)
+            if linha is None:
+                break
+            self.buffer += linha
+        dados = self.buffer if tamanho < 0 else self.buffer[:tamanho]
+        self.buffer = self.buffer[len(dados):]
+        return dados
+
+
+# Linha JSON como linha do COPY em texto (barras invertidas escapadas)
+def escapar_copy(linha):
+    return linha.rstrip("\r\n").replace("\\", "\\\\").replace("\t", "\\t") + "\n"
+
+
+def bruta():
+    return session.connection().connection.driver_connection
+
+
+# ---------- exportação ----------
+# Grava uma tabela em arquivo; retorna o número de linhas
+def exportar_tabela(nome, destino, formato, copy=True, lote=LOTE_PADRAO):
+    t = tabela(nome)
+    colunas = [c.name for c in t.columns]
+    consulta = (f"SELECT {', '.join(colunas)} FROM {nome} "
+                f"ORDER BY {', '.join(c.name for c in t.primary_key.columns)}")
+    with open(destino, "w", encoding="utf8", newline="") as arquivo:
+        if copy:
+            cursor = bruta().cursor()
+            if formato == "csv":
+                cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER)", arquivo)
+            else:
+                cursor.copy_expert(f"COPY (SELECT row_to_json(L) FROM ({consulta}) L) TO STDOUT",
+                                   SaidaJsonl(arquivo))
+            return cursor.rowcount
+
+        linhas = session.execute(select(t).order_by(*t.primary_key.columns)
+                                 .execution_options(yield_per=lote))
+        total = 0
+        if formato == "csv":
+            escritor = csv.writer(arquivo, lineterminator="\n")
+            escritor.writerow(colunas)
+            for linha in linhas:
+                escritor.writerow([para_texto(v) for v in linha])
+                total += 1
+        else:
+            for linha in linhas:
+                arquivo.write(json.dumps(dict(zip(colunas, map(para_json, linha))), ensure_ascii=False) + "\n")
+                total += 1
+        return total
+
+
+# Exporta as tabelas (todas as do histórico, por padrão) numa mesma
+# leitura consistente; retorna [(tabela, linhas, segundos)]
+def exportar(diretorio, formato="csv", tabelas=TABELAS, sem_copy=False, lote=LOTE_PADRAO):
+    os.makedirs(diretorio, exist_ok=True)
+    copy = usar_copy(sem_copy)
+    if not banco_embutido():
+        session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"))
+    relatorio = []
+    try:
+        for nome in tabelas:
+            inicio = time.perf_counter()
+            linhas = exportar_tabela(nome, caminho(diretorio, nome, formato), formato, copy, lote)
+            relatorio.append((nome, linhas, time.perf_counter() - inicio))
+    finally:
+        session.rollback()
+    return relatorio
+
+
+# ---------- importação ----------
+# Colunas do arquivo (as do cabeçalho ou as chaves do primeiro registro),
+# que precisam existir na tabela; deixa o arquivo depois do cabeçalho e
+# devolve a primeira linha do JSONL, já lida
+def _colunas(arquivo, formato, t):
+    primeira = arquivo.readline()
+    if formato == "csv":
+        nomes, primeira = next(csv.reader([primeira]), []), ""
+    else:
+        nomes = list(json.loads(primeira)) if primeira.strip() else []
+    desconhecidas = [c for c in nomes if c not in t.columns]
+    if desconhecidas:
+        raise ValueError(f"{t.name}: colunas desconhecidas {', '.join(desconhecidas)}")
+    return nomes, primeira
+
+
+# Carrega o arquivo na tabela temporária carga_<tabela>; retorna (colunas,
+# linhas)
+def carregar(nome, origem, formato, copy=True, lote=LOTE_PADRAO):
+    t = tabela(nome)
+    carga = f"carga_{nome}"
+    session.execute(text(f"DROP TABLE IF EXISTS {carga}"))
+    session.execute(text(f"CREATE TEMP TABLE {carga} AS SELECT * FROM {nome} WHERE 1 = 0"))
+    with open(origem, "r", encoding="utf8", newline="") as arquivo:
+        colunas, primeira = _colunas(arquivo, formato, t)
+        if not colunas:
+            return colunas, 0
+        lista = ", ".join(colunas)
+
+        if copy and formato == "csv":
+            cursor = bruta().cursor()
+            cursor.copy_expert(f"COPY {carga} ({lista}) FROM STDIN WITH (FORMAT csv)", arquivo)
+            return colunas, cursor.rowcount
+        if copy:
+            cursor = bruta().cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {carga}_json; CREATE TEMP TABLE {carga}_json (linha JSONB)")
+            entrada = EntradaCopy(escapar_copy(l) for l in _nao_vazias(primeira, arquivo))
+            cursor.copy_expert(f"COPY {carga}_json (linha) FROM STDIN", entrada)
+            linhas = cursor.rowcount
+            cursor.execute(f"""
+                INSERT INTO {carga} ({lista})
+                SELECT {', '.join('R.' + c for c in colunas)}
+                FROM {carga}_json J, jsonb_populate_record(NULL::{carga}, J.linha) R;
+                DROP TABLE {carga}_json
+            """)
+            return colunas, linhas
+
+        # Sem COPY: lotes de um INSERT de várias linhas
+        destino = Table(carga, MetaData(), *[Column(c, t.columns[c].type) for c in colunas])
+        converter = [conversor(t.columns[c]) for c in colunas]
+        if formato == "csv":
+            registros = csv.reader(arquivo)
+        else:
+            objetos = (json.loads(l, parse_float=Decimal) for l in _nao_vazias(primeira, arquivo))
+            registros = ([o.get(c) for c in colunas] for o in objetos)
+        linhas, pendentes = 0, []
+        for registro in registros:
+            pendentes.append({c: f(v) for c, f, v in zip(colunas, converter, registro)})
+            if len(pendentes) >= lote:
+                session.execute(insert(destino).values(pendentes))
+                linhas += len(pendentes)
+                pendentes = []
+        if pendentes:
+            session.execute(insert(destino).values(pendentes))
+            linhas += len(pendentes)
+        return colunas, linhas
+
+
+def _nao_vazias(primeira, arquivo):
+    if primeira.strip():
+        yield primeira
+    for linha in arquivo:
+        if linha.strip():
+            yield linha
+
+
+# Copia a tabela temporária para a tabela, sem as colunas circulares
+def transferir(nome, colunas):
+    lista = ", ".join(c for c in colunas if c not in CIRCULARES.get(nome, ()))
+    # Dupla e Serie têm ids GENERATED ALWAYS no Postgres
+    sobrepor = "" if banco_embutido() else "OVERRIDING SYSTEM VALUE"
+    session.execute(text(f"INSERT INTO {nome} ({lista}) {sobrepor} SELECT {lista} FROM carga_{nome}"))
+
+
+# Preenche as colunas circulares depois que todas as tabelas entraram
+def completar_circulares(nome, colunas):
+    circulares = [c for c in CIRCULARES.get(nome, ()) if c in colunas]
+    if not circulares:
+        return
+    chave = tabela(nome).primary_key.columns.keys()[0]
+    session.execute(text(f"""
+        UPDATE {nome} SET {', '.join(f'{c} = C.{c}' for c in circulares)}
+        FROM carga_{nome} C
+        WHERE {nome}.{chave} = C.{chave}
+          AND ({' OR '.join(f'C.{c} IS NOT NULL' for c in circulares)})
+    """))
+
+
+# Avança a sequência da chave (serial ou identity) para depois do maior id
+def ajustar_sequencia(nome):
+    chave = tabela(nome).primary_key.columns.keys()
+    if banco_embutido() or len(chave) != 1:
+        return
+    session.execute(text(f"""
+        SELECT setval(pg_get_serial_sequence(:tabela, :chave),
+                      (SELECT COALESCE(MAX({chave[0]}), 0) + 1 FROM {nome}), false)
+    """), {"tabela": nome, "chave": chave[0]})
+
+
+# Importa os arquivos do diretório (as tabelas sem arquivo ficam de fora)
+# numa única transação; retorna [(tabela, linhas, segundos)]
+def importar(diretorio, tabelas=TABELAS, sem_copy=False, lote=LOTE_PADRAO):
+    copy = usar_copy(sem_copy)
+    relatorio, importadas = [], []
+    try:
+        if not banco_embutido():
+            session.execute(text("SET LOCAL capivara.eventos = 'off'"))
+        for nome in TABELAS:
+            formato = formato_de(diretorio, nome)
+            if nome not in tabelas or formato is None:
+                continue
+            inicio = time.perf_counter()
+            colunas, linhas = carregar(nome, caminho(diretorio, nome, formato), formato, copy, lote)
+            if colunas:
+                transferir(nome, colunas)
+                importadas.append((nome, colunas))
+            relatorio.append((nome, linhas, time.perf_counter() - inicio))
+
+        for nome, colunas in importadas:
+            completar_circulares(nome, colunas)
+            ajustar_sequencia(nome)
+        for nome, _ in importadas:
+            session.execute(text(f"DROP TABLE carga_{nome}"))
+        # Confirma tudo junto com as estatísticas recalculadas
+        estatisticas.reconstruir()
+    except Exception:
+        session.rollback()
+        raise
+    return relatorio
+
+
+def mostrar(relatorio, decorrido):
+    total = 0
+    for nome, linhas, segundos in relatorio:
+        total += linhas
+        print(f"{nome:<18} {linhas:>10} linha(s) {segundos:>8.2f} s {linhas / max(segundos, 1e-9):>12.0f} linhas/s")
+    print(f"{'total':<18} {total:>10} linha(s) {decorrido:>8.2f} s {total / max(decorrido, 1e-9):>12.0f} linhas/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importação e exportação em massa")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p = comandos.add_parser("exportar", help="grava as tabelas em arquivos")
+    p.add_argument("diretorio")
+    p.add_argument("--formato", choices=FORMATOS, default="csv")
+    p = comandos.add_parser("importar", help="carrega os arquivos do diretório")
+    p.add_argument("diretorio")
+    for p in comandos.choices.values():
+        p.add_argument("--tabelas", default=",".join(TABELAS), help="tabelas, separadas por vírgula")
+        p.add_argument("--lote", type=int, default=LOTE_PADRAO, help="linhas por INSERT (sem COPY)")
+        p.add_argument("--sem-copy", action="store_true", help="usa lotes de INSERT em vez de COPY")
+    args = parser.parse_args()
+
+    tabelas = [t.strip().lower() for t in args.tabelas.split(",") if t.strip()]
+    desconhecidas = [t for t in tabelas if t not in TABELAS]
+    if desconhecidas:
+        parser.error(f"tabelas desconhecidas: {', '.join(desconhecidas)}")
+
+    inicio = time.perf_counter()
+    if args.comando == "exportar":
+        relatorio = exportar(args.diretorio, args.formato, tabelas, args.sem_copy, args.lote)
+    else:
+        relatorio = importar(args.diretorio, tabelas, args.sem_copy, args.lote)
+    mostrar(relatorio, time.perf_counter() - inicio)
+    session.close()
@@ -0,0 +1,88 @@
+import json
+from sqlalchemy import text
+
+# Índices dos caminhos quentes: as consultas do jogo com o índice que cada
+# uma deve usar, a carga de volume (popular) e a leitura do plano. O teste
+# tests/test_indices.py popula o banco com 40 mil partidas (~1,04 milhão de
+# movimentações) numa transação desfeita no final e confere com EXPLAIN que
+# cada consulta usa o seu índice, sem Seq Scan; benchmark.py usa a mesma
+# carga.
+
+# (descrição, consulta, índice esperado)
+CONSULTAS = [
+    ("mão do jogador",
+     "SELECT idPeca FROM MaoPartida WHERE idPartida = :p AND idUsuario = :u AND statusPeca = 'em_mao'",
+     "idxmaopartidamao"),
+    ("peça do monte (ComprarPecaDoMonte)",
+     "SELECT idPeca FROM MaoPartida WHERE idPartida = :p AND statusPeca = 'no_monte' LIMIT 1",
+     "idxmaopartidamonte"),
+    ("mesa da partida",
+     "SELECT idPecaJogada, extremidadeMesa FROM Movimentacao "
+     "WHERE idPartida = :p AND tipoAcao = 'jogada' ORDER BY ordemAcao",
+     "idxmovimentacaopartidaordem"),
+    ("partidas do jogador",
+     "SELECT idPartida FROM PartidaUsuario WHERE idUsuario = :u",
+     "idxpartidausuariousuario"),
+    ("próxima ordemAcao (contador)",
+     "UPDATE Partida SET proximaOrdemAcao = proximaOrdemAcao + 1 "
+     "WHERE idPartida = :p RETURNING proximaOrdemAcao - 1",
+     "partida_pkey"),
+]
+
+
+# Insere `partidas` partidas em andamento com `movimentos` movimentações
+# cada; retorna (primeiro idpartida - 1, primeiro idusuario - 1, usuarios)
+def popular(conn, partidas, movimentos, usuarios=None):
+    usuarios = max(4, usuarios or partidas // 40)
+    conn.execute(text("""
+        INSERT INTO Usuario (nome) SELECT 'indice_' || g FROM generate_series(1, :n) g
+    """), {"n": usuarios})
+    base_usuario = conn.execute(text("SELECT MAX(idUsuario) - :n FROM Usuario"), {"n": usuarios}).scalar()
+    conn.execute(text("INSERT INTO Partida (proximaOrdemAcao) SELECT :m + 1 FROM generate_series(1, :n)"),
+                 {"n": partidas, "m": movimentos})
+    base_partida = conn.execute(text("SELECT MAX(idPartida) - :n FROM Partida"), {"n": partidas}).scalar()
+
+    # Quatro jogadores por partida, em rodízio sobre os usuários criados
+    conn.execute(text("""
+        INSERT INTO PartidaUsuario (idPartida, idUsuario, posicaoMesa)
+        SELECT :bp + p, :bu + 1 + ((p * 4 + s) % :nu), s + 1
+        FROM generate_series(1, :n) p, generate_series(0, 3) s
+    """), {"bp": base_partida, "bu": base_usuario, "nu": usuarios, "n": partidas})
+
+    # 28 peças por partida: 7 em cada mão no início, o resto jogado ou no monte
+    conn.execute(text("""
+        INSERT INTO MaoPartida (idPartida, idPeca, idUsuario, statusPeca)
+        SELECT :bp + p, pc,
+               CASE WHEN pc <= 20 THEN :bu + 1 + ((p * 4 + (pc - 1) % 4) % :nu) END,
+               CASE WHEN pc <= 6 THEN 'jogada' WHEN pc <= 20 THEN 'em_mao' ELSE 'no_monte' END
+        FROM generate_series(1, :n) p, generate_series(1, 28) pc
+    """), {"bp": base_partida, "bu": base_usuario, "nu": usuarios, "n": partidas})
+
+    conn.execute(text("""
+        INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
+        SELECT :bp + p, :bu + 1 + ((p * 4 + o % 4) % :nu), o,
+               CASE WHEN o % 3 = 0 THEN 'comprou' ELSE 'jogada' END,
+               1 + o % 28,
+               CASE WHEN o % 2 = 0 THEN 'esquerda' ELSE 'direita' END
+        FROM generate_series(1, :n) p, generate_series(1, :m) o
+    """), {"bp": base_partida, "bu": base_usuario, "nu": usuarios, "n": partidas, "m": movimentos})
+
+    for tabela in ("Usuario", "Partida", "PartidaUsuario", "MaoPartida", "Movimentacao"):
+        conn.execute(text(f"ANALYZE {tabela}"))
+    return base_partida, base_usuario, usuarios
+
+
+# Percorre a árvore do plano devolvendo (tipo do nó, índice)
+def nos(plano):
+    yield plano["Node Type"], plano.get("Index Name")
+    for filho in plano.get("Plans", []):
+        yield from nos(filho)
+
+
+# Nós do plano da consulta, como (tipo do nó, índice)
+def plano(conn, consulta, idpartida, idusuario):
+    resultado = conn.execute(text(f"EXPLAIN (FORMAT JSON) {consulta}"),
+                             {"p": idpartida, "u": idusuario}).scalar()
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return list(nos(resultado[0]["Plan"]))
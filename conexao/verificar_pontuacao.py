@@ -0,0 +1,123 @@
+import sys
+import time
+import argparse
+from collections import Counter, defaultdict
+from sqlalchemy import text, event
+
+from conexao import session, obter_engine, banco_embutido
+from motor import obter_conjunto, Pontuacao
+from registro import carregar_registros, reproduzir
+
+# Confere a pontuação calculada pelo banco (função PontuacaoPartida, a mesma
+# que o gatilho calcularPontosPartida usa) com a calculada em memória
+# (EstadoPartida.pontuacao) para as partidas que ainda têm as peças nas
+# tabelas quentes: pontos de cada jogador, total de cada dupla e
+# trancamento. O banco pontua um lote inteiro num único comando, seja qual
+# for o número de jogadores; o relatório mostra os comandos por lote.
+# Os pontos gravados nas partidas finalizadas são conferidos por
+# `python registro.py verificar`.
+#
+# Uso: python verificar_pontuacao.py [--lote 500] [--limite N]
+
+
+def partidas_quentes(limite=None):
+    return session.execute(text(f"""
+        SELECT P.idpartida FROM partida P
+        WHERE EXISTS (SELECT 1 FROM maopartida MP WHERE MP.idpartida = P.idpartida)
+        ORDER BY P.idpartida
+        {"LIMIT :limite" if limite is not None else ""}
+    """), {"limite": limite}).scalars().all()
+
+
+# Linhas (idpartida, idusuario, iddupla, pontosmao, pontosdupla, trancado)
+# de PontuacaoPartida; no banco embutido, uma chamada por partida, no
+# próprio processo (sem comandos a contar)
+def linhas_pontuacao(ids):
+    if banco_embutido():
+        import embutido
+        conexao = embutido.bruta(session)
+        return [(p, *linha) for p in ids for linha in embutido.pontuacao_partida(conexao, p)]
+    return session.execute(text("""
+        SELECT P.id, S.idusuario, S.iddupla, S.pontosmao, S.pontosdupla, S.trancado
+        FROM unnest(CAST(:ids AS INT[])) AS P(id)
+        CROSS JOIN LATERAL PontuacaoPartida(P.id) S
+    """), {"ids": list(ids)})
+
+
+# Pontuação de várias partidas pelo banco, num único comando:
+# {idpartida: Pontuacao}
+def pontuacao_banco(ids):
+    resultado = defaultdict(lambda: Pontuacao({}, {}, None))
+    for idpartida, idusuario, iddupla, pontosmao, pontosdupla, trancado in linhas_pontuacao(ids):
+        p = resultado[idpartida]
+        p.jogadores[idusuario] = pontosmao
+        p.duplas[-idusuario if iddupla is None else iddupla] = pontosdupla
+        resultado[idpartida] = p._replace(trancado=trancado)
+    return dict(resultado)
+
+
+# Conta os comandos enviados ao banco enquanto ativo
+class Contador:
+    def __init__(self):
+        self.comandos = 0
+
+    def __call__(self, *args):
+        self.comandos += 1
+
+    def __enter__(self):
+        self.comandos = 0
+        event.listen(obter_engine(), "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(obter_engine(), "before_cursor_execute", self)
+
+
+# Retorna {número de jogadores: Counter} com partidas, iguais, divergentes e
+# comandos, e a lista de divergências (idpartida, banco, memória)
+def verificar(lote=500, limite=None):
+    conjunto = obter_conjunto(session)
+    ids = partidas_quentes(limite)
+    grupos, divergencias = defaultdict(Counter), []
+    contador = Contador()
+    for i in range(0, len(ids), lote):
+        parte = ids[i:i + lote]
+        registros = carregar_registros(session, parte, conjunto)
+        with contador:
+            banco = pontuacao_banco(parte)
+        por_tamanho = Counter()
+        for idpartida, registro in registros.items():
+            estado, _ = reproduzir(registro, conjunto)
+            memoria = estado.pontuacao()
+            g = grupos[len(registro.jogadores)]
+            g["partidas"] += 1
+            por_tamanho[len(registro.jogadores)] += 1
+            if banco.get(idpartida) == memoria:
+                g["iguais"] += 1
+            else:
+                g["divergentes"] += 1
+                divergencias.append((idpartida, banco.get(idpartida), memoria))
+        # O comando do lote vale para todos os tamanhos de mesa presentes nele
+        for tamanho in por_tamanho:
+            grupos[tamanho]["lotes"] += 1
+            grupos[tamanho]["comandos"] += contador.comandos
+        session.commit()
+    return grupos, divergencias
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confere a pontuação do banco com a pontuação em memória")
+    parser.add_argument("--lote", type=int, default=500, help="partidas por comando")
+    parser.add_argument("--limite", type=int, help="máximo de partidas verificadas")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    grupos, divergencias = verificar(args.lote, args.limite)
+    print(f"Verificação da pontuação ({time.perf_counter() - inicio:.1f} s)")
+    for tamanho, g in sorted(grupos.items()):
+        print(f"{tamanho} jogadores: {g['partidas']} partida(s) | iguais {g['iguais']} | "
+              f"divergentes {g['divergentes']} | {g['comandos'] / g['lotes']:.0f} comando(s) por lote")
+    for idpartida, banco, memoria in divergencias[:20]:
+        print(f"  partida {idpartida}: banco {banco} | memória {memoria}")
+    session.close()
+    sys.exit(1 if divergencias else 0)
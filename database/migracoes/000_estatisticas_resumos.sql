@@ -0,0 +1,215 @@
+-- Estatísticas por usuário (EstatisticaUsuario, RankingEstatisticas) e
+-- resumo das partidas finalizadas (ResumoPartida), ver conexao/estatisticas.py
+-- e conexao/resumos.py. O script.sql já os tinha antes de 001, mas bancos
+-- instalados pelo script original não; por isso a numeração antes das demais.
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+-- Estatísticas por usuário mantidas incrementalmente, para o ranking não
+-- recalcular a view RankingUsuarios a cada consulta
+CREATE TABLE IF NOT EXISTS EstatisticaUsuario (
+    idUsuario INT PRIMARY KEY REFERENCES Usuario(idUsuario) ON DELETE CASCADE,
+    partidasJogadas INT NOT NULL DEFAULT 0,
+    partidasVencidas INT NOT NULL DEFAULT 0,
+    totalPontos INT NOT NULL DEFAULT 0
+);
+
+DROP INDEX IF EXISTS idxEstatisticaRanking;
+CREATE INDEX idxEstatisticaRanking
+    ON EstatisticaUsuario (partidasVencidas DESC, totalPontos DESC, idUsuario DESC);
+
+CREATE OR REPLACE FUNCTION criarEstatisticaUsuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO EstatisticaUsuario (idUsuario) VALUES (NEW.idUsuario)
+    ON CONFLICT (idUsuario) DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigCriarEstatisticaUsuario ON Usuario;
+CREATE TRIGGER trigCriarEstatisticaUsuario
+    AFTER INSERT ON Usuario
+    FOR EACH ROW
+    EXECUTE FUNCTION criarEstatisticaUsuario();
+
+-- Partidas jogadas: conta a entrada (e a saída) do jogador na partida,
+-- como faz a view
+CREATE OR REPLACE FUNCTION contarPartidaUsuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO EstatisticaUsuario (idUsuario, partidasJogadas) VALUES (NEW.idUsuario, 1)
+        ON CONFLICT (idUsuario) DO UPDATE
+        SET partidasJogadas = EstatisticaUsuario.partidasJogadas + 1;
+        RETURN NEW;
+    END IF;
+
+    UPDATE EstatisticaUsuario
+    SET partidasJogadas = partidasJogadas - 1
+    WHERE idUsuario = OLD.idUsuario;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigContarPartidaUsuario ON PartidaUsuario;
+CREATE TRIGGER trigContarPartidaUsuario
+    AFTER INSERT OR DELETE ON PartidaUsuario
+    FOR EACH ROW
+    EXECUTE FUNCTION contarPartidaUsuario();
+
+-- Vitórias e pontos: somados quando a partida é finalizada, depois que
+-- trigCalcularPontosPartida já calculou pontosDaPartida
+CREATE OR REPLACE FUNCTION acumularEstatisticasPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
+        IF NEW.idJogadorVencedor IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            VALUES (NEW.idJogadorVencedor, 1, NEW.pontosDaPartida)
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+
+        IF NEW.idDuplaVencedora IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            SELECT PU.idUsuario, 1, NEW.pontosDaPartida
+            FROM PartidaUsuario PU
+            WHERE PU.idPartida = NEW.idPartida
+              AND PU.idDupla = NEW.idDuplaVencedora
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigAcumularEstatisticasPartida ON Partida;
+CREATE TRIGGER trigAcumularEstatisticasPartida
+    AFTER UPDATE ON Partida
+    FOR EACH ROW
+    EXECUTE FUNCTION acumularEstatisticasPartida();
+
+-- Recalcula as estatísticas a partir da view RankingUsuarios
+CREATE OR REPLACE PROCEDURE ReconstruirEstatisticas()
+LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE EstatisticaUsuario IN EXCLUSIVE MODE;
+    DELETE FROM EstatisticaUsuario;
+    INSERT INTO EstatisticaUsuario (idUsuario, partidasJogadas, partidasVencidas, totalPontos)
+    SELECT idUsuario, totalPartidasJogadas, partidasVencidas, totalPontosGanhos
+    FROM RankingUsuarios;
+END;
+$$;
+
+CREATE OR REPLACE VIEW RankingEstatisticas AS
+SELECT
+    E.idUsuario,
+    U.nome,
+    E.partidasJogadas AS totalPartidasJogadas,
+    E.partidasVencidas,
+    ROUND(
+        CASE WHEN E.partidasJogadas = 0 THEN 0
+             ELSE E.partidasVencidas * 100.0 / E.partidasJogadas END, 2
+    ) AS percentualVitorias,
+    E.totalPontos AS totalPontosGanhos,
+    ROUND(
+        CASE WHEN E.partidasJogadas = 0 THEN 0
+             ELSE E.totalPontos * 1.0 / E.partidasJogadas END, 2
+    ) AS mediaPontosPorPartida
+FROM EstatisticaUsuario E
+JOIN Usuario U ON U.idUsuario = E.idUsuario;
+
+-- Resumo compacto de cada partida finalizada, gravado uma única vez por
+-- finalizar_partida, para o histórico não executar as subconsultas
+-- correlacionadas de PartidasDetalhadas a cada leitura
+CREATE TABLE IF NOT EXISTS ResumoPartida (
+    idPartida INT PRIMARY KEY REFERENCES Partida(idPartida) ON DELETE CASCADE,
+    dataHoraInicio TIMESTAMP NOT NULL,
+    dataHoraFim TIMESTAMP,
+    modoTermino VARCHAR(20),
+    pontosDaPartida INT NOT NULL DEFAULT 0,
+    tipoVitoria VARCHAR(20) NOT NULL,
+    nomeVencedorIndividual VARCHAR(255),
+    nomeDuplaVencedora VARCHAR(100),
+    nomeDuplaTrancou VARCHAR(100),
+    jogadoresParticipantes TEXT,
+    duplasParticipantes TEXT,
+    totalMovimentacoes INT NOT NULL DEFAULT 0,
+    duracaoMinutos NUMERIC
+);
+
+-- Paginação por chave (keyset) do mais recente para o mais antigo
+CREATE INDEX IF NOT EXISTS idxResumoPartidaInicio ON ResumoPartida (dataHoraInicio DESC, idPartida DESC);
+
+-- Grava (ou regrava) o resumo de uma partida; quem já sabe o total de
+-- movimentações pode informá-lo e evitar a contagem
+CREATE OR REPLACE FUNCTION GravarResumoPartida(
+    pIdPartida INT,
+    pTotalMovimentacoes INT DEFAULT NULL
+) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO ResumoPartida (
+        idPartida, dataHoraInicio, dataHoraFim, modoTermino, pontosDaPartida, tipoVitoria,
+        nomeVencedorIndividual, nomeDuplaVencedora, nomeDuplaTrancou,
+        jogadoresParticipantes, duplasParticipantes, totalMovimentacoes, duracaoMinutos
+    )
+    SELECT
+        PD.idPartida, COALESCE(PD.dataHoraInicio, PD.dataHoraFim), PD.dataHoraFim, PD.modoTermino,
+        PD.pontosDaPartida, PD.tipoVitoria,
+        PD.nomeVencedorIndividual, PD.nomeDuplaVencedora, PD.nomeDuplaTrancou,
+        PD.jogadoresParticipantes, PD.duplasParticipantes,
+        COALESCE(pTotalMovimentacoes, PD.totalMovimentacoes), PD.duracaoMinutos
+    FROM PartidasDetalhadas PD
+    WHERE PD.idPartida = pIdPartida
+    ON CONFLICT (idPartida) DO UPDATE SET
+        dataHoraInicio = EXCLUDED.dataHoraInicio,
+        dataHoraFim = EXCLUDED.dataHoraFim,
+        modoTermino = EXCLUDED.modoTermino,
+        pontosDaPartida = EXCLUDED.pontosDaPartida,
+        tipoVitoria = EXCLUDED.tipoVitoria,
+        nomeVencedorIndividual = EXCLUDED.nomeVencedorIndividual,
+        nomeDuplaVencedora = EXCLUDED.nomeDuplaVencedora,
+        nomeDuplaTrancou = EXCLUDED.nomeDuplaTrancou,
+        jogadoresParticipantes = EXCLUDED.jogadoresParticipantes,
+        duplasParticipantes = EXCLUDED.duplasParticipantes,
+        totalMovimentacoes = EXCLUDED.totalMovimentacoes,
+        duracaoMinutos = EXCLUDED.duracaoMinutos;
+END;
+$$;
+
+-- Preenche os resumos que faltam (partidas finalizadas antes desta tabela),
+-- um lote por chamada; retorna quantas partidas foram resumidas
+CREATE OR REPLACE FUNCTION PreencherResumos(pLote INT DEFAULT 1000)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    vIdPartida INT;
+    vTotal INT := 0;
+BEGIN
+    FOR vIdPartida IN
+        SELECT P.idPartida FROM Partida P
+        WHERE P.dataHoraFim IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM ResumoPartida R WHERE R.idPartida = P.idPartida)
+        ORDER BY P.idPartida
+        LIMIT pLote
+    LOOP
+        PERFORM GravarResumoPartida(vIdPartida);
+        vTotal := vTotal + 1;
+    END LOOP;
+    RETURN vTotal;
+END;
+$$;
+
+-- Estatísticas e resumos das partidas já jogadas
+CALL ReconstruirEstatisticas();
+
+DO $$
+BEGIN
+    WHILE PreencherResumos(1000) > 0 LOOP
+    END LOOP;
+END;
+$$;
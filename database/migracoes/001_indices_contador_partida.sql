@@ -0,0 +1,189 @@
+-- Índices dos caminhos quentes e contador de movimentos por partida.
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+ALTER TABLE Partida ADD COLUMN IF NOT EXISTS proximaOrdemAcao INT NOT NULL DEFAULT 1;
+
+UPDATE Partida P
+SET proximaOrdemAcao = M.ultima + 1
+FROM (
+    SELECT idPartida, MAX(ordemAcao) AS ultima
+    FROM Movimentacao
+    GROUP BY idPartida
+) M
+WHERE M.idPartida = P.idPartida;
+
+CREATE INDEX IF NOT EXISTS idxMaoPartidaMao ON MaoPartida (idPartida, idUsuario, statusPeca) INCLUDE (idPeca);
+CREATE INDEX IF NOT EXISTS idxMaoPartidaMonte ON MaoPartida (idPartida) INCLUDE (idPeca) WHERE statusPeca = 'no_monte';
+CREATE INDEX IF NOT EXISTS idxMovimentacaoPartidaOrdem ON Movimentacao (idPartida, ordemAcao);
+CREATE INDEX IF NOT EXISTS idxPartidaUsuarioUsuario ON PartidaUsuario (idUsuario, idPartida);
+
+ANALYZE Partida;
+ANALYZE MaoPartida;
+ANALYZE Movimentacao;
+ANALYZE PartidaUsuario;
+
+CREATE OR REPLACE FUNCTION ReservarOrdemAcao(pIdPartida INT)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    vOrdem INT;
+BEGIN
+    UPDATE Partida
+    SET proximaOrdemAcao = proximaOrdemAcao + 1
+    WHERE idPartida = pIdPartida
+    RETURNING proximaOrdemAcao - 1 INTO vOrdem;
+    RETURN vOrdem;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE ComprarPecaDoMonte(
+    IN pIdPartida INT,
+    IN pIdUsuario INT
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    vIdPeca INT;
+BEGIN
+    SELECT idPeca INTO vIdPeca
+    FROM MaoPartida
+    WHERE idPartida = pIdPartida
+      AND statusPeca = 'no_monte'
+    LIMIT 1;
+
+    IF vIdPeca IS NULL THEN
+        RAISE NOTICE 'Monte vazio.';
+        RETURN;
+    END IF;
+
+    UPDATE MaoPartida
+    SET idUsuario = pIdUsuario,
+        statusPeca = 'em_mao'
+    WHERE idPartida = pIdPartida
+      AND idPeca = vIdPeca;
+
+    INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada)
+    VALUES (pIdPartida, pIdUsuario, ReservarOrdemAcao(pIdPartida), 'comprou', vIdPeca);
+
+    RAISE NOTICE 'Jogador % comprou peça %', pIdUsuario, vIdPeca;
+END;
+$$;
+
+CREATE OR REPLACE PROCEDURE ValidarJogada(
+    IN pIdPartida INT,
+    IN pIdUsuario INT,
+    IN pIdPeca INT,
+    IN pExtremidade VARCHAR(10),
+    IN pValorExtremidade INT
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    vLadoA INT;
+    vLadoB INT;
+    vValida BOOLEAN := FALSE;
+BEGIN
+    SELECT ladoA, ladoB INTO vLadoA, vLadoB FROM Peca WHERE idPeca = pIdPeca;
+
+    IF vLadoA = pValorExtremidade OR vLadoB = pValorExtremidade THEN
+        vValida := TRUE;
+    END IF;
+
+    IF vValida THEN
+        UPDATE MaoPartida
+        SET statusPeca = 'jogada',
+            idUsuario = NULL
+        WHERE idPartida = pIdPartida
+          AND idPeca = pIdPeca
+          AND idUsuario = pIdUsuario;
+
+        INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
+        VALUES (pIdPartida, pIdUsuario, ReservarOrdemAcao(pIdPartida), 'jogada', pIdPeca, pExtremidade);
+
+        RAISE NOTICE 'Jogada válida: peça % por jogador % na %', pIdPeca, pIdUsuario, pExtremidade;
+    ELSE
+        RAISE NOTICE 'Jogada inválida: peça % não encaixa em %', pIdPeca, pValorExtremidade;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ExecutarTurno(
+    pIdPartida INT,
+    pIdUsuario INT,
+    pIdPeca INT,
+    pExtremidade VARCHAR(10)
+) RETURNS TABLE (
+    valorExtEsquerda INT,
+    valorExtDireita INT,
+    extremidadeUsada VARCHAR(10),
+    ordemAcao INT,
+    bateu BOOLEAN,
+    trancado BOOLEAN
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    vEsq INT;
+    vDir INT;
+    vLadoA INT;
+    vLadoB INT;
+    vExtremidade VARCHAR(10) := pExtremidade;
+    vOrdem INT;
+BEGIN
+    SELECT P.valorExtEsquerda, P.valorExtDireita INTO vEsq, vDir
+    FROM Partida P
+    WHERE P.idPartida = pIdPartida AND P.dataHoraFim IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Partida % inexistente ou finalizada', pIdPartida;
+    END IF;
+
+    SELECT ladoA, ladoB INTO vLadoA, vLadoB FROM Peca WHERE idPeca = pIdPeca;
+
+    IF vEsq IS NULL AND vDir IS NULL THEN
+        vExtremidade := 'centro';
+        vEsq := vLadoA;
+        vDir := vLadoB;
+    ELSIF vExtremidade = 'esquerda' AND vEsq IN (vLadoA, vLadoB) THEN
+        vEsq := CASE WHEN vLadoA = vEsq THEN vLadoB ELSE vLadoA END;
+    ELSIF vExtremidade = 'direita' AND vDir IN (vLadoA, vLadoB) THEN
+        vDir := CASE WHEN vLadoA = vDir THEN vLadoB ELSE vLadoA END;
+    ELSE
+        RAISE EXCEPTION 'Peça % não encaixa na extremidade %', pIdPeca, pExtremidade;
+    END IF;
+
+    UPDATE MaoPartida
+    SET statusPeca = 'jogada',
+        idUsuario = NULL
+    WHERE idPartida = pIdPartida
+      AND idPeca = pIdPeca
+      AND idUsuario = pIdUsuario
+      AND statusPeca = 'em_mao';
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Peça % não está na mão do jogador %', pIdPeca, pIdUsuario;
+    END IF;
+
+    UPDATE Partida
+    SET valorExtEsquerda = vEsq,
+        valorExtDireita = vDir,
+        proximaOrdemAcao = proximaOrdemAcao + 1
+    WHERE idPartida = pIdPartida
+    RETURNING proximaOrdemAcao - 1 INTO vOrdem;
+
+    INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
+    VALUES (pIdPartida, pIdUsuario, vOrdem, 'jogada', pIdPeca, vExtremidade);
+
+    RETURN QUERY SELECT
+        vEsq,
+        vDir,
+        vExtremidade,
+        vOrdem,
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.idUsuario = pIdUsuario AND MP.statusPeca = 'em_mao'
+        ),
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.statusPeca = 'no_monte'
+        ) AND DetectarJogoTrancado(pIdPartida, vEsq, vDir);
+END;
+$$;
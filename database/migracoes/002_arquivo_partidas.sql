@@ -0,0 +1,69 @@
+-- Arquivo das partidas finalizadas (ver conexao/arquivo.py).
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+CREATE TABLE IF NOT EXISTS PartidaArquivada (
+    idPartida INT PRIMARY KEY REFERENCES Partida(idPartida) ON DELETE CASCADE,
+    registro BYTEA NOT NULL,
+    totalMovimentacoes INT NOT NULL,
+    arquivadaEm TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- totalMovimentacoes passa a considerar as partidas arquivadas
+CREATE OR REPLACE VIEW PartidasDetalhadas AS
+SELECT 
+    P.idPartida,
+    P.dataHoraInicio,
+    P.dataHoraFim,
+    P.modoTermino,
+    P.pontosDaPartida,
+    
+    CASE 
+        WHEN P.idJogadorVencedor IS NOT NULL THEN 'Jogador Individual'
+        WHEN P.idDuplaVencedora IS NOT NULL THEN 'Dupla'
+        ELSE 'Sem vencedor'
+    END as tipoVitoria,
+    
+    UV.nome as nomeVencedorIndividual,
+    
+    D.nomeDupla as nomeDuplaVencedora,
+    
+    DT.nomeDupla as nomeDuplaTrancou,
+    
+    (
+        SELECT STRING_AGG(U.nome, ', ' ORDER BY PU.posicaoMesa)
+        FROM PartidaUsuario PU
+        JOIN Usuario U ON PU.idUsuario = U.idUsuario
+        WHERE PU.idPartida = P.idPartida
+    ) as jogadoresParticipantes,
+    
+    (
+        SELECT STRING_AGG(DISTINCT D2.nomeDupla, ', ')
+        FROM PartidaUsuario PU2
+        JOIN Dupla D2 ON PU2.idDupla = D2.idDupla
+        WHERE PU2.idPartida = P.idPartida
+    ) as duplasParticipantes,
+    
+    COALESCE(
+        (
+            SELECT A.totalMovimentacoes
+            FROM PartidaArquivada A
+            WHERE A.idPartida = P.idPartida
+        ),
+        (
+            SELECT COUNT(*) 
+            FROM Movimentacao M 
+            WHERE M.idPartida = P.idPartida
+        )
+    ) as totalMovimentacoes,
+    
+    CASE 
+        WHEN P.dataHoraFim IS NOT NULL THEN
+            EXTRACT(EPOCH FROM (P.dataHoraFim - P.dataHoraInicio)) / 60
+        ELSE NULL
+    END as duracaoMinutos
+
+FROM Partida P
+LEFT JOIN Usuario UV ON P.idJogadorVencedor = UV.idUsuario
+LEFT JOIN Dupla D ON P.idDuplaVencedora = D.idDupla
+LEFT JOIN Dupla DT ON P.idDuplaTrancou = DT.idDupla
+ORDER BY P.dataHoraInicio DESC;
@@ -0,0 +1,83 @@
+-- Eventos NOTIFY para espectadores (ver conexao/espectador.py).
+-- Aplicada por init.py em bancos instalados antes desta versão.
+-- Para desligar: ALTER DATABASE domino_db SET capivara.eventos = 'off';
+
+CREATE OR REPLACE FUNCTION notificarMovimentos()
+RETURNS TRIGGER AS $$
+DECLARE
+    vEvento RECORD;
+    vPayload TEXT;
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    FOR vEvento IN
+        SELECT idPartida,
+               json_agg(json_build_array(ordemAcao, idUsuario, tipoAcao, idPecaJogada, extremidadeMesa)
+                        ORDER BY ordemAcao) AS movimentos
+        FROM novos
+        GROUP BY idPartida
+    LOOP
+        vPayload := json_build_object('movimentos', vEvento.movimentos)::TEXT;
+        IF octet_length(vPayload) > 7900 THEN
+            vPayload := '{"ressincronizar": true}';
+        END IF;
+        PERFORM pg_notify('partida_' || vEvento.idPartida, vPayload);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigNotificarMovimentos ON Movimentacao;
+CREATE TRIGGER trigNotificarMovimentos
+    AFTER INSERT ON Movimentacao
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notificarMovimentos();
+
+-- Peças distribuídas (de novo): o espectador recarrega a partida
+CREATE OR REPLACE FUNCTION notificarDistribuicao()
+RETURNS TRIGGER AS $$
+DECLARE
+    vIdPartida INT;
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    FOR vIdPartida IN SELECT DISTINCT idPartida FROM novas LOOP
+        PERFORM pg_notify('partida_' || vIdPartida, '{"ressincronizar": true}');
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigNotificarDistribuicao ON MaoPartida;
+CREATE TRIGGER trigNotificarDistribuicao
+    AFTER INSERT ON MaoPartida
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notificarDistribuicao();
+
+-- Fim da partida, depois que trigCalcularPontosPartida calculou os pontos
+CREATE OR REPLACE FUNCTION notificarFimPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('partida_' || NEW.idPartida, json_build_object('fim', json_build_object(
+        'modoTermino', NEW.modoTermino,
+        'idJogadorVencedor', NEW.idJogadorVencedor,
+        'idDuplaVencedora', NEW.idDuplaVencedora,
+        'pontosDaPartida', NEW.pontosDaPartida
+    ))::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigNotificarFimPartida ON Partida;
+CREATE TRIGGER trigNotificarFimPartida
+    AFTER UPDATE OF dataHoraFim ON Partida
+    FOR EACH ROW
+    WHEN (OLD.dataHoraFim IS NULL AND NEW.dataHoraFim IS NOT NULL)
+    EXECUTE FUNCTION notificarFimPartida();
@@ -0,0 +1,148 @@
+-- Pontuação em um único comando por partida (PontuacaoPartida), usada pelo
+-- gatilho calcularPontosPartida, e DetectarJogoTrancado numa só consulta.
+-- Corrige as partidas em duplas encerradas por trancamento, que eram
+-- gravadas com 0 ponto. Aplicada por init.py em bancos instalados antes
+-- desta versão.
+
+CREATE OR REPLACE FUNCTION DetectarJogoTrancado(
+    pIdPartida INT,
+    pValorEsquerda INT,
+    pValorDireita INT
+) RETURNS BOOLEAN
+LANGUAGE sql STABLE AS $$
+    -- Uma única consulta sobre todas as mãos da partida
+    SELECT NOT EXISTS (
+        SELECT 1
+        FROM MaoPartida mp
+        JOIN Peca p ON mp.idPeca = p.idPeca
+        WHERE mp.idPartida = pIdPartida
+          AND mp.statusPeca = 'em_mao'
+          AND (
+                p.ladoA = pValorEsquerda OR p.ladoB = pValorEsquerda
+             OR p.ladoA = pValorDireita  OR p.ladoB = pValorDireita
+          )
+    );
+$$;
+
+-- Pontuação de uma partida num único comando, agrupado e restrito à
+-- partida: pontos na mão de cada jogador, total da sua dupla (jogador sem
+-- dupla é um time sozinho) e se a mesa está trancada (monte vazio e
+-- nenhuma peça em mão encaixa nas extremidades). Mesmas regras de
+-- EstadoPartida.pontuacao() em conexao/motor.py.
+CREATE OR REPLACE FUNCTION PontuacaoPartida(pIdPartida INT)
+RETURNS TABLE (
+    idUsuario INT,
+    idDupla INT,
+    pontosMao INT,
+    pontosDupla INT,
+    trancado BOOLEAN
+)
+LANGUAGE sql STABLE AS $$
+    WITH Maos AS (
+        SELECT
+            PU.idUsuario,
+            PU.idDupla,
+            COALESCE(SUM(PC.pontosPeca), 0)::INT AS pontosMao,
+            COUNT(PC.idPeca) FILTER (
+                WHERE P.valorExtEsquerda IS NULL AND P.valorExtDireita IS NULL
+                   OR PC.ladoA IN (P.valorExtEsquerda, P.valorExtDireita)
+                   OR PC.ladoB IN (P.valorExtEsquerda, P.valorExtDireita)
+            ) AS jogaveis
+        FROM PartidaUsuario PU
+        JOIN Partida P ON P.idPartida = PU.idPartida
+        LEFT JOIN MaoPartida MP
+               ON MP.idPartida = PU.idPartida
+              AND MP.idUsuario = PU.idUsuario
+              AND MP.statusPeca = 'em_mao'
+        LEFT JOIN Peca PC ON PC.idPeca = MP.idPeca
+        WHERE PU.idPartida = pIdPartida
+        GROUP BY PU.idUsuario, PU.idDupla
+    )
+    SELECT
+        M.idUsuario,
+        M.idDupla,
+        M.pontosMao,
+        (SUM(M.pontosMao) OVER (PARTITION BY COALESCE(M.idDupla, -M.idUsuario)))::INT,
+        SUM(M.jogaveis) OVER () = 0
+            AND NOT EXISTS (
+                SELECT 1 FROM MaoPartida MP
+                WHERE MP.idPartida = pIdPartida AND MP.statusPeca = 'no_monte'
+            )
+    FROM Maos M;
+$$;
+
+-- Pontos de uma partida encerrada, a partir de PontuacaoPartida (um único
+-- comando, qualquer que seja o número de jogadores):
+--   bater            soma das mãos dos adversários (da dupla vencedora,
+--                    quando informada; senão, de quem bateu)
+--   trancado, dupla  menor total entre as outras duplas (da vencedora;
+--                    antes, da dupla que trancou)
+--   trancado         menor total entre os outros jogadores
+-- NULL quando o fim não identifica vencedor.
+CREATE OR REPLACE FUNCTION PontosFimPartida(
+    pIdPartida INT,
+    pModoTermino VARCHAR,
+    pIdJogadorVencedor INT,
+    pIdDuplaVencedora INT,
+    pIdDuplaTrancou INT
+) RETURNS INT
+LANGUAGE sql STABLE AS $$
+    SELECT CASE
+        WHEN pModoTermino = 'bater' AND pIdDuplaVencedora IS NOT NULL THEN
+            COALESCE(SUM(S.pontosMao) FILTER (WHERE S.idDupla IS DISTINCT FROM pIdDuplaVencedora), 0)
+        WHEN pModoTermino = 'bater' AND pIdJogadorVencedor IS NOT NULL THEN
+            COALESCE(SUM(S.pontosMao) FILTER (WHERE S.idUsuario <> pIdJogadorVencedor), 0)
+        WHEN pModoTermino = 'trancado' AND COALESCE(pIdDuplaVencedora, pIdDuplaTrancou) IS NOT NULL THEN
+            COALESCE(MIN(S.pontosDupla) FILTER (
+                WHERE S.idDupla IS DISTINCT FROM COALESCE(pIdDuplaVencedora, pIdDuplaTrancou)), 0)
+        WHEN pModoTermino = 'trancado' AND pIdJogadorVencedor IS NOT NULL THEN
+            COALESCE(MIN(S.pontosMao) FILTER (WHERE S.idUsuario <> pIdJogadorVencedor), 0)
+    END
+    FROM PontuacaoPartida(pIdPartida) S;
+$$;
+
+CREATE OR REPLACE FUNCTION calcularPontosPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
+        NEW.pontosDaPartida := COALESCE(
+            PontosFimPartida(NEW.idPartida, NEW.modoTermino, NEW.idJogadorVencedor,
+                             NEW.idDuplaVencedora, NEW.idDuplaTrancou),
+            NEW.pontosDaPartida);
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recalcula os pontos das partidas finalizadas que ainda têm as peças nas
+-- tabelas quentes (as arquivadas mantêm o valor gravado; registro.py
+-- verificar aponta as que divergem) e, se algum mudou, as estatísticas e
+-- os resumos
+CREATE TEMP TABLE PartidaCorrigida ON COMMIT DROP AS
+SELECT P.idPartida, PontosFimPartida(P.idPartida, P.modoTermino, P.idJogadorVencedor,
+                                     P.idDuplaVencedora, P.idDuplaTrancou) AS pontos
+FROM Partida P
+WHERE P.dataHoraFim IS NOT NULL
+  AND EXISTS (SELECT 1 FROM MaoPartida MP WHERE MP.idPartida = P.idPartida);
+
+DELETE FROM PartidaCorrigida C
+USING Partida P
+WHERE P.idPartida = C.idPartida
+  AND (C.pontos IS NULL OR C.pontos = P.pontosDaPartida);
+
+UPDATE Partida P
+SET pontosDaPartida = C.pontos
+FROM PartidaCorrigida C
+WHERE C.idPartida = P.idPartida;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM PartidaCorrigida) THEN
+        CALL ReconstruirEstatisticas();
+        PERFORM GravarResumoPartida(C.idPartida)
+        FROM PartidaCorrigida C
+        WHERE EXISTS (SELECT 1 FROM ResumoPartida R WHERE R.idPartida = C.idPartida);
+    END IF;
+END;
+$$;
@@ -0,0 +1,14 @@
+-- Séries de mãos até uma pontuação alvo (ver conexao/serie.py).
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+CREATE TABLE IF NOT EXISTS Serie (
+    idSerie INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    pontosAlvo INT NOT NULL DEFAULT 100 CHECK (pontosAlvo > 0),
+    dataHoraInicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    dataHoraFim TIMESTAMP,
+    idJogadorVencedor INT REFERENCES Usuario(idUsuario),
+    idDuplaVencedora INT REFERENCES Dupla(idDupla)
+);
+
+ALTER TABLE Partida ADD COLUMN IF NOT EXISTS idSerie INT REFERENCES Serie(idSerie);
+CREATE INDEX IF NOT EXISTS idxPartidaSerie ON Partida (idSerie, idPartida) WHERE idSerie IS NOT NULL;
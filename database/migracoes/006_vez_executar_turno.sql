@@ -0,0 +1,112 @@
+-- ExecutarTurno passa a conferir se é a vez do jogador.
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+-- Turno completo em um único comando: confere a vez, valida a peça e a
+-- retira da mão, atualiza as extremidades com a linha da Partida travada,
+-- registra a movimentação e informa se o jogador bateu ou se o jogo trancou.
+-- A vez é do assento seguinte ao do último movimento; o primeiro movimento
+-- pode ser de qualquer jogador (quem abre é decidido pelo jogo: 6-6, sorteio
+-- ou a mão anterior da série).
+CREATE OR REPLACE FUNCTION ExecutarTurno(
+    pIdPartida INT,
+    pIdUsuario INT,
+    pIdPeca INT,
+    pExtremidade VARCHAR(10)
+) RETURNS TABLE (
+    valorExtEsquerda INT,
+    valorExtDireita INT,
+    extremidadeUsada VARCHAR(10),
+    ordemAcao INT,
+    bateu BOOLEAN,
+    trancado BOOLEAN
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    vEsq INT;
+    vDir INT;
+    vLadoA INT;
+    vLadoB INT;
+    vExtremidade VARCHAR(10) := pExtremidade;
+    vOrdem INT;
+    vAnterior INT;
+    vVez INT;
+BEGIN
+    SELECT P.valorExtEsquerda, P.valorExtDireita INTO vEsq, vDir
+    FROM Partida P
+    WHERE P.idPartida = pIdPartida AND P.dataHoraFim IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Partida % inexistente ou finalizada', pIdPartida;
+    END IF;
+
+    SELECT M.idUsuario INTO vAnterior
+    FROM Movimentacao M
+    WHERE M.idPartida = pIdPartida
+    ORDER BY M.ordemAcao DESC
+    LIMIT 1;
+
+    IF vAnterior IS NOT NULL THEN
+        SELECT PU.idUsuario INTO vVez
+        FROM PartidaUsuario PU
+        JOIN PartidaUsuario A ON A.idPartida = PU.idPartida AND A.idUsuario = vAnterior
+        WHERE PU.idPartida = pIdPartida
+        ORDER BY PU.posicaoMesa <= A.posicaoMesa, PU.posicaoMesa
+        LIMIT 1;
+
+        IF vVez <> pIdUsuario THEN
+            RAISE EXCEPTION 'Não é a vez do jogador % (vez do jogador %)', pIdUsuario, vVez;
+        END IF;
+    END IF;
+
+    SELECT ladoA, ladoB INTO vLadoA, vLadoB FROM Peca WHERE idPeca = pIdPeca;
+
+    IF vEsq IS NULL AND vDir IS NULL THEN
+        vExtremidade := 'centro';
+        vEsq := vLadoA;
+        vDir := vLadoB;
+    ELSIF vExtremidade = 'esquerda' AND vEsq IN (vLadoA, vLadoB) THEN
+        vEsq := CASE WHEN vLadoA = vEsq THEN vLadoB ELSE vLadoA END;
+    ELSIF vExtremidade = 'direita' AND vDir IN (vLadoA, vLadoB) THEN
+        vDir := CASE WHEN vLadoA = vDir THEN vLadoB ELSE vLadoA END;
+    ELSE
+        RAISE EXCEPTION 'Peça % não encaixa na extremidade %', pIdPeca, pExtremidade;
+    END IF;
+
+    UPDATE MaoPartida
+    SET statusPeca = 'jogada',
+        idUsuario = NULL
+    WHERE idPartida = pIdPartida
+      AND idPeca = pIdPeca
+      AND idUsuario = pIdUsuario
+      AND statusPeca = 'em_mao';
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Peça % não está na mão do jogador %', pIdPeca, pIdUsuario;
+    END IF;
+
+    UPDATE Partida
+    SET valorExtEsquerda = vEsq,
+        valorExtDireita = vDir,
+        proximaOrdemAcao = proximaOrdemAcao + 1
+    WHERE idPartida = pIdPartida
+    RETURNING proximaOrdemAcao - 1 INTO vOrdem;
+
+    INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
+    VALUES (pIdPartida, pIdUsuario, vOrdem, 'jogada', pIdPeca, vExtremidade);
+
+    RETURN QUERY SELECT
+        vEsq,
+        vDir,
+        vExtremidade,
+        vOrdem,
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.idUsuario = pIdUsuario AND MP.statusPeca = 'em_mao'
+        ),
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.statusPeca = 'no_monte'
+        ) AND DetectarJogoTrancado(pIdPartida, vEsq, vDir);
+END;
+$$;
@@ -0,0 +1,36 @@
+-- Estatísticas por usuário travadas em ordem de idUsuario, evitando
+-- deadlock entre partidas simultâneas com jogadores em comum.
+-- Aplicada por init.py em bancos instalados antes desta versão.
+
+-- Vitórias e pontos: somados quando a partida é finalizada, depois que
+-- trigCalcularPontosPartida já calculou pontosDaPartida. As linhas da dupla
+-- são travadas em ordem de idUsuario, a mesma da inclusão dos jogadores
+-- (contarPartidaUsuario), para que transações concorrentes não se esperem
+-- em ordens opostas
+CREATE OR REPLACE FUNCTION acumularEstatisticasPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
+        IF NEW.idJogadorVencedor IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            VALUES (NEW.idJogadorVencedor, 1, NEW.pontosDaPartida)
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+
+        IF NEW.idDuplaVencedora IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            SELECT PU.idUsuario, 1, NEW.pontosDaPartida
+            FROM PartidaUsuario PU
+            WHERE PU.idPartida = NEW.idPartida
+              AND PU.idDupla = NEW.idDuplaVencedora
+            ORDER BY PU.idUsuario
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -22,7 +22,9 @@ CREATE TABLE Partida (
     valorExtEsquerda INT,                      
     valorExtDireita INT,
     dataHoraInicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    dataHoraFim TIMESTAMP
+    dataHoraFim TIMESTAMP,
+    proximaOrdemAcao INT NOT NULL DEFAULT 1,
+    idSerie INT
 );
 
 
@@ -36,6 +38,21 @@ CREATE TABLE Dupla (
 ALTER TABLE Partida ADD FOREIGN KEY (idDuplaVencedora) REFERENCES Dupla(idDupla);
 ALTER TABLE Partida ADD FOREIGN KEY (idDuplaTrancou) REFERENCES Dupla(idDupla);
 
+-- Série de mãos (partidas) até um time chegar a pontosAlvo, com os mesmos
+-- assentos e duplas em todas as mãos (conexao/serie.py). As duplas são
+-- criadas na primeira mão e Dupla.pontuacaoTotal acumula a série.
+CREATE TABLE Serie (
+    idSerie INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    pontosAlvo INT NOT NULL DEFAULT 100 CHECK (pontosAlvo > 0),
+    dataHoraInicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    dataHoraFim TIMESTAMP,
+    idJogadorVencedor INT REFERENCES Usuario(idUsuario),
+    idDuplaVencedora INT REFERENCES Dupla(idDupla)
+);
+
+ALTER TABLE Partida ADD FOREIGN KEY (idSerie) REFERENCES Serie(idSerie);
+CREATE INDEX idxPartidaSerie ON Partida (idSerie, idPartida) WHERE idSerie IS NOT NULL;
+
 CREATE TABLE PartidaUsuario (
     idPartida INT NOT NULL REFERENCES Partida(idPartida) ON DELETE CASCADE,
     idUsuario    INT NOT NULL REFERENCES Usuario(idUsuario) ON DELETE CASCADE,
@@ -64,6 +81,43 @@ CREATE TABLE Movimentacao (
     extremidadeMesa VARCHAR(10) 
 );
 
+-- Índices dos caminhos quentes do jogo
+-- Mão de um jogador: (partida, jogador, status), cobrindo a peça
+CREATE INDEX idxMaoPartidaMao ON MaoPartida (idPartida, idUsuario, statusPeca) INCLUDE (idPeca);
+-- Monte de uma partida (ComprarPecaDoMonte)
+CREATE INDEX idxMaoPartidaMonte ON MaoPartida (idPartida) INCLUDE (idPeca) WHERE statusPeca = 'no_monte';
+-- Movimentos de uma partida em ordem (mesa, replay)
+CREATE INDEX idxMovimentacaoPartidaOrdem ON Movimentacao (idPartida, ordemAcao);
+-- Partidas de um jogador (ranking, filtros por jogador)
+CREATE INDEX idxPartidaUsuarioUsuario ON PartidaUsuario (idUsuario, idPartida);
+
+-- Arquivo das partidas finalizadas: distribuição e movimentos num registro
+-- binário compacto (conexao/registro.py), no lugar das linhas de MaoPartida
+-- e Movimentacao, que ficam só com as partidas em andamento
+CREATE TABLE PartidaArquivada (
+    idPartida INT PRIMARY KEY REFERENCES Partida(idPartida) ON DELETE CASCADE,
+    registro BYTEA NOT NULL,
+    totalMovimentacoes INT NOT NULL,
+    arquivadaEm TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Reserva o próximo ordemAcao da partida pelo contador em Partida, em vez
+-- de calcular MAX(ordemAcao) sobre Movimentacao; a linha da partida fica
+-- travada até o fim da transação, o que também serializa as jogadas
+CREATE OR REPLACE FUNCTION ReservarOrdemAcao(pIdPartida INT)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    vOrdem INT;
+BEGIN
+    UPDATE Partida
+    SET proximaOrdemAcao = proximaOrdemAcao + 1
+    WHERE idPartida = pIdPartida
+    RETURNING proximaOrdemAcao - 1 INTO vOrdem;
+    RETURN vOrdem;
+END;
+$$;
+
 
 INSERT INTO Peca (ladoA, ladoB, pontosPeca) VALUES
 (0,0,0),(0,1,1),(0,2,2),(0,3,3),(0,4,4),(0,5,5),(0,6,6),
@@ -106,21 +160,19 @@ CREATE OR REPLACE FUNCTION DetectarJogoTrancado(
     pValorEsquerda INT,
     pValorDireita INT
 ) RETURNS BOOLEAN
-LANGUAGE plpgsql AS $$
-DECLARE
-    vTrancado BOOLEAN := TRUE;
-    vIdUsuario INT;
-BEGIN
-    FOR vIdUsuario IN
-        SELECT DISTINCT idUsuario FROM MaoPartida WHERE idPartida = pIdPartida AND idUsuario IS NOT NULL
-    LOOP
-        IF VerificarJogadasPossiveis(pIdPartida, vIdUsuario, pValorEsquerda, pValorDireita) THEN
-            vTrancado := FALSE;
-            EXIT;
-        END IF;
-    END LOOP;
-    RETURN vTrancado;
-END;
+LANGUAGE sql STABLE AS $$
+    -- Uma única consulta sobre todas as mãos da partida
+    SELECT NOT EXISTS (
+        SELECT 1
+        FROM MaoPartida mp
+        JOIN Peca p ON mp.idPeca = p.idPeca
+        WHERE mp.idPartida = pIdPartida
+          AND mp.statusPeca = 'em_mao'
+          AND (
+                p.ladoA = pValorEsquerda OR p.ladoB = pValorEsquerda
+             OR p.ladoA = pValorDireita  OR p.ladoB = pValorDireita
+          )
+    );
 $$;
 
 
@@ -151,7 +203,7 @@ BEGIN
       AND idPeca = vIdPeca;
 
     INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada)
-    VALUES (pIdPartida, pIdUsuario, COALESCE((SELECT MAX(ordemAcao) FROM Movimentacao WHERE idPartida = pIdPartida),0)+1, 'comprou', vIdPeca);
+    VALUES (pIdPartida, pIdUsuario, ReservarOrdemAcao(pIdPartida), 'comprou', vIdPeca);
 
     RAISE NOTICE 'Jogador % comprou peça %', pIdUsuario, vIdPeca;
 END;
@@ -186,7 +238,7 @@ BEGIN
           AND idUsuario = pIdUsuario;
 
         INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
-        VALUES (pIdPartida, pIdUsuario, COALESCE((SELECT MAX(ordemAcao) FROM Movimentacao WHERE idPartida = pIdPartida),0)+1, 'jogada', pIdPeca, pExtremidade);
+        VALUES (pIdPartida, pIdUsuario, ReservarOrdemAcao(pIdPartida), 'jogada', pIdPeca, pExtremidade);
 
         RAISE NOTICE 'Jogada válida: peça % por jogador % na %', pIdPeca, pIdUsuario, pExtremidade;
     ELSE
@@ -195,76 +247,203 @@ BEGIN
 END;
 $$;
 
+-- Turno completo em um único comando: confere a vez, valida a peça e a
+-- retira da mão, atualiza as extremidades com a linha da Partida travada,
+-- registra a movimentação e informa se o jogador bateu ou se o jogo trancou.
+-- A vez é do assento seguinte ao do último movimento; o primeiro movimento
+-- pode ser de qualquer jogador (quem abre é decidido pelo jogo: 6-6, sorteio
+-- ou a mão anterior da série).
+CREATE OR REPLACE FUNCTION ExecutarTurno(
+    pIdPartida INT,
+    pIdUsuario INT,
+    pIdPeca INT,
+    pExtremidade VARCHAR(10)
+) RETURNS TABLE (
+    valorExtEsquerda INT,
+    valorExtDireita INT,
+    extremidadeUsada VARCHAR(10),
+    ordemAcao INT,
+    bateu BOOLEAN,
+    trancado BOOLEAN
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    vEsq INT;
+    vDir INT;
+    vLadoA INT;
+    vLadoB INT;
+    vExtremidade VARCHAR(10) := pExtremidade;
+    vOrdem INT;
+    vAnterior INT;
+    vVez INT;
+BEGIN
+    SELECT P.valorExtEsquerda, P.valorExtDireita INTO vEsq, vDir
+    FROM Partida P
+    WHERE P.idPartida = pIdPartida AND P.dataHoraFim IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Partida % inexistente ou finalizada', pIdPartida;
+    END IF;
+
+    SELECT M.idUsuario INTO vAnterior
+    FROM Movimentacao M
+    WHERE M.idPartida = pIdPartida
+    ORDER BY M.ordemAcao DESC
+    LIMIT 1;
+
+    IF vAnterior IS NOT NULL THEN
+        SELECT PU.idUsuario INTO vVez
+        FROM PartidaUsuario PU
+        JOIN PartidaUsuario A ON A.idPartida = PU.idPartida AND A.idUsuario = vAnterior
+        WHERE PU.idPartida = pIdPartida
+        ORDER BY PU.posicaoMesa <= A.posicaoMesa, PU.posicaoMesa
+        LIMIT 1;
+
+        IF vVez <> pIdUsuario THEN
+            RAISE EXCEPTION 'Não é a vez do jogador % (vez do jogador %)', pIdUsuario, vVez;
+        END IF;
+    END IF;
+
+    SELECT ladoA, ladoB INTO vLadoA, vLadoB FROM Peca WHERE idPeca = pIdPeca;
+
+    IF vEsq IS NULL AND vDir IS NULL THEN
+        vExtremidade := 'centro';
+        vEsq := vLadoA;
+        vDir := vLadoB;
+    ELSIF vExtremidade = 'esquerda' AND vEsq IN (vLadoA, vLadoB) THEN
+        vEsq := CASE WHEN vLadoA = vEsq THEN vLadoB ELSE vLadoA END;
+    ELSIF vExtremidade = 'direita' AND vDir IN (vLadoA, vLadoB) THEN
+        vDir := CASE WHEN vLadoA = vDir THEN vLadoB ELSE vLadoA END;
+    ELSE
+        RAISE EXCEPTION 'Peça % não encaixa na extremidade %', pIdPeca, pExtremidade;
+    END IF;
+
+    UPDATE MaoPartida
+    SET statusPeca = 'jogada',
+        idUsuario = NULL
+    WHERE idPartida = pIdPartida
+      AND idPeca = pIdPeca
+      AND idUsuario = pIdUsuario
+      AND statusPeca = 'em_mao';
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Peça % não está na mão do jogador %', pIdPeca, pIdUsuario;
+    END IF;
+
+    UPDATE Partida
+    SET valorExtEsquerda = vEsq,
+        valorExtDireita = vDir,
+        proximaOrdemAcao = proximaOrdemAcao + 1
+    WHERE idPartida = pIdPartida
+    RETURNING proximaOrdemAcao - 1 INTO vOrdem;
+
+    INSERT INTO Movimentacao (idPartida, idUsuario, ordemAcao, tipoAcao, idPecaJogada, extremidadeMesa)
+    VALUES (pIdPartida, pIdUsuario, vOrdem, 'jogada', pIdPeca, vExtremidade);
+
+    RETURN QUERY SELECT
+        vEsq,
+        vDir,
+        vExtremidade,
+        vOrdem,
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.idUsuario = pIdUsuario AND MP.statusPeca = 'em_mao'
+        ),
+        NOT EXISTS (
+            SELECT 1 FROM MaoPartida MP
+            WHERE MP.idPartida = pIdPartida AND MP.statusPeca = 'no_monte'
+        ) AND DetectarJogoTrancado(pIdPartida, vEsq, vDir);
+END;
+$$;
+
+-- Pontuação de uma partida num único comando, agrupado e restrito à
+-- partida: pontos na mão de cada jogador, total da sua dupla (jogador sem
+-- dupla é um time sozinho) e se a mesa está trancada (monte vazio e
+-- nenhuma peça em mão encaixa nas extremidades). Mesmas regras de
+-- EstadoPartida.pontuacao() em conexao/motor.py.
+CREATE OR REPLACE FUNCTION PontuacaoPartida(pIdPartida INT)
+RETURNS TABLE (
+    idUsuario INT,
+    idDupla INT,
+    pontosMao INT,
+    pontosDupla INT,
+    trancado BOOLEAN
+)
+LANGUAGE sql STABLE AS $$
+    WITH Maos AS (
+        SELECT
+            PU.idUsuario,
+            PU.idDupla,
+            COALESCE(SUM(PC.pontosPeca), 0)::INT AS pontosMao,
+            COUNT(PC.idPeca) FILTER (
+                WHERE P.valorExtEsquerda IS NULL AND P.valorExtDireita IS NULL
+                   OR PC.ladoA IN (P.valorExtEsquerda, P.valorExtDireita)
+                   OR PC.ladoB IN (P.valorExtEsquerda, P.valorExtDireita)
+            ) AS jogaveis
+        FROM PartidaUsuario PU
+        JOIN Partida P ON P.idPartida = PU.idPartida
+        LEFT JOIN MaoPartida MP
+               ON MP.idPartida = PU.idPartida
+              AND MP.idUsuario = PU.idUsuario
+              AND MP.statusPeca = 'em_mao'
+        LEFT JOIN Peca PC ON PC.idPeca = MP.idPeca
+        WHERE PU.idPartida = pIdPartida
+        GROUP BY PU.idUsuario, PU.idDupla
+    )
+    SELECT
+        M.idUsuario,
+        M.idDupla,
+        M.pontosMao,
+        (SUM(M.pontosMao) OVER (PARTITION BY COALESCE(M.idDupla, -M.idUsuario)))::INT,
+        SUM(M.jogaveis) OVER () = 0
+            AND NOT EXISTS (
+                SELECT 1 FROM MaoPartida MP
+                WHERE MP.idPartida = pIdPartida AND MP.statusPeca = 'no_monte'
+            )
+    FROM Maos M;
+$$;
+
+-- Pontos de uma partida encerrada, a partir de PontuacaoPartida (um único
+-- comando, qualquer que seja o número de jogadores):
+--   bater            soma das mãos dos adversários (da dupla vencedora,
+--                    quando informada; senão, de quem bateu)
+--   trancado, dupla  menor total entre as outras duplas (da vencedora;
+--                    antes, da dupla que trancou)
+--   trancado         menor total entre os outros jogadores
+-- NULL quando o fim não identifica vencedor.
+CREATE OR REPLACE FUNCTION PontosFimPartida(
+    pIdPartida INT,
+    pModoTermino VARCHAR,
+    pIdJogadorVencedor INT,
+    pIdDuplaVencedora INT,
+    pIdDuplaTrancou INT
+) RETURNS INT
+LANGUAGE sql STABLE AS $$
+    SELECT CASE
+        WHEN pModoTermino = 'bater' AND pIdDuplaVencedora IS NOT NULL THEN
+            COALESCE(SUM(S.pontosMao) FILTER (WHERE S.idDupla IS DISTINCT FROM pIdDuplaVencedora), 0)
+        WHEN pModoTermino = 'bater' AND pIdJogadorVencedor IS NOT NULL THEN
+            COALESCE(SUM(S.pontosMao) FILTER (WHERE S.idUsuario <> pIdJogadorVencedor), 0)
+        WHEN pModoTermino = 'trancado' AND COALESCE(pIdDuplaVencedora, pIdDuplaTrancou) IS NOT NULL THEN
+            COALESCE(MIN(S.pontosDupla) FILTER (
+                WHERE S.idDupla IS DISTINCT FROM COALESCE(pIdDuplaVencedora, pIdDuplaTrancou)), 0)
+        WHEN pModoTermino = 'trancado' AND pIdJogadorVencedor IS NOT NULL THEN
+            COALESCE(MIN(S.pontosMao) FILTER (WHERE S.idUsuario <> pIdJogadorVencedor), 0)
+    END
+    FROM PontuacaoPartida(pIdPartida) S;
+$$;
+
 CREATE OR REPLACE FUNCTION calcularPontosPartida()
 RETURNS TRIGGER AS $$
-DECLARE
-    totalPontosAdversarios INTEGER;
-    idVencedor INTEGER;
-    idDuplaVencedora INTEGER;
 BEGIN
     IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
-        IF NEW.modoTermino = 'bater' THEN
-            IF NEW.idDuplaVencedora IS NOT NULL THEN
-                SELECT COALESCE(SUM(MP.pontosPeca), 0)
-                INTO totalPontosAdversarios
-                FROM MaoPartida MP
-                JOIN PartidaUsuario PU ON MP.idUsuario = PU.idUsuario
-                WHERE MP.idPartida = NEW.idPartida
-                  AND MP.statusPeca = 'em_mao'
-                  AND PU.idDupla != NEW.idDuplaVencedora;
-                  
-                NEW.pontosDaPartida := totalPontosAdversarios;
-                
-            ELSIF NEW.idJogadorVencedor IS NOT NULL THEN
-                SELECT COALESCE(SUM(MP.pontosPeca), 0)
-                INTO totalPontosAdversarios
-                FROM MaoPartida MP
-                WHERE MP.idPartida = NEW.idPartida
-                  AND MP.statusPeca = 'em_mao'
-                  AND MP.idUsuario != NEW.idJogadorVencedor;
-                  
-                NEW.pontosDaPartida := totalPontosAdversarios;
-            END IF;
-            
-        ELSIF NEW.modoTermino = 'trancado' THEN
-            IF NEW.idDuplaTrancou IS NOT NULL THEN
-                WITH PontosDuplas AS (
-                    SELECT 
-                        PU.idDupla,
-                        SUM(MP.pontosPeca) as totalPontos
-                    FROM MaoPartida MP
-                    JOIN PartidaUsuario PU ON MP.idUsuario = PU.idUsuario
-                    WHERE MP.idPartida = NEW.idPartida
-                      AND MP.statusPeca = 'em_mao'
-                    GROUP BY PU.idDupla
-                )
-                SELECT MIN(totalPontos)
-                INTO totalPontosAdversarios
-                FROM PontosDuplas
-                WHERE idDupla != NEW.idDuplaTrancou;
-                
-                NEW.pontosDaPartida := COALESCE(totalPontosAdversarios, 0);
-                
-            ELSIF NEW.idJogadorVencedor IS NOT NULL THEN
-                WITH PontosJogadores AS (
-                    SELECT 
-                        MP.idUsuario,
-                        SUM(MP.pontosPeca) as totalPontos
-                    FROM MaoPartida MP
-                    WHERE MP.idPartida = NEW.idPartida
-                      AND MP.statusPeca = 'em_mao'
-                    GROUP BY MP.idUsuario
-                )
-                SELECT MIN(totalPontos)
-                INTO totalPontosAdversarios
-                FROM PontosJogadores
-                WHERE idUsuario != NEW.idJogadorVencedor;
-                
-                NEW.pontosDaPartida := COALESCE(totalPontosAdversarios, 0);
-            END IF;
-        END IF;
+        NEW.pontosDaPartida := COALESCE(
+            PontosFimPartida(NEW.idPartida, NEW.modoTermino, NEW.idJogadorVencedor,
+                             NEW.idDuplaVencedora, NEW.idDuplaTrancou),
+            NEW.pontosDaPartida);
     END IF;
-    
+
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
@@ -368,10 +547,17 @@ SELECT
         WHERE PU2.idPartida = P.idPartida
     ) as duplasParticipantes,
     
-    (
-        SELECT COUNT(*) 
-        FROM Movimentacao M 
-        WHERE M.idPartida = P.idPartida
+    COALESCE(
+        (
+            SELECT A.totalMovimentacoes
+            FROM PartidaArquivada A
+            WHERE A.idPartida = P.idPartida
+        ),
+        (
+            SELECT COUNT(*) 
+            FROM Movimentacao M 
+            WHERE M.idPartida = P.idPartida
+        )
     ) as totalMovimentacoes,
     
     CASE 
@@ -385,3 +571,286 @@ LEFT JOIN Usuario UV ON P.idJogadorVencedor = UV.idUsuario
 LEFT JOIN Dupla D ON P.idDuplaVencedora = D.idDupla
 LEFT JOIN Dupla DT ON P.idDuplaTrancou = DT.idDupla
 ORDER BY P.dataHoraInicio DESC;
+
+-- Estatísticas por usuário mantidas incrementalmente, para o ranking não
+-- recalcular a view RankingUsuarios a cada consulta
+CREATE TABLE EstatisticaUsuario (
+    idUsuario INT PRIMARY KEY REFERENCES Usuario(idUsuario) ON DELETE CASCADE,
+    partidasJogadas INT NOT NULL DEFAULT 0,
+    partidasVencidas INT NOT NULL DEFAULT 0,
+    totalPontos INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX idxEstatisticaRanking
+    ON EstatisticaUsuario (partidasVencidas DESC, totalPontos DESC, idUsuario DESC);
+
+CREATE OR REPLACE FUNCTION criarEstatisticaUsuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO EstatisticaUsuario (idUsuario) VALUES (NEW.idUsuario)
+    ON CONFLICT (idUsuario) DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigCriarEstatisticaUsuario
+    AFTER INSERT ON Usuario
+    FOR EACH ROW
+    EXECUTE FUNCTION criarEstatisticaUsuario();
+
+-- Partidas jogadas: conta a entrada (e a saída) do jogador na partida,
+-- como faz a view
+CREATE OR REPLACE FUNCTION contarPartidaUsuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO EstatisticaUsuario (idUsuario, partidasJogadas) VALUES (NEW.idUsuario, 1)
+        ON CONFLICT (idUsuario) DO UPDATE
+        SET partidasJogadas = EstatisticaUsuario.partidasJogadas + 1;
+        RETURN NEW;
+    END IF;
+
+    UPDATE EstatisticaUsuario
+    SET partidasJogadas = partidasJogadas - 1
+    WHERE idUsuario = OLD.idUsuario;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigContarPartidaUsuario
+    AFTER INSERT OR DELETE ON PartidaUsuario
+    FOR EACH ROW
+    EXECUTE FUNCTION contarPartidaUsuario();
+
+-- Vitórias e pontos: somados quando a partida é finalizada, depois que
+-- trigCalcularPontosPartida já calculou pontosDaPartida. As linhas da dupla
+-- são travadas em ordem de idUsuario, a mesma da inclusão dos jogadores
+-- (contarPartidaUsuario), para que transações concorrentes não se esperem
+-- em ordens opostas
+CREATE OR REPLACE FUNCTION acumularEstatisticasPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
+        IF NEW.idJogadorVencedor IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            VALUES (NEW.idJogadorVencedor, 1, NEW.pontosDaPartida)
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+
+        IF NEW.idDuplaVencedora IS NOT NULL THEN
+            INSERT INTO EstatisticaUsuario (idUsuario, partidasVencidas, totalPontos)
+            SELECT PU.idUsuario, 1, NEW.pontosDaPartida
+            FROM PartidaUsuario PU
+            WHERE PU.idPartida = NEW.idPartida
+              AND PU.idDupla = NEW.idDuplaVencedora
+            ORDER BY PU.idUsuario
+            ON CONFLICT (idUsuario) DO UPDATE
+            SET partidasVencidas = EstatisticaUsuario.partidasVencidas + 1,
+                totalPontos = EstatisticaUsuario.totalPontos + EXCLUDED.totalPontos;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigAcumularEstatisticasPartida
+    AFTER UPDATE ON Partida
+    FOR EACH ROW
+    EXECUTE FUNCTION acumularEstatisticasPartida();
+
+-- Recalcula as estatísticas a partir da view RankingUsuarios
+CREATE OR REPLACE PROCEDURE ReconstruirEstatisticas()
+LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE EstatisticaUsuario IN EXCLUSIVE MODE;
+    DELETE FROM EstatisticaUsuario;
+    INSERT INTO EstatisticaUsuario (idUsuario, partidasJogadas, partidasVencidas, totalPontos)
+    SELECT idUsuario, totalPartidasJogadas, partidasVencidas, totalPontosGanhos
+    FROM RankingUsuarios;
+END;
+$$;
+
+CREATE OR REPLACE VIEW RankingEstatisticas AS
+SELECT
+    E.idUsuario,
+    U.nome,
+    E.partidasJogadas AS totalPartidasJogadas,
+    E.partidasVencidas,
+    ROUND(
+        CASE WHEN E.partidasJogadas = 0 THEN 0
+             ELSE E.partidasVencidas * 100.0 / E.partidasJogadas END, 2
+    ) AS percentualVitorias,
+    E.totalPontos AS totalPontosGanhos,
+    ROUND(
+        CASE WHEN E.partidasJogadas = 0 THEN 0
+             ELSE E.totalPontos * 1.0 / E.partidasJogadas END, 2
+    ) AS mediaPontosPorPartida
+FROM EstatisticaUsuario E
+JOIN Usuario U ON U.idUsuario = E.idUsuario;
+
+-- Resumo compacto de cada partida finalizada, gravado uma única vez por
+-- finalizar_partida, para o histórico não executar as subconsultas
+-- correlacionadas de PartidasDetalhadas a cada leitura
+CREATE TABLE ResumoPartida (
+    idPartida INT PRIMARY KEY REFERENCES Partida(idPartida) ON DELETE CASCADE,
+    dataHoraInicio TIMESTAMP NOT NULL,
+    dataHoraFim TIMESTAMP,
+    modoTermino VARCHAR(20),
+    pontosDaPartida INT NOT NULL DEFAULT 0,
+    tipoVitoria VARCHAR(20) NOT NULL,
+    nomeVencedorIndividual VARCHAR(255),
+    nomeDuplaVencedora VARCHAR(100),
+    nomeDuplaTrancou VARCHAR(100),
+    jogadoresParticipantes TEXT,
+    duplasParticipantes TEXT,
+    totalMovimentacoes INT NOT NULL DEFAULT 0,
+    duracaoMinutos NUMERIC
+);
+
+-- Paginação por chave (keyset) do mais recente para o mais antigo
+CREATE INDEX idxResumoPartidaInicio ON ResumoPartida (dataHoraInicio DESC, idPartida DESC);
+
+-- Grava (ou regrava) o resumo de uma partida; quem já sabe o total de
+-- movimentações pode informá-lo e evitar a contagem
+CREATE OR REPLACE FUNCTION GravarResumoPartida(
+    pIdPartida INT,
+    pTotalMovimentacoes INT DEFAULT NULL
+) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO ResumoPartida (
+        idPartida, dataHoraInicio, dataHoraFim, modoTermino, pontosDaPartida, tipoVitoria,
+        nomeVencedorIndividual, nomeDuplaVencedora, nomeDuplaTrancou,
+        jogadoresParticipantes, duplasParticipantes, totalMovimentacoes, duracaoMinutos
+    )
+    SELECT
+        PD.idPartida, COALESCE(PD.dataHoraInicio, PD.dataHoraFim), PD.dataHoraFim, PD.modoTermino,
+        PD.pontosDaPartida, PD.tipoVitoria,
+        PD.nomeVencedorIndividual, PD.nomeDuplaVencedora, PD.nomeDuplaTrancou,
+        PD.jogadoresParticipantes, PD.duplasParticipantes,
+        COALESCE(pTotalMovimentacoes, PD.totalMovimentacoes), PD.duracaoMinutos
+    FROM PartidasDetalhadas PD
+    WHERE PD.idPartida = pIdPartida
+    ON CONFLICT (idPartida) DO UPDATE SET
+        dataHoraInicio = EXCLUDED.dataHoraInicio,
+        dataHoraFim = EXCLUDED.dataHoraFim,
+        modoTermino = EXCLUDED.modoTermino,
+        pontosDaPartida = EXCLUDED.pontosDaPartida,
+        tipoVitoria = EXCLUDED.tipoVitoria,
+        nomeVencedorIndividual = EXCLUDED.nomeVencedorIndividual,
+        nomeDuplaVencedora = EXCLUDED.nomeDuplaVencedora,
+        nomeDuplaTrancou = EXCLUDED.nomeDuplaTrancou,
+        jogadoresParticipantes = EXCLUDED.jogadoresParticipantes,
+        duplasParticipantes = EXCLUDED.duplasParticipantes,
+        totalMovimentacoes = EXCLUDED.totalMovimentacoes,
+        duracaoMinutos = EXCLUDED.duracaoMinutos;
+END;
+$$;
+
+-- Preenche os resumos que faltam (partidas finalizadas antes desta tabela),
+-- um lote por chamada; retorna quantas partidas foram resumidas
+CREATE OR REPLACE FUNCTION PreencherResumos(pLote INT DEFAULT 1000)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    vIdPartida INT;
+    vTotal INT := 0;
+BEGIN
+    FOR vIdPartida IN
+        SELECT P.idPartida FROM Partida P
+        WHERE P.dataHoraFim IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM ResumoPartida R WHERE R.idPartida = P.idPartida)
+        ORDER BY P.idPartida
+        LIMIT pLote
+    LOOP
+        PERFORM GravarResumoPartida(vIdPartida);
+        vTotal := vTotal + 1;
+    END LOOP;
+    RETURN vTotal;
+END;
+$$;
+
+-- Eventos para espectadores (conexao/espectador.py): cada comando que
+-- grava movimentos publica, por partida, um NOTIFY no canal partida_<id>
+-- com os movimentos novos. O NOTIFY só é entregue no COMMIT, na ordem
+-- das transações; um evento grande demais vira um pedido de ressincronizar.
+-- Sem espectadores, os eventos podem ser desligados por banco:
+--   ALTER DATABASE domino_db SET capivara.eventos = 'off';
+CREATE OR REPLACE FUNCTION notificarMovimentos()
+RETURNS TRIGGER AS $$
+DECLARE
+    vEvento RECORD;
+    vPayload TEXT;
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    FOR vEvento IN
+        SELECT idPartida,
+               json_agg(json_build_array(ordemAcao, idUsuario, tipoAcao, idPecaJogada, extremidadeMesa)
+                        ORDER BY ordemAcao) AS movimentos
+        FROM novos
+        GROUP BY idPartida
+    LOOP
+        vPayload := json_build_object('movimentos', vEvento.movimentos)::TEXT;
+        IF octet_length(vPayload) > 7900 THEN
+            vPayload := '{"ressincronizar": true}';
+        END IF;
+        PERFORM pg_notify('partida_' || vEvento.idPartida, vPayload);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigNotificarMovimentos
+    AFTER INSERT ON Movimentacao
+    REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notificarMovimentos();
+
+-- Peças distribuídas (de novo): o espectador recarrega a partida
+CREATE OR REPLACE FUNCTION notificarDistribuicao()
+RETURNS TRIGGER AS $$
+DECLARE
+    vIdPartida INT;
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    FOR vIdPartida IN SELECT DISTINCT idPartida FROM novas LOOP
+        PERFORM pg_notify('partida_' || vIdPartida, '{"ressincronizar": true}');
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigNotificarDistribuicao
+    AFTER INSERT ON MaoPartida
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notificarDistribuicao();
+
+-- Fim da partida, depois que trigCalcularPontosPartida calculou os pontos
+CREATE OR REPLACE FUNCTION notificarFimPartida()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('capivara.eventos', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('partida_' || NEW.idPartida, json_build_object('fim', json_build_object(
+        'modoTermino', NEW.modoTermino,
+        'idJogadorVencedor', NEW.idJogadorVencedor,
+        'idDuplaVencedora', NEW.idDuplaVencedora,
+        'pontosDaPartida', NEW.pontosDaPartida
+    ))::TEXT);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigNotificarFimPartida
+    AFTER UPDATE OF dataHoraFim ON Partida
+    FOR EACH ROW
+    WHEN (OLD.dataHoraFim IS NULL AND NEW.dataHoraFim IS NOT NULL)
+    EXECUTE FUNCTION notificarFimPartida();
@@ -0,0 +1,306 @@
+-- Esquema do banco embutido (SQLite), equivalente a database/script.sql com
+-- todas as migrações. As funções, procedimentos e a lógica dos gatilhos do
+-- Postgres são funções Python registradas em cada conexão
+-- (conexao/embutido.py), com os mesmos nomes; os gatilhos daqui só as
+-- chamam. Os eventos para espectadores (NOTIFY) não existem no embutido.
+--
+-- Colunas em minúsculas, como o Postgres guarda os identificadores sem
+-- aspas, para que `SELECT *` devolva os mesmos nomes nos dois bancos.
+
+CREATE TABLE Usuario (
+    idusuario     INTEGER PRIMARY KEY,
+    nome          VARCHAR(255) NOT NULL,
+    datacadastro  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE Peca (
+    idpeca     INTEGER PRIMARY KEY,
+    ladoa      INT NOT NULL CHECK (ladoa BETWEEN 0 AND 6),
+    ladob      INT NOT NULL CHECK (ladob BETWEEN 0 AND 6),
+    pontospeca INT NOT NULL
+);
+
+CREATE TABLE Partida (
+    idpartida INTEGER PRIMARY KEY,
+    idjogadoriniciou INT,
+    idjogadorvencedor INT,
+    idduplavencedora INT REFERENCES Dupla(iddupla),
+    idduplatrancou INT REFERENCES Dupla(iddupla),
+    pontosdapartida INT NOT NULL DEFAULT 0,
+    modotermino VARCHAR(20),
+    valorextesquerda INT,
+    valorextdireita INT,
+    datahorainicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    datahorafim TIMESTAMP,
+    proximaordemacao INT NOT NULL DEFAULT 1,
+    idserie INT REFERENCES Serie(idserie)
+);
+
+CREATE TABLE Dupla (
+    iddupla INTEGER PRIMARY KEY,
+    idpartida INT NOT NULL REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    nomedupla VARCHAR(100) NOT NULL,
+    pontuacaototal INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE Serie (
+    idserie INTEGER PRIMARY KEY,
+    pontosalvo INT NOT NULL DEFAULT 100 CHECK (pontosalvo > 0),
+    datahorainicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    datahorafim TIMESTAMP,
+    idjogadorvencedor INT REFERENCES Usuario(idusuario),
+    idduplavencedora INT REFERENCES Dupla(iddupla)
+);
+
+CREATE INDEX idxPartidaSerie ON Partida (idserie, idpartida) WHERE idserie IS NOT NULL;
+
+CREATE TABLE PartidaUsuario (
+    idpartida INT NOT NULL REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    idusuario INT NOT NULL REFERENCES Usuario(idusuario) ON DELETE CASCADE,
+    iddupla INT REFERENCES Dupla(iddupla),
+    posicaomesa INT NOT NULL,
+    PRIMARY KEY (idpartida, idusuario)
+);
+
+CREATE TABLE MaoPartida (
+    idmaopartida INTEGER PRIMARY KEY,
+    idpartida INT NOT NULL REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    idpeca INT NOT NULL REFERENCES Peca(idpeca),
+    idusuario INT,
+    statuspeca VARCHAR(20) NOT NULL CHECK (statuspeca IN ('no_monte','em_mao','jogada')),
+    CONSTRAINT uniquePecaPorPartida UNIQUE (idpartida, idpeca)
+);
+
+CREATE TABLE Movimentacao (
+    idmovimentacao INTEGER PRIMARY KEY,
+    idpartida INT NOT NULL REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    idusuario INT NOT NULL REFERENCES Usuario(idusuario),
+    datahoraacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ordemacao INT NOT NULL,
+    tipoacao VARCHAR(20) NOT NULL,
+    idpecajogada INT REFERENCES Peca(idpeca),
+    extremidademesa VARCHAR(10)
+);
+
+-- Índices dos caminhos quentes do jogo (sem INCLUDE: a peça entra na chave)
+CREATE INDEX idxMaoPartidaMao ON MaoPartida (idpartida, idusuario, statuspeca, idpeca);
+CREATE INDEX idxMaoPartidaMonte ON MaoPartida (idpartida, idpeca) WHERE statuspeca = 'no_monte';
+CREATE INDEX idxMovimentacaoPartidaOrdem ON Movimentacao (idpartida, ordemacao);
+CREATE INDEX idxPartidaUsuarioUsuario ON PartidaUsuario (idusuario, idpartida);
+
+CREATE TABLE PartidaArquivada (
+    idpartida INT PRIMARY KEY REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    registro BLOB NOT NULL,
+    totalmovimentacoes INT NOT NULL,
+    arquivadaem TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO Peca (ladoa, ladob, pontospeca) VALUES
+(0,0,0),(0,1,1),(0,2,2),(0,3,3),(0,4,4),(0,5,5),(0,6,6),
+(1,1,2),(1,2,3),(1,3,4),(1,4,5),(1,5,6),(1,6,7),
+(2,2,4),(2,3,5),(2,4,6),(2,5,7),(2,6,8),
+(3,3,6),(3,4,7),(3,5,8),(3,6,9),
+(4,4,8),(4,5,9),(4,6,10),
+(5,5,10),(5,6,11),
+(6,6,12);
+
+CREATE VIEW RankingUsuarios AS
+WITH PartidasVencidas AS (
+    SELECT
+        P.idjogadorvencedor AS idusuario,
+        COUNT(*) AS partidasvencidas,
+        SUM(P.pontosdapartida) AS totalpontos
+    FROM Partida P
+    WHERE P.idjogadorvencedor IS NOT NULL
+    GROUP BY P.idjogadorvencedor
+
+    UNION ALL
+
+    SELECT
+        PU.idusuario,
+        COUNT(*) AS partidasvencidas,
+        SUM(P.pontosdapartida) AS totalpontos
+    FROM Partida P
+    JOIN Dupla D ON P.idduplavencedora = D.iddupla
+    JOIN PartidaUsuario PU ON D.iddupla = PU.iddupla AND P.idpartida = PU.idpartida
+    WHERE P.idduplavencedora IS NOT NULL
+    GROUP BY PU.idusuario
+),
+TotalPartidas AS (
+    SELECT
+        PU.idusuario,
+        COUNT(DISTINCT PU.idpartida) AS totalpartidasjogadas
+    FROM PartidaUsuario PU
+    GROUP BY PU.idusuario
+)
+SELECT
+    U.idusuario,
+    U.nome,
+    COALESCE(TP.totalpartidasjogadas, 0) AS totalpartidasjogadas,
+    COALESCE(PV.partidasvencidas, 0) AS partidasvencidas,
+    ROUND(
+        CASE
+            WHEN COALESCE(TP.totalpartidasjogadas, 0) = 0 THEN 0
+            ELSE (COALESCE(PV.partidasvencidas, 0) * 100.0 / TP.totalpartidasjogadas)
+        END, 2
+    ) AS percentualvitorias,
+    COALESCE(PV.totalpontos, 0) AS totalpontosganhos,
+    ROUND(
+        CASE
+            WHEN COALESCE(TP.totalpartidasjogadas, 0) = 0 THEN 0
+            ELSE (COALESCE(PV.totalpontos, 0) * 1.0 / TP.totalpartidasjogadas)
+        END, 2
+    ) AS mediapontosporpartida
+FROM Usuario U
+LEFT JOIN TotalPartidas TP ON U.idusuario = TP.idusuario
+LEFT JOIN (
+    SELECT
+        idusuario,
+        SUM(partidasvencidas) AS partidasvencidas,
+        SUM(totalpontos) AS totalpontos
+    FROM PartidasVencidas
+    GROUP BY idusuario
+) PV ON U.idusuario = PV.idusuario
+ORDER BY partidasvencidas DESC, totalpontosganhos DESC;
+
+-- STRING_AGG vira group_concat sobre uma subconsulta ordenada e a duração
+-- sai de julianday (dias) em minutos
+CREATE VIEW PartidasDetalhadas AS
+SELECT
+    P.idpartida,
+    P.datahorainicio,
+    P.datahorafim,
+    P.modotermino,
+    P.pontosdapartida,
+
+    CASE
+        WHEN P.idjogadorvencedor IS NOT NULL THEN 'Jogador Individual'
+        WHEN P.idduplavencedora IS NOT NULL THEN 'Dupla'
+        ELSE 'Sem vencedor'
+    END AS tipovitoria,
+
+    UV.nome AS nomevencedorindividual,
+
+    D.nomedupla AS nomeduplavencedora,
+
+    DT.nomedupla AS nomeduplatrancou,
+
+    (
+        SELECT group_concat(J.nome, ', ') FROM (
+            SELECT U.nome
+            FROM PartidaUsuario PU
+            JOIN Usuario U ON PU.idusuario = U.idusuario
+            WHERE PU.idpartida = P.idpartida
+            ORDER BY PU.posicaomesa
+        ) J
+    ) AS jogadoresparticipantes,
+
+    (
+        SELECT group_concat(N.nomedupla, ', ') FROM (
+            SELECT DISTINCT D2.nomedupla
+            FROM PartidaUsuario PU2
+            JOIN Dupla D2 ON PU2.iddupla = D2.iddupla
+            WHERE PU2.idpartida = P.idpartida
+            ORDER BY D2.nomedupla
+        ) N
+    ) AS duplasparticipantes,
+
+    COALESCE(
+        (
+            SELECT A.totalmovimentacoes
+            FROM PartidaArquivada A
+            WHERE A.idpartida = P.idpartida
+        ),
+        (
+            SELECT COUNT(*)
+            FROM Movimentacao M
+            WHERE M.idpartida = P.idpartida
+        )
+    ) AS totalmovimentacoes,
+
+    CASE
+        WHEN P.datahorafim IS NOT NULL THEN
+            (julianday(P.datahorafim) - julianday(P.datahorainicio)) * 1440
+        ELSE NULL
+    END AS duracaominutos
+
+FROM Partida P
+LEFT JOIN Usuario UV ON P.idjogadorvencedor = UV.idusuario
+LEFT JOIN Dupla D ON P.idduplavencedora = D.iddupla
+LEFT JOIN Dupla DT ON P.idduplatrancou = DT.iddupla
+ORDER BY P.datahorainicio DESC;
+
+CREATE TABLE EstatisticaUsuario (
+    idusuario INT PRIMARY KEY REFERENCES Usuario(idusuario) ON DELETE CASCADE,
+    partidasjogadas INT NOT NULL DEFAULT 0,
+    partidasvencidas INT NOT NULL DEFAULT 0,
+    totalpontos INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX idxEstatisticaRanking
+    ON EstatisticaUsuario (partidasvencidas DESC, totalpontos DESC, idusuario DESC);
+
+CREATE VIEW RankingEstatisticas AS
+SELECT
+    E.idusuario,
+    U.nome,
+    E.partidasjogadas AS totalpartidasjogadas,
+    E.partidasvencidas,
+    ROUND(
+        CASE WHEN E.partidasjogadas = 0 THEN 0
+             ELSE E.partidasvencidas * 100.0 / E.partidasjogadas END, 2
+    ) AS percentualvitorias,
+    E.totalpontos AS totalpontosganhos,
+    ROUND(
+        CASE WHEN E.partidasjogadas = 0 THEN 0
+             ELSE E.totalpontos * 1.0 / E.partidasjogadas END, 2
+    ) AS mediapontosporpartida
+FROM EstatisticaUsuario E
+JOIN Usuario U ON U.idusuario = E.idusuario;
+
+CREATE TABLE ResumoPartida (
+    idpartida INT PRIMARY KEY REFERENCES Partida(idpartida) ON DELETE CASCADE,
+    datahorainicio TIMESTAMP NOT NULL,
+    datahorafim TIMESTAMP,
+    modotermino VARCHAR(20),
+    pontosdapartida INT NOT NULL DEFAULT 0,
+    tipovitoria VARCHAR(20) NOT NULL,
+    nomevencedorindividual VARCHAR(255),
+    nomeduplavencedora VARCHAR(100),
+    nomeduplatrancou VARCHAR(100),
+    jogadoresparticipantes TEXT,
+    duplasparticipantes TEXT,
+    totalmovimentacoes INT NOT NULL DEFAULT 0,
+    duracaominutos NUMERIC
+);
+
+CREATE INDEX idxResumoPartidaInicio ON ResumoPartida (datahorainicio DESC, idpartida DESC);
+
+-- Gatilhos: a lógica fica nas funções de conexao/embutido.py
+CREATE TRIGGER trigCriarEstatisticaUsuario
+    AFTER INSERT ON Usuario
+BEGIN
+    SELECT criarEstatisticaUsuario(NEW.idusuario);
+END;
+
+CREATE TRIGGER trigContarPartidaUsuarioEntrada
+    AFTER INSERT ON PartidaUsuario
+BEGIN
+    SELECT contarPartidaUsuario(NEW.idusuario, 1);
+END;
+
+CREATE TRIGGER trigContarPartidaUsuarioSaida
+    AFTER DELETE ON PartidaUsuario
+BEGIN
+    SELECT contarPartidaUsuario(OLD.idusuario, -1);
+END;
+
+-- Fim da partida: primeiro os pontos, depois as estatísticas, como os
+-- gatilhos trigCalcularPontosPartida e trigAcumularEstatisticasPartida
+CREATE TRIGGER trigFinalizarPartida
+    AFTER UPDATE OF datahorafim ON Partida
+    WHEN OLD.datahorafim IS NULL AND NEW.datahorafim IS NOT NULL
+BEGIN
+    SELECT calcularPontosPartida(NEW.idpartida);
+    SELECT acumularEstatisticasPartida(NEW.idpartida);
+END;
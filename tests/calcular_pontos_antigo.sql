@@ -0,0 +1,80 @@
+-- Gatilho calcularPontosPartida como era antes de PontuacaoPartida
+-- (migração 004), com outro nome, para tests/test_pontuacao.py comparar os
+-- pontos que ele gravaria com os de EstadoPartida.pontos_partida.
+CREATE OR REPLACE FUNCTION calcularPontosPartidaAntigo()
+RETURNS TRIGGER AS $$
+DECLARE
+    totalPontosAdversarios INTEGER;
+    idVencedor INTEGER;
+    idDuplaVencedora INTEGER;
+BEGIN
+    IF NEW.dataHoraFim IS NOT NULL AND OLD.dataHoraFim IS NULL THEN
+        IF NEW.modoTermino = 'bater' THEN
+            IF NEW.idDuplaVencedora IS NOT NULL THEN
+                SELECT COALESCE(SUM(PC.pontosPeca), 0)
+                INTO totalPontosAdversarios
+                FROM MaoPartida MP
+                JOIN Peca PC ON PC.idPeca = MP.idPeca
+                JOIN PartidaUsuario PU ON MP.idUsuario = PU.idUsuario
+                WHERE MP.idPartida = NEW.idPartida
+                  AND MP.statusPeca = 'em_mao'
+                  AND PU.idDupla != NEW.idDuplaVencedora;
+                  
+                NEW.pontosDaPartida := totalPontosAdversarios;
+                
+            ELSIF NEW.idJogadorVencedor IS NOT NULL THEN
+                SELECT COALESCE(SUM(PC.pontosPeca), 0)
+                INTO totalPontosAdversarios
+                FROM MaoPartida MP
+                JOIN Peca PC ON PC.idPeca = MP.idPeca
+                WHERE MP.idPartida = NEW.idPartida
+                  AND MP.statusPeca = 'em_mao'
+                  AND MP.idUsuario != NEW.idJogadorVencedor;
+                  
+                NEW.pontosDaPartida := totalPontosAdversarios;
+            END IF;
+            
+        ELSIF NEW.modoTermino = 'trancado' THEN
+            IF NEW.idDuplaTrancou IS NOT NULL THEN
+                WITH PontosDuplas AS (
+                    SELECT 
+                        PU.idDupla,
+                        SUM(PC.pontosPeca) as totalPontos
+                    FROM MaoPartida MP
+                    JOIN Peca PC ON PC.idPeca = MP.idPeca
+                    JOIN PartidaUsuario PU ON MP.idUsuario = PU.idUsuario
+                    WHERE MP.idPartida = NEW.idPartida
+                      AND MP.statusPeca = 'em_mao'
+                    GROUP BY PU.idDupla
+                )
+                SELECT MIN(totalPontos)
+                INTO totalPontosAdversarios
+                FROM PontosDuplas
+                WHERE idDupla != NEW.idDuplaTrancou;
+                
+                NEW.pontosDaPartida := COALESCE(totalPontosAdversarios, 0);
+                
+            ELSIF NEW.idJogadorVencedor IS NOT NULL THEN
+                WITH PontosJogadores AS (
+                    SELECT 
+                        MP.idUsuario,
+                        SUM(PC.pontosPeca) as totalPontos
+                    FROM MaoPartida MP
+                    JOIN Peca PC ON PC.idPeca = MP.idPeca
+                    WHERE MP.idPartida = NEW.idPartida
+                      AND MP.statusPeca = 'em_mao'
+                    GROUP BY MP.idUsuario
+                )
+                SELECT MIN(totalPontos)
+                INTO totalPontosAdversarios
+                FROM PontosJogadores
+                WHERE idUsuario != NEW.idJogadorVencedor;
+                
+                NEW.pontosDaPartida := COALESCE(totalPontosAdversarios, 0);
+            END IF;
+        END IF;
+    END IF;
+    
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,89 @@
+import os
+import sys
+import pytest
+from sqlalchemy import create_engine, event, text
+
+# Testes: rodam no banco embutido em memória (sqlite://), sem servidor.
+# Os que dependem do Postgres (planos de execução, gatilhos em PL/pgSQL)
+# rodam também com CAPIVARA_TESTE_PG apontando para um banco só de testes,
+# que é apagado e reinstalado por database/script.sql; sem ela, são pulados.
+#
+# Uso: python -m pytest tests
+#      CAPIVARA_TESTE_PG=postgresql+psycopg2://postgres@localhost/domino_teste python -m pytest tests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "conexao"))
+os.environ.setdefault("CAPIVARA_BANCO", "sqlite://")
+
+import cache
+import conexao
+
+URL_PG = os.environ.get("CAPIVARA_TESTE_PG")
+SQLITE = "sqlite://"
+
+
+def _instalar_pg():
+    engine = create_engine(URL_PG)
+    with open(os.path.join(RAIZ, "database", "script.sql"), encoding="utf8") as f:
+        script = f.read()
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+        conn.execute(text(script))
+    engine.dispose()
+
+
+# Troca o banco do processo e esvazia os caches, que guardam ids do banco
+# anterior
+def usar_banco(url):
+    if url == URL_PG:
+        _instalar_pg()
+    conexao.configurar_banco(url)
+    for c in cache.CACHES:
+        c.invalidar()
+
+
+# Banco novo para o teste: o embutido e, com CAPIVARA_TESTE_PG, o Postgres
+@pytest.fixture(params=[SQLITE, "postgres"])
+def banco(request):
+    if request.param == "postgres" and not URL_PG:
+        pytest.skip("CAPIVARA_TESTE_PG não definida")
+    usar_banco(URL_PG if request.param == "postgres" else SQLITE)
+    yield conexao.session
+    conexao.session.remove()
+
+
+# Só o Postgres
+@pytest.fixture
+def banco_pg():
+    if not URL_PG:
+        pytest.skip("CAPIVARA_TESTE_PG não definida")
+    usar_banco(URL_PG)
+    yield conexao.session
+    conexao.session.remove()
+
+
+# Usuários novos; retorna os ids
+def criar_usuarios(n):
+    import main
+    return [main.cadastrar_usuario(f"Jogador {i + 1}") for i in range(n)]
+
+
+# Conta os comandos SQL enviados ao banco dentro do bloco
+class ContadorComandos:
+    def __init__(self, engine):
+        self.engine = engine
+        self.comandos = []
+
+    def _antes(self, conn, cursor, sql, params, contexto, varios):
+        self.comandos.append(sql)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._antes)
+        return self
+
+    def __exit__(self, *erro):
+        event.remove(self.engine, "before_cursor_execute", self._antes)
+
+    def __len__(self):
+        return len(self.comandos)
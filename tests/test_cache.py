@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import text
+
+import cache
+import main
+from conftest import criar_usuarios
+
+
+def test_nome_inexistente_e_erro(banco):
+    jogadores = criar_usuarios(2)
+    cache.usuarios.invalidar()
+    assert set(cache.nomes(banco, jogadores)) == set(jogadores)
+    with pytest.raises(ValueError, match="inexistente"):
+        cache.nomes(banco, jogadores + [max(jogadores) + 1000])
+    with pytest.raises(ValueError, match="inexistente"):
+        cache.assentos_partida(banco, 10 ** 6)
+
+
+# Falha no banco: o commit desfeito não deixa a partida no cache
+def test_cache_so_grava_depois_do_commit(banco):
+    jogadores = criar_usuarios(2)
+    idpartida = main.criar_partida(jogadores)
+    assert cache.assentos.entradas[idpartida][0].jogadores == [(j, None) for j in jogadores]
+
+    proxima = banco.execute(text("SELECT MAX(idpartida) + 1 FROM partida")).scalar()
+    with pytest.raises(Exception):
+        main.criar_partida(jogadores + [max(jogadores) + 1000])
+    banco.rollback()
+    assert proxima not in cache.assentos.entradas
+
+    # A entrada da transação desfeita não vaza para o commit seguinte
+    outra = main.criar_partida(jogadores)
+    assert cache.assentos.entradas[outra][0].jogadores == [(j, None) for j in jogadores]
+    assert sorted(cache.assentos.entradas) == [idpartida, outra]
@@ -0,0 +1,37 @@
+import os
+import pytest
+from sqlalchemy import text
+
+from conexao import obter_engine
+from verificar_indices import CONSULTAS, popular, plano
+from conftest import URL_PG, usar_banco
+
+# Volume da carga: 40 mil partidas com 26 movimentações cada (~1,04 milhão)
+PARTIDAS = int(os.environ.get("CAPIVARA_TESTE_PARTIDAS", "40000"))
+MOVIMENTOS = 26
+
+
+# Banco populado numa transação desfeita ao final do módulo; retorna a
+# conexão e uma partida e um usuário do meio da carga
+@pytest.fixture(scope="module")
+def populado():
+    if not URL_PG:
+        pytest.skip("CAPIVARA_TESTE_PG não definida")
+    usar_banco(URL_PG)
+    with obter_engine().connect() as conn:
+        base_partida, base_usuario, usuarios = popular(conn, PARTIDAS, MOVIMENTOS)
+        yield conn, base_partida + PARTIDAS // 2, base_usuario + usuarios // 2
+        conn.rollback()
+
+
+def test_carga_tem_o_volume_pedido(populado):
+    conn = populado[0]
+    assert conn.execute(text("SELECT COUNT(*) FROM Movimentacao")).scalar() >= PARTIDAS * MOVIMENTOS
+
+
+@pytest.mark.parametrize("consulta, indice", [c[1:] for c in CONSULTAS], ids=[c[0] for c in CONSULTAS])
+def test_consulta_usa_o_indice(populado, consulta, indice):
+    conn, idpartida, idusuario = populado
+    nos = plano(conn, consulta, idpartida, idusuario)
+    assert indice in {i for _, i in nos if i}, nos
+    assert "Seq Scan" not in {t for t, _ in nos}, nos
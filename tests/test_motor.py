@@ -0,0 +1,41 @@
+import pytest
+
+from motor import ConjuntoPecas, EstadoPartida, PecaDomino
+
+
+def conjunto():
+    pecas = [(a, b) for a in range(7) for b in range(a, 7)]
+    return ConjuntoPecas(PecaDomino(i + 1, a, b, a + b) for i, (a, b) in enumerate(pecas))
+
+
+# Dois jogadores: o primeiro com 6-6 e 3-6, o segundo com 6-5
+def estado_com_mesa():
+    c = conjunto()
+    estado = EstadoPartida(1, c, [1, 2])
+    estado.maos[1] = c.mascara([c.buscar(6, 6).idpeca, c.buscar(3, 6).idpeca])
+    estado.maos[2] = c.mascara([c.buscar(5, 6).idpeca])
+    estado.jogar(1, c.buscar(6, 6).idpeca, 'centro')
+    return c, estado
+
+
+def test_centro_so_com_a_mesa_vazia():
+    c, estado = estado_com_mesa()
+    with pytest.raises(ValueError):
+        estado.jogar(2, c.buscar(5, 6).idpeca, 'centro')
+    # A mesa e a mão ficam como estavam
+    assert (estado.ext_esq, estado.ext_dir) == (6, 6)
+    assert estado.mesa == [(c.buscar(6, 6).idpeca, 'centro')]
+    assert estado.tem_peca(2, c.buscar(5, 6).idpeca)
+
+
+def test_extremidade_invalida():
+    c, estado = estado_com_mesa()
+    with pytest.raises(ValueError):
+        estado.jogar(2, c.buscar(5, 6).idpeca, 'meio')
+
+
+def test_jogada_nas_extremidades():
+    c, estado = estado_com_mesa()
+    assert estado.jogar(2, c.buscar(5, 6).idpeca, 'esquerda') == (6, 5)
+    assert estado.jogar(1, c.buscar(3, 6).idpeca, 'direita') == (6, 3)
+    assert (estado.ext_esq, estado.ext_dir) == (5, 3)
@@ -0,0 +1,97 @@
+import os
+import random
+from sqlalchemy import text
+
+import conexao
+import diario
+import main
+import verificar_pontuacao
+from conftest import RAIZ, criar_usuarios, ContadorComandos
+
+# Comandos do fim de uma partida com o diário inteiro pendente (fim_partida):
+# os três da descarga do diário, a leitura e o UPDATE da Partida (o gatilho
+# pontua no banco), GravarResumoPartida e a releitura dos pontos
+COMANDOS_FIM = 7
+
+
+# Partidas automáticas de 2, 3 e 4 jogadores, com usuários novos em cada
+# uma; retorna [(estado, fim)]. Com a semente 4 e 8 partidas por tamanho,
+# há partidas batidas e trancadas em todos os tamanhos.
+def jogar(por_tamanho=8, semente=4):
+    rng = random.Random(semente)
+    partidas = []
+    for n in (2, 3, 4):
+        for _ in range(por_tamanho):
+            estado, fim, _ = main.jogar_partida_automatica(criar_usuarios(n), rng)
+            partidas.append((estado, fim))
+    return partidas
+
+
+def pontos_gravados(session, idpartida):
+    return session.execute(text("SELECT pontosdapartida FROM partida WHERE idpartida = :p"),
+                           {"p": idpartida}).scalar()
+
+
+def test_pontos_em_memoria_iguais_aos_do_banco(banco):
+    partidas = jogar()
+    for estado, fim in partidas:
+        assert pontos_gravados(banco, estado.idpartida) == estado.pontos_partida(*fim), fim
+
+    # PontuacaoPartida x EstadoPartida.pontuacao(), um comando por lote
+    grupos, divergencias = verificar_pontuacao.verificar(lote=10)
+    assert divergencias == []
+    assert sum(g["partidas"] for g in grupos.values()) == len(partidas)
+    for g in grupos.values():
+        assert g["comandos"] == (0 if conexao.banco_embutido() else g["lotes"])
+
+
+# O gatilho antigo, disparado de novo nas mesmas partidas numa transação
+# desfeita, grava os mesmos pontos; a exceção são as partidas em duplas
+# trancadas, que ele deixava com 0 ponto
+def test_pontos_iguais_aos_do_gatilho_antigo(banco_pg):
+    partidas = jogar()
+    banco_pg.commit()   # a releitura dos pontos deixou uma transação aberta
+    with open(os.path.join(RAIZ, "tests", "calcular_pontos_antigo.sql"), encoding="utf8") as f:
+        antigo = f.read()
+
+    with conexao.obter_engine().connect() as conn:
+        conn.execute(text(antigo))
+        conn.execute(text("""
+            DROP TRIGGER trigCalcularPontosPartida ON Partida;
+            CREATE TRIGGER trigCalcularPontosPartida
+                BEFORE UPDATE ON Partida
+                FOR EACH ROW
+                EXECUTE FUNCTION calcularPontosPartidaAntigo();
+        """))
+        duplas_trancadas = 0
+        for estado, fim in partidas:
+            conn.execute(text("""
+                UPDATE partida SET datahorafim = NULL, pontosdapartida = 0 WHERE idpartida = :p
+            """), {"p": estado.idpartida})
+            pontos = conn.execute(text("""
+                UPDATE partida SET datahorafim = CURRENT_TIMESTAMP WHERE idpartida = :p
+                RETURNING pontosdapartida
+            """), {"p": estado.idpartida}).scalar()
+            if fim[0] == 'trancado' and fim[2] is not None:
+                duplas_trancadas += 1
+                assert pontos == 0
+            else:
+                assert pontos == estado.pontos_partida(*fim), fim
+        conn.rollback()
+    assert 0 < duplas_trancadas < len(partidas)
+
+
+def test_comandos_por_partida_finalizada(banco, monkeypatch):
+    monkeypatch.setattr(diario, "DURABILIDADE_PADRAO", "fim_partida")
+    encerrar, contagens = main.encerrar_partida, {}
+
+    def contar(idpartida, *fim, **opcoes):
+        with ContadorComandos(conexao.obter_engine()) as comandos:
+            pontos = encerrar(idpartida, *fim, **opcoes)
+        contagens[idpartida] = len(comandos)
+        return pontos
+
+    monkeypatch.setattr(main, "encerrar_partida", contar)
+    jogar(por_tamanho=3)
+    assert len(contagens) == 9
+    assert set(contagens.values()) == {COMANDOS_FIM}
@@ -0,0 +1,22 @@
+import random
+from sqlalchemy.orm import Session
+
+import conexao
+import main
+from motor import obter_conjunto
+from registro import registros_do_banco, verificar
+from conftest import criar_usuarios
+
+
+# A verificação usa a sessão recebida, não a global do módulo conexao
+def test_verificar_com_sessao_propria(banco):
+    rng = random.Random(3)
+    for n in (2, 3, 4):
+        main.jogar_partida_automatica(criar_usuarios(n), rng)
+    conexao.session.remove()
+
+    with Session(conexao.obter_engine()) as propria:
+        conjunto = obter_conjunto(propria)
+        situacoes, problemas = verificar(propria, registros_do_banco(propria, conjunto=conjunto), conjunto)
+    assert problemas == []
+    assert situacoes == {"ok": 3}
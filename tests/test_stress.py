@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+from sqlalchemy import text
+
+import conexao
+import embutido
+import stress
+from conftest import URL_PG, usar_banco
+
+PARTIDAS, THREADS = 24, 4
+
+
+# Threads simultâneas precisam de um banco compartilhado de verdade: o
+# embutido em arquivo (o de memória tem uma só conexão) e o Postgres
+@pytest.fixture(params=["arquivo", "postgres"])
+def banco_concorrente(request, tmp_path):
+    if request.param == "postgres":
+        if not URL_PG:
+            pytest.skip("CAPIVARA_TESTE_PG não definida")
+        usar_banco(URL_PG)
+    else:
+        caminho = tmp_path / "stress.db"
+        with sqlite3.connect(caminho) as conn:
+            embutido.instalar(conn)
+        usar_banco(f"sqlite:///{caminho}")
+    yield conexao.session
+    conexao.session.remove()
+
+
+def test_stress_sem_movimentos_perdidos_ou_repetidos(banco_concorrente, capsys):
+    erros, por_partida = stress.executar(PARTIDAS, THREADS, 4, semente=11)
+    assert erros == 0, capsys.readouterr().out
+    assert len(por_partida) == PARTIDAS
+
+    gravados = {}
+    for idpartida, ordem in banco_concorrente.execute(text("""
+        SELECT idpartida, ordemacao FROM movimentacao ORDER BY idpartida, ordemacao
+    """)):
+        gravados.setdefault(idpartida, []).append(ordem)
+    assert gravados.keys() == por_partida.keys()
+    for idpartida, movimentos in por_partida.items():
+        assert gravados[idpartida] == list(range(1, movimentos + 1)), idpartida
+
+    finalizadas = banco_concorrente.execute(text(
+        "SELECT COUNT(*) FROM partida WHERE datahorafim IS NOT NULL")).scalar()
+    assert finalizadas == PARTIDAS
@@ -0,0 +1,74 @@
+import random
+import pytest
+from sqlalchemy import text
+
+import conexao
+import diario
+import main
+from distribuicao import distribuir_partidas
+from motor import EstadoPartida
+from conftest import criar_usuarios, ContadorComandos
+
+
+def partida_distribuida(session, n=3, semente=1):
+    jogadores = criar_usuarios(n)
+    idpartida = main.criar_partida(jogadores)
+    distribuir_partidas(session, [idpartida], semente=semente)
+    return EstadoPartida.carregar(session, idpartida)
+
+
+# Primeira peça encaixável na mão do jogador
+def encaixe(estado, idusuario):
+    peca = estado.jogadas_validas(idusuario)[0]
+    return peca.idpeca, estado.encaixes(peca)[0]
+
+
+def test_executar_turno_confere_a_vez(banco):
+    estado = partida_distribuida(banco)
+    primeiro, segundo, terceiro = estado.jogadores
+
+    idpeca, _ = encaixe(estado, primeiro)
+    turno = main.executar_turno(estado.idpartida, primeiro, idpeca, 'centro')
+    estado.jogar(primeiro, idpeca, 'centro')
+    assert turno.ordemacao == 1 and turno.extremidadeusada == 'centro'
+
+    # O terceiro tenta jogar na vez do segundo
+    for idpeca in (p.idpeca for p in estado.mao(terceiro)):
+        with pytest.raises(ValueError, match="vez"):
+            main.executar_turno(estado.idpartida, terceiro, idpeca, 'esquerda')
+
+    # Nada foi gravado pela tentativa recusada
+    assert banco.execute(text(
+        "SELECT COUNT(*) FROM movimentacao WHERE idpartida = :p"), {"p": estado.idpartida}).scalar() == 1
+
+    if estado.jogadas_validas(segundo):
+        idpeca, extremidade = encaixe(estado, segundo)
+        assert main.executar_turno(estado.idpartida, segundo, idpeca, extremidade).ordemacao == 2
+
+
+def test_partida_por_jogada_igual_a_por_lote(banco, monkeypatch):
+    jogadores = criar_usuarios(4)
+    resultados = []
+    for modo in ('por_lote', 'por_jogada'):
+        monkeypatch.setattr(diario, "DURABILIDADE_PADRAO", modo)
+        estado, fim, movimentos = main.jogar_partida_automatica(jogadores, random.Random(7))
+        linhas = banco.execute(text("""
+            SELECT ordemacao, idusuario, tipoacao, idpecajogada, extremidademesa
+            FROM movimentacao WHERE idpartida = :p ORDER BY ordemacao
+        """), {"p": estado.idpartida}).fetchall()
+        assert len(linhas) == movimentos
+        resultados.append((fim, [tuple(l) for l in linhas]))
+    assert resultados[0] == resultados[1]
+
+
+# Com gravação a cada movimento, a jogada é um único comando no banco
+def test_jogada_por_jogada_em_um_comando(banco_pg):
+    estado = partida_distribuida(banco_pg)
+    jogador = estado.jogadores[0]
+    registro = diario.DiarioMovimentos(banco_pg, estado.idpartida, modo='por_jogada')
+    peca = estado.conjunto.peca(encaixe(estado, jogador)[0])
+
+    with ContadorComandos(conexao.obter_engine()) as comandos:
+        main.jogar_peca(estado, registro, jogador, peca, 'centro')
+    assert len(comandos) == 1
+    assert estado.mesa == [(peca.idpeca, 'centro')]